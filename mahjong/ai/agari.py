@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from mahjong.constants import HONOR_INDICES, TERMINAL_INDICES
+
+KOKUSHI_INDICES = TERMINAL_INDICES + HONOR_INDICES
+SUIT_RANGES = [(0, 9), (9, 18), (18, 27)]
+
+
+def _build_suit_tables():
+    """
+    Find every count vector of a single suit which can be split into sets, with or without one pair.
+    :return: two frozensets of 9 counts tuples, the shapes made of sets only and the shapes made of sets and a pair
+    """
+    sets = [tuple(1 if i <= x < i + 3 else 0 for x in range(9)) for i in range(7)] + \
+           [tuple(3 if x == i else 0 for x in range(9)) for i in range(9)]
+    pairs = [tuple(2 if x == i else 0 for x in range(9)) for i in range(9)]
+
+    def add(shape, item):
+        result = tuple(a + b for a, b in zip(shape, item))
+        return result if max(result) <= 4 else None
+
+    # a hand has at most 4 sets
+    shapes_of_sets = {(0,) * 9}
+    current = shapes_of_sets
+    for _ in range(4):
+        current = {y for y in (add(shape, item) for shape in current for item in sets) if y is not None}
+        shapes_of_sets |= current
+
+    shapes_with_pair = {y for y in (add(shape, pair) for shape in shapes_of_sets for pair in pairs)
+                        if y is not None and sum(y) <= 14}
+    return frozenset(shapes_of_sets), frozenset(shapes_with_pair)
+
+
+SUIT_SETS, SUIT_SETS_AND_PAIR = _build_suit_tables()
+
+
+def is_chiitoitsu(tiles_34):
+    """
+    Seven different pairs
+    :param tiles_34: 34 tiles format array
+    :return: boolean
+    """
+    return tiles_34.count(2) == 7 and sum(tiles_34) == 14
+
+
+def is_kokushi(tiles_34):
+    """
+    One of each terminal and honor tile, plus one more of any of them
+    :param tiles_34: 34 tiles format array
+    :return: boolean
+    """
+    count_of_kokushi_tiles = 0
+    for index in KOKUSHI_INDICES:
+        if not tiles_34[index]:
+            return False
+        count_of_kokushi_tiles += tiles_34[index]
+    return count_of_kokushi_tiles == 14 and sum(tiles_34) == 14
+
+
+def is_regular_agari(tiles_34):
+    """
+    Sets and exactly one pair, with each suit looked up in the precomputed shape tables
+    :param tiles_34: 34 tiles format array, without the open sets
+    :return: boolean
+    """
+    count_of_pairs = 0
+    for first_index, last_index in SUIT_RANGES:
+        shape = tuple(tiles_34[first_index:last_index])
+        if shape in SUIT_SETS:
+            continue
+        if shape in SUIT_SETS_AND_PAIR:
+            count_of_pairs += 1
+        else:
+            return False
+
+    for index in HONOR_INDICES:
+        count = tiles_34[index]
+        if count == 2:
+            count_of_pairs += 1
+        elif count != 0 and count != 3:
+            return False
+
+    return count_of_pairs == 1
+
+
+class Agari(object):
+
+    def is_agari(self, tiles_34, open_sets=None):
+        """
+        Determine whether the hand is complete, in the standard form, as chiitoitsu or as kokushi
+        :param tiles_34: 34 tiles format array, including the tiles of open sets
+        :param open_sets: list of open sets in 34 tiles format, which can't be split into other sets
+        :return: boolean
+        """
+        if open_sets:
+            tiles_34 = tiles_34[:]
+            for open_set in open_sets:
+                for index in open_set:
+                    tiles_34[index] -= 1
+            return is_regular_agari(tiles_34)
+
+        return is_regular_agari(tiles_34) or is_chiitoitsu(tiles_34) or is_kokushi(tiles_34)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+from functools import lru_cache
+
+from mahjong.ai.agari import KOKUSHI_INDICES
+
+AGARI_STATE = -1
+# index ranges of man, pin, sou and honors, the groups of tiles whose blocks are looked up on their own
+GROUPS = [(0, 9), (9, 18), (18, 27), (27, 34)]
+
+
+def _prune(blocks):
+    """
+    Drop every (sets, partial sets, pair) triple which can't give a lower shanten than another one with the same pair:
+    a set is worth at least as much as a partial set, so (m, t) is beaten by (m', t') when m' >= m and m' + t' >= m + t
+    """
+    return tuple(sorted(
+        (m, t, h) for (m, t, h) in blocks
+        if not any(h2 == h and m2 >= m and m2 + t2 >= m + t and (m2, t2) != (m, t) for (m2, t2, h2) in blocks)
+    ))
+
+
+@lru_cache(maxsize=None)
+def suit_blocks(counts):
+    """
+    Every useful way to split the tiles of one suit into sets, partial sets (pairs, ryanmen, penchan, kanchan) and
+    a pair used as the head. Each count vector is only split once, every later call is a table lookup.
+    :param counts: tuple of the 9 counts of one suit
+    :return: tuple of (sets, partial sets, pair) triples, with pair being 0 or 1
+    """
+    for i, count in enumerate(counts):
+        if count:
+            break
+    else:
+        return (0, 0, 0),
+
+    blocks = set()
+    rest = list(counts)
+
+    def split(taken, sets, partial_sets, pair):
+        for index in taken:
+            rest[index] -= 1
+        for m, t, h in suit_blocks(tuple(rest)):
+            if h + pair <= 1:
+                blocks.add((m + sets, t + partial_sets, h + pair))
+        for index in taken:
+            rest[index] += 1
+
+    # the lowest tile is either left over or starts one of the blocks
+    split([i], 0, 0, 0)
+    if count >= 3:
+        split([i, i, i], 1, 0, 0)
+    if count >= 2:
+        split([i, i], 0, 1, 0)
+        split([i, i], 0, 0, 1)
+    if i < 8 and counts[i + 1]:
+        split([i, i + 1], 0, 1, 0)
+        if i < 7 and counts[i + 2]:
+            split([i, i + 1, i + 2], 1, 0, 0)
+    if i < 7 and counts[i + 2]:
+        split([i, i + 2], 0, 1, 0)
+
+    return _prune(blocks)
+
+
+@lru_cache(maxsize=None)
+def honor_blocks(counts):
+    """
+    Same as suit_blocks(), for honor tiles which only make pons and pairs
+    :param counts: sorted tuple of the counts of the honor tiles
+    :return: tuple of (sets, partial sets, pair) triples
+    """
+    sets = sum(1 for count in counts if count >= 3)
+    pairs = sum(1 for count in counts if count == 2)
+    blocks = {(sets, pairs, 0)}
+    if pairs:
+        blocks.add((sets, pairs - 1, 1))
+    if sets:
+        # a pon can be broken to a pair for the head
+        blocks.add((sets - 1, pairs, 1))
+    return _prune(blocks)
+
+
+def group_blocks(tiles_34, group):
+    """
+    Blocks of one group of tiles, see suit_blocks()
+    :param tiles_34: 34 tiles format array
+    :param group: index into GROUPS
+    :return: tuple of (sets, partial sets, pair) triples
+    """
+    first_index, last_index = GROUPS[group]
+    if group == 3:
+        return honor_blocks(tuple(sorted(tiles_34[first_index:last_index])))
+    return suit_blocks(tuple(tiles_34[first_index:last_index]))
+
+
+@lru_cache(maxsize=None)
+def merge_blocks(first, second):
+    """Every useful combination of the blocks of two groups of tiles, with at most one pair between them"""
+    return _prune({(m1 + m2, t1 + t2, h1 + h2) for m1, t1, h1 in first for m2, t2, h2 in second if h1 + h2 <= 1})
+
+
+@lru_cache(maxsize=None)
+def best_shanten(blocks, required_sets):
+    """Lowest shanten of the blocks of a whole hand, which only has room for `required_sets` sets and partial sets"""
+    best = 8
+    for m, t, h in blocks:
+        sets = min(m, required_sets)
+        best = min(best, 8 - 2 * sets - min(t, required_sets - sets) - h)
+    return best
+
+
+def regular_shanten(tiles_34, count_of_melds=0):
+    """
+    Shanten of the standard form of sets and a pair
+    :param tiles_34: 34 tiles format array of the closed part of the hand
+    :param count_of_melds: number of open sets (and closed kans) that are not in tiles_34
+    :return: int, -1 for a complete hand, 0 for tempai
+    """
+    man_and_pin = merge_blocks(suit_blocks(tuple(tiles_34[0:9])), suit_blocks(tuple(tiles_34[9:18])))
+    sou_and_honors = merge_blocks(suit_blocks(tuple(tiles_34[18:27])), honor_blocks(tuple(sorted(tiles_34[27:34]))))
+    return best_shanten(merge_blocks(man_and_pin, sou_and_honors), 4 - count_of_melds) - 2 * count_of_melds
+
+
+def chiitoitsu_shanten(tiles_34):
+    """
+    Shanten of seven different pairs
+    :param tiles_34: 34 tiles format array
+    :return: int
+    """
+    kinds = 34 - tiles_34.count(0)
+    pairs = kinds - tiles_34.count(1)
+    return 6 - pairs + max(0, 7 - kinds)
+
+
+def kokushi_shanten(tiles_34):
+    """
+    Shanten of kokushi musou, one of each terminal and honor tile plus a pair of one of them
+    :param tiles_34: 34 tiles format array
+    :return: int
+    """
+    kinds = 0
+    has_pair = False
+    for index in KOKUSHI_INDICES:
+        count = tiles_34[index]
+        if count:
+            kinds += 1
+            if count >= 2:
+                has_pair = True
+    return 13 - kinds - (1 if has_pair else 0)
+
+
+def closed_hand_shanten(tiles_34, count_of_melds=0):
+    """
+    Lowest shanten of the regular form, chiitoitsu and kokushi; the last two only for a hand without melds
+    :param tiles_34: 34 tiles format array of the closed part of the hand
+    :param count_of_melds: number of open sets (and closed kans) that are not in tiles_34
+    :return: int
+    """
+    shanten = regular_shanten(tiles_34, count_of_melds)
+    if count_of_melds or shanten == AGARI_STATE:
+        return shanten
+    return min(shanten, chiitoitsu_shanten(tiles_34), kokushi_shanten(tiles_34))
+
+
+class Shanten(object):
+    AGARI_STATE = AGARI_STATE
+
+    def calculate_shanten(self, tiles_34, open_sets=None):
+        """
+        Number of tiles the hand is away from tempai, the lowest of the regular form, chiitoitsu and kokushi
+        :param tiles_34: 34 tiles format array, including the tiles of open sets
+        :param open_sets: list of open sets in 34 tiles format, which can't be split into other sets
+        :return: int, -1 (AGARI_STATE) for a complete hand, 0 for tempai
+        """
+        if open_sets:
+            tiles_34 = tiles_34[:]
+            for open_set in open_sets:
+                for index in open_set:
+                    tiles_34[index] -= 1
+            return regular_shanten(tiles_34, len(open_sets))
+        return closed_hand_shanten(tiles_34)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+from functools import lru_cache
+
+from mahjong.ai.shanten import GROUPS, best_shanten, chiitoitsu_shanten, closed_hand_shanten, group_blocks, \
+    kokushi_shanten, merge_blocks
+from mahjong.meld import Meld
+
+# tile_34: the tile to discard, shanten: of the hand after the discard,
+# waits: dict of the tiles which lower the shanten to the number of unseen copies of each, count_of_waits: their sum
+DiscardOption = namedtuple('DiscardOption', ['tile_34', 'shanten', 'waits', 'count_of_waits'])
+
+TILE_GROUPS = [group for group, (first_index, last_index) in enumerate(GROUPS)
+               for _ in range(first_index, last_index)]
+
+
+def improving_tiles(tiles_34, count_of_melds=0):
+    """
+    Every tile which lowers the shanten of the hand when it is drawn.
+    The blocks of the three groups a drawn tile doesn't belong to are merged once, so each candidate tile only costs
+    the lookup of its own group.
+    :param tiles_34: 34 tiles format array of the closed part of the hand, usually of 13 tiles
+    :param count_of_melds: number of open sets (and closed kans) that are not in tiles_34
+    :return: shanten of the hand, list of 34 tiles format indices
+    """
+    tiles_34 = list(tiles_34)
+    shanten = closed_hand_shanten(tiles_34, count_of_melds)
+    required_sets = 4 - count_of_melds
+
+    blocks = [group_blocks(tiles_34, group) for group in range(len(GROUPS))]
+    other_blocks = []
+    for group in range(len(GROUPS)):
+        others = [blocks[n] for n in range(len(GROUPS)) if n != group]
+        other_blocks.append(merge_blocks(merge_blocks(others[0], others[1]), others[2]))
+
+    result = []
+    for tile in range(34):
+        if tiles_34[tile] >= 4:
+            continue
+        group = TILE_GROUPS[tile]
+        tiles_34[tile] += 1
+        new_blocks = merge_blocks(other_blocks[group], group_blocks(tiles_34, group))
+        new_shanten = best_shanten(new_blocks, required_sets) - 2 * count_of_melds
+        if not count_of_melds and new_shanten >= shanten:
+            new_shanten = min(new_shanten, chiitoitsu_shanten(tiles_34), kokushi_shanten(tiles_34))
+        tiles_34[tile] -= 1
+        if new_shanten < shanten:
+            result.append(tile)
+    return shanten, result
+
+
+@lru_cache(maxsize=4096)
+def hand_waits(hand, count_of_melds=0):
+    """
+    Cached improving_tiles(), so that a hand seen after one draw is not analysed again after the next ones
+    :param hand: tuple of the 34 tiles format counts of the closed part of the hand
+    :param count_of_melds: number of open sets (and closed kans) that are not in the hand
+    :return: shanten of the hand, tuple of 34 tiles format indices
+    """
+    shanten, tiles = improving_tiles(hand, count_of_melds)
+    return shanten, tuple(tiles)
+
+
+def visible_tiles_34(table):
+    """
+    Count every tile that can be seen from the main player's seat: the own hand, all discards, melds and dora
+    indicators. Tiles are collected by their 136 format id, so that called discards and upgraded pons which show up
+    in more than one place are only counted once.
+    :param table: Table
+    :return: 34 tiles format array
+    """
+    tiles = set(table.dora_indicators)
+    for player in table.players:
+        tiles.update(player.discards)
+        for meld in player.melds:
+            tiles.update(meld.tiles)
+    tiles.update(table.get_main_player().tiles)
+
+    counts = [0] * 34
+    for tile in tiles:
+        if tile is not None and 0 <= tile < 136:
+            counts[tile // 4] += 1
+    return counts
+
+
+def unseen_tiles_34(table):
+    """
+    Number of copies of each tile which are still in the wall or in the other players' hands
+    :param table: Table
+    :return: 34 tiles format array
+    """
+    return [max(0, 4 - count) for count in visible_tiles_34(table)]
+
+
+def player_hand_34(player):
+    """
+    :return: 34 tiles format array of the closed part of a player's hand, or None if it is hidden
+    """
+    if player.tiles_hidden or any(tile < 0 for tile in player.tiles):
+        return None
+    counts = [0] * 34
+    for tile in player.tiles:
+        counts[tile // 4] += 1
+    return counts
+
+
+def count_of_sets(player):
+    """
+    Number of sets a player has outside the closed part of the hand. An upgraded pon is kept next to the pon as a
+    CHAKAN meld and a north taken out of the hand as a NUKI meld, neither of them is one more set
+    :param player: Player
+    :return: int
+    """
+    return sum(1 for meld in player.melds if meld.type not in (Meld.CHAKAN, Meld.NUKI))
+
+
+def waits(player, unseen=None):
+    """
+    The tiles which improve a player's hand after the discard, e.g. the winning tiles of a hand in tempai
+    :param player: Player with a hand of 13 tiles, less 3 for each meld
+    :param unseen: result of unseen_tiles_34(), if already known
+    :return: shanten of the hand, dict of improving tiles to the number of unseen copies of each
+    """
+    tiles_34 = player_hand_34(player)
+    if tiles_34 is None:
+        return None, {}
+    if unseen is None:
+        unseen = unseen_tiles_34(player.table)
+    shanten, tiles = hand_waits(tuple(tiles_34), count_of_sets(player))
+    return shanten, {tile: unseen[tile] for tile in tiles}
+
+
+def discard_options(player, unseen=None):
+    """
+    Analyse every possible discard of a player's hand after a draw
+    :param player: Player with a hand of 14 tiles, less 3 for each meld
+    :param unseen: result of unseen_tiles_34(), if already known
+    :return: list of DiscardOption, best first: the lowest shanten, then the most unseen improving tiles
+    """
+    tiles_34 = player_hand_34(player)
+    if tiles_34 is None:
+        return []
+    if unseen is None:
+        unseen = unseen_tiles_34(player.table)
+
+    count_of_melds = count_of_sets(player)
+    options = []
+    for tile in range(34):
+        if not tiles_34[tile]:
+            continue
+        tiles_34[tile] -= 1
+        shanten, tiles = hand_waits(tuple(tiles_34), count_of_melds)
+        tiles_34[tile] += 1
+        option_waits = {wait: unseen[wait] for wait in tiles}
+        options.append(DiscardOption(tile, shanten, option_waits, sum(option_waits.values())))
+
+    return sorted(options, key=lambda option: (option.shanten, -option.count_of_waits))
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import itertools
+from functools import lru_cache
+
+import numpy as np
+
+from mahjong.ai.agari import KOKUSHI_INDICES, SUIT_RANGES, SUIT_SETS, SUIT_SETS_AND_PAIR
+from mahjong.constants import FIVE_RED_MAN, FIVE_RED_PIN, FIVE_RED_SOU, HONOR_INDICES, TERMINAL_INDICES
+
+# the three suits and the honors, in 34 tiles format
+GROUP_RANGES = SUIT_RANGES + [(27, 34)]
+# weights which turn the 9 counts of a suit into one base 5 number, the index into suit_shape_table()
+SUIT_WEIGHTS = 5 ** np.arange(9, dtype=np.int64)
+SETS_ONLY = 1
+SETS_AND_PAIR = 2
+
+
+@lru_cache(maxsize=None)
+def suit_shape_table():
+    """
+    Lookup table of every count vector of a suit, see mahjong.ai.agari.SUIT_SETS.
+    Built on first use, it takes 2 MB.
+    :return: uint8 array indexed by the base 5 code of the counts: SETS_ONLY, SETS_AND_PAIR or 0 if the tiles can't
+    be split into sets
+    """
+    table = np.zeros(5 ** 9, dtype=np.uint8)
+    table[np.array(sorted(SUIT_SETS), dtype=np.int64) @ SUIT_WEIGHTS] = SETS_ONLY
+    table[np.array(sorted(SUIT_SETS_AND_PAIR), dtype=np.int64) @ SUIT_WEIGHTS] = SETS_AND_PAIR
+    return table
+
+
+class HandBatch(object):
+    """
+    Many hands at once: an (N, 34) array of the count of each tile, and if the hands were given in 136 tiles format,
+    an (N, 136) boolean array of which tiles each hand holds.
+    Conversion, dora counting, suit and terminal checks and agari detection work on the whole batch with NumPy,
+    for corpus tools that look at hundreds of thousands of hands.
+    """
+
+    def __init__(self, counts, tiles=None):
+        """
+        :param counts: (N, 34) array of tile counts
+        :param tiles: (N, 136) boolean array of tiles, or None
+        """
+        self.counts = np.asarray(counts, dtype=np.uint8).reshape(-1, 34)
+        self.tiles = tiles
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, index):
+        """
+        :param index: index, slice or boolean mask of hands, e.g. the result of is_agari()
+        :return: HandBatch of the selected hands
+        """
+        if isinstance(index, (int, np.integer)):
+            index = slice(index, index + 1 or None)
+        return HandBatch(self.counts[index], None if self.tiles is None else self.tiles[index])
+
+    @staticmethod
+    def from_136_arrays(hands):
+        """
+        :param hands: list of arrays of 136 tiles format, not necessarily of the same length
+        :return: HandBatch
+        """
+        count_of_hands = len(hands)
+        lengths = np.fromiter((len(x) for x in hands), dtype=np.int64, count=count_of_hands)
+        flat = np.fromiter(itertools.chain.from_iterable(hands), dtype=np.int64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(count_of_hands, dtype=np.int64), lengths)
+
+        counts = np.bincount(rows * 34 + flat // 4, minlength=count_of_hands * 34).reshape(count_of_hands, 34)
+        tiles = np.zeros((count_of_hands, 136), dtype=bool)
+        tiles[rows, flat] = True
+        return HandBatch(counts, tiles)
+
+    @staticmethod
+    def from_34_arrays(hands):
+        """
+        :param hands: list of 34 tiles format arrays
+        :return: HandBatch, without the 136 tiles
+        """
+        return HandBatch(np.array(hands, dtype=np.uint8).reshape(-1, 34))
+
+    def to_34_arrays(self):
+        """
+        :return: list of 34 tiles format arrays
+        """
+        return self.counts.tolist()
+
+    def count_of_tiles(self):
+        """
+        :return: (N,) array of the number of tiles of each hand
+        """
+        return self.counts.sum(axis=1, dtype=np.int64)
+
+    def count_of_dora(self, dora_vector, aka_mask=0):
+        """
+        :param dora_vector: count of dora of each of the 34 tiles, see mahjong.utils.dora_vector(),
+        either one for every hand or an (N, 34) array with one per hand
+        :param aka_mask: mahjong.utils.aka_dora_mask(), the red fives are only counted if the 136 tiles are known
+        :return: tuple of (N,) arrays of the count of dora and of red fives of each hand
+        """
+        dora_vector = np.asarray(dora_vector, dtype=np.int64)
+        if dora_vector.ndim == 1:
+            count_of_dora = self.counts.astype(np.int64) @ dora_vector
+        else:
+            count_of_dora = np.einsum('ij,ij->i', self.counts.astype(np.int64), dora_vector)
+
+        red_fives = [x for x in [FIVE_RED_MAN, FIVE_RED_PIN, FIVE_RED_SOU] if aka_mask >> x & 1]
+        if self.tiles is None or not red_fives:
+            return count_of_dora, np.zeros(len(self), dtype=np.int64)
+        return count_of_dora, self.tiles[:, red_fives].sum(axis=1, dtype=np.int64)
+
+    def group_counts(self):
+        """
+        :return: (N, 4) array of the number of tiles of each of the three suits and of the honors
+        """
+        return np.stack([self.counts[:, first:last].sum(axis=1, dtype=np.int64) for first, last in GROUP_RANGES],
+                        axis=1)
+
+    def suit_mask(self):
+        """
+        :return: (N,) array with bit n set if the hand has tiles of group n of GROUP_RANGES (bit 3 for honors)
+        """
+        present = self.group_counts() > 0
+        return (present * (1 << np.arange(len(GROUP_RANGES)))).sum(axis=1)
+
+    def count_of_terminals(self):
+        """
+        :return: (N,) array of the number of terminal tiles of each hand
+        """
+        return self.counts[:, TERMINAL_INDICES].sum(axis=1, dtype=np.int64)
+
+    def count_of_honors(self):
+        """
+        :return: (N,) array of the number of honor tiles of each hand
+        """
+        return self.counts[:, HONOR_INDICES].sum(axis=1, dtype=np.int64)
+
+    def is_tanyao(self):
+        """
+        :return: (N,) boolean array of the hands without terminals and honors
+        """
+        return self.counts[:, KOKUSHI_INDICES].sum(axis=1) == 0
+
+    def is_chinitsu(self):
+        """
+        :return: (N,) boolean array of the hands of a single suit
+        """
+        return np.isin(self.suit_mask(), [1, 2, 4])
+
+    def is_honitsu(self):
+        """
+        :return: (N,) boolean array of the hands of a single suit plus honors
+        """
+        return np.isin(self.suit_mask(), [9, 10, 12])
+
+    def is_chiitoitsu(self):
+        """
+        :return: (N,) boolean array of the hands of seven different pairs
+        """
+        return ((self.counts == 2).sum(axis=1) == 7) & (self.count_of_tiles() == 14)
+
+    def is_kokushi(self):
+        """
+        :return: (N,) boolean array of the kokushi hands
+        """
+        kokushi_counts = self.counts[:, KOKUSHI_INDICES]
+        return (kokushi_counts > 0).all(axis=1) & (kokushi_counts.sum(axis=1) == 14) & (self.count_of_tiles() == 14)
+
+    def is_regular_agari(self):
+        """
+        Same as mahjong.ai.agari.is_regular_agari(), each suit is looked up in suit_shape_table() by its base 5 code
+        :return: (N,) boolean array of the hands made of sets and exactly one pair
+        """
+        table = suit_shape_table()
+        counts = self.counts.astype(np.int64)
+        shapes = np.stack([table[counts[:, first:last] @ SUIT_WEIGHTS] for first, last in SUIT_RANGES], axis=1)
+
+        honors = self.counts[:, HONOR_INDICES]
+        is_valid = (shapes != 0).all(axis=1) & ((honors == 0) | (honors == 2) | (honors == 3)).all(axis=1)
+        count_of_pairs = (shapes == SETS_AND_PAIR).sum(axis=1) + (honors == 2).sum(axis=1)
+        return is_valid & (count_of_pairs == 1)
+
+    def is_agari(self):
+        """
+        Same as mahjong.ai.agari.Agari.is_agari() for closed hands, or for the closed part of a hand with melds
+        (then only the standard form is valid, chiitoitsu and kokushi need 14 tiles).
+        Useful to pick the complete hands out of a batch before scoring them one by one.
+        :return: (N,) boolean array
+        """
+        return self.is_regular_agari() | self.is_chiitoitsu() | self.is_kokushi()
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+from mahjong.ai.shanten import closed_hand_shanten
+from mahjong.ai.ukeire import count_of_sets, discard_options
 from mahjong.stat import Statistics
 from mahjong.table import Table
+from mahjong.tile import TilesConverter
+from mahjong.utils import is_aka_dora
 from utils.general import make_random_letters_and_digit_string
 
 
@@ -31,8 +35,27 @@ class Client(object):
         self.table.count_of_remaining_tiles -= 1
         self.player.draw_tile(tile_id)
 
+    def choose_discard(self, drawn_tile):
+        """
+        Choose the tile to discard after a draw: the one leaving the lowest shanten and the most unseen tiles that
+        improve the hand. Of several copies of that tile, the drawn one is preferred and a red five is kept.
+        :param drawn_tile: int 136 tiles format
+        :return: int 136 tiles format
+        """
+        options = discard_options(self.player)
+        if not options:
+            return drawn_tile
+        tile_34 = options[0].tile_34
+        if drawn_tile // 4 == tile_34:
+            return drawn_tile
+        copies = sorted((t for t in self.player.tiles if t // 4 == tile_34), key=is_aka_dora)
+        return copies[0]
+
     def discard_tile(self, tile_id):
-        return self.player.discard_tile(tile_id)
+        tile = self.player.discard_tile(tile_id)
+        tiles_34 = TilesConverter.to_34_array(self.player.tiles)
+        self.player.is_tempai = closed_hand_shanten(tiles_34, count_of_sets(self.player)) == 0
+        return tile
 
     def call_meld(self, meld):
         # when opponent called meld it is means
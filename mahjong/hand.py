@@ -2,17 +2,154 @@
 import math
 import itertools
 
-from functools import reduce
+from collections import OrderedDict, namedtuple
+from functools import reduce, lru_cache
 
-from mahjong.ai.agari import Agari
+from mahjong.ai.agari import is_chiitoitsu, is_kokushi, is_regular_agari
 from mahjong import yaku
+from mahjong.scores import SCORE_TABLE
 from mahjong.tile import TilesConverter
 from mahjong.constants import EAST, SOUTH, WEST, NORTH, CHUN, HATSU, HAKU, TERMINAL_INDICES, HONOR_INDICES
-from mahjong.utils import is_chi, is_pon, is_pair, is_sou, is_pin, is_man, plus_dora, is_aka_dora, simplify
+from mahjong.utils import is_chi, is_pon, is_pair, is_sou, is_pin, is_man, simplify, aka_dora_mask, count_dora, \
+    dora_vector
 from utils.settings_handler import settings
 
 
+SOU_SET = 1
+PIN_SET = 2
+MAN_SET = 4
+HONOR_SET = 8
+
+WINDS = [EAST, SOUTH, WEST, NORTH]
+DRAGONS = [HAKU, HATSU, CHUN]
+GREEN_INDICES = [19, 20, 21, 23, 25, HATSU]
+
+TERMINAL_MASK = sum(1 << x for x in TERMINAL_INDICES)
+HONOR_MASK = sum(1 << x for x in HONOR_INDICES)
+GREEN_MASK = sum(1 << x for x in GREEN_INDICES)
+
+# The forms of a complete hand, see FinishedHand.classify_shape().
+# fu and yaku are fixed for the special forms, None if they come from the sets of each division of the hand
+HandShape = namedtuple('HandShape', ['name', 'fu', 'yaku'])
+REGULAR_SHAPE = HandShape('Regular', None, None)
+CHIITOITSU_SHAPE = HandShape('Chiitoitsu', 25, yaku.chiitoitsu)
+KOKUSHI_SHAPE = HandShape('Kokushi', 0, yaku.kokushi)
+# kokushi waiting on all 13 tiles, i.e. the pair is the win tile
+KOKUSHI_13_SIDED_SHAPE = HandShape('Kokushi 13-sided', 0, yaku.daburu_kokushi)
+
+
+class HandFeatures(object):
+    """
+    Everything the yaku and fu rules need to know about one division of a hand, collected in a single pass over its
+    sets, so that each rule is a few lookups rather than another scan of the hand.
+    """
+    __slots__ = ('hand', 'pon_sets', 'chi_sets', 'pairs', 'pon_counts', 'chi_counts', 'tile_counts', 'tile_mask',
+                 'suit_mask', 'count_of_terminal_sets', 'count_of_honor_sets')
+
+    def __init__(self, hand):
+        """
+        :param hand: list of hand's sets, in 34 tiles format
+        """
+        self.hand = hand
+        self.pon_sets = []
+        self.chi_sets = []
+        self.pairs = []
+        # number of pons of each tile, and of chi by their first tile
+        self.pon_counts = [0] * 34
+        self.chi_counts = [0] * 34
+        self.tile_counts = [0] * 34
+        # bit n is set if the tile n is in the hand
+        self.tile_mask = 0
+        # SOU_SET, PIN_SET, MAN_SET and HONOR_SET bits of the suits that sets start with
+        self.suit_mask = 0
+        self.count_of_terminal_sets = 0
+        self.count_of_honor_sets = 0
+
+        for item in hand:
+            first = item[0]
+            if is_pair(item):
+                self.pairs.append(first)
+            elif is_pon(item):
+                self.pon_sets.append(item)
+                self.pon_counts[first] += 1
+            elif is_chi(item):
+                self.chi_sets.append(item)
+                self.chi_counts[first] += 1
+
+            set_mask = 0
+            for x in item:
+                set_mask |= 1 << x
+                self.tile_counts[x] += 1
+            self.tile_mask |= set_mask
+            if set_mask & TERMINAL_MASK:
+                self.count_of_terminal_sets += 1
+            if set_mask & HONOR_MASK:
+                self.count_of_honor_sets += 1
+
+            if is_sou(first):
+                self.suit_mask |= SOU_SET
+            elif is_pin(first):
+                self.suit_mask |= PIN_SET
+            elif is_man(first):
+                self.suit_mask |= MAN_SET
+            else:
+                self.suit_mask |= HONOR_SET
+
+    @property
+    def count_of_suits(self):
+        """Number of the three suits that sets start with"""
+        return bin(self.suit_mask & (SOU_SET | PIN_SET | MAN_SET)).count('1')
+
+    @staticmethod
+    def of(hand):
+        """
+        :param hand: list of hand's sets, or their HandFeatures
+        :return: HandFeatures
+        """
+        return hand if isinstance(hand, HandFeatures) else HandFeatures(hand)
+
+
+class HandValueCache(object):
+    """
+    Bounded LRU cache of the results of FinishedHand.estimate_hand_value(), keyed by FinishedHand.hand_key()
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        """
+        :return: the cached result, or None
+        """
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 class FinishedHand(object):
+    # shared by every FinishedHand, as corpus validation and lookahead create many of them
+    value_cache = HandValueCache()
 
     def estimate_hand_value(self,
                             tiles,
@@ -61,27 +198,74 @@ class FinishedHand(object):
         {"cost": {'main': 1000, 'additional': 0}, "han": 1, "fu": 30, "error": None, "hand_yaku": []}
         {"cost": None, "han": 0, "fu": 0, "error": "Hand is not valid", "hand_yaku": []}
         """
-        if not open_sets:
-            open_sets = []
-        else:
-            # cast 136 format to 34 format
-            for item in open_sets:
-                item[0] //= 4
-                item[1] //= 4
-                item[2] //= 4
-        is_open_hand = len(open_sets) > 0
+        # cast 136 format to 34 format, into new lists so that the caller's sets are not changed
+        open_sets = [[item[0] // 4, item[1] // 4, item[2] // 4] for item in open_sets or []]
 
         if not dora_indicators:
             dora_indicators = []
 
-        kan_indices_136 = []
-        if not called_kan_indices:
-            called_kan_indices = []
-        else:
-            kan_indices_136 = called_kan_indices
-            called_kan_indices = [x // 4 for x in called_kan_indices]
+        kan_indices_136 = called_kan_indices or []
+        called_kan_indices = [x // 4 for x in kan_indices_136]
+
+        # special situation
+        if is_nagashi_mangan:
+            han = yaku.nagashi_mangan.han['closed']
+            return {'cost': self.calculate_scores(han, 30, is_tsumo, is_dealer), 'error': None, 'han': han, 'fu': 30,
+                    'hand_yaku': [yaku.nagashi_mangan]}
+
+        if win_tile not in tiles:
+            return {'cost': None, 'error': "Win tile not in the hand", 'han': 0, 'fu': 0, 'hand_yaku': []}
+
+        # dora only depend on the actual tiles, every other rule works on the 34 tiles format
+        count_of_dora, count_of_aka_dora = count_dora(tiles + kan_indices_136, dora_vector(dora_indicators),
+                                                      aka_dora_mask())
+
+        tiles_34 = TilesConverter.to_34_array(tiles)
+        flags = (is_tsumo, is_riichi, is_dealer, is_ippatsu, is_rinshan, is_chankan, is_haitei, is_houtei,
+                 is_daburu_riichi, is_tenhou, is_renhou, is_chiihou)
+        key = self.hand_key(tiles_34, win_tile, flags, open_sets, called_kan_indices, player_wind, round_wind,
+                            count_of_dora, count_of_aka_dora)
+
+        result = self.value_cache.get(key)
+        if result is None:
+            result = self._calculate_hand_value(tiles_34, win_tile, *flags, open_sets=open_sets,
+                                                called_kan_indices=called_kan_indices, player_wind=player_wind,
+                                                round_wind=round_wind, count_of_dora=count_of_dora,
+                                                count_of_aka_dora=count_of_aka_dora)
+            self.value_cache.put(key, result)
+
+        # cached results are shared, so return copies of their mutable parts
+        return {'cost': result['cost'] and dict(result['cost']), 'error': result['error'], 'han': result['han'],
+                'fu': result['fu'], 'hand_yaku': list(result['hand_yaku'])}
+
+    @staticmethod
+    def hand_key(tiles_34, win_tile, flags, open_sets, called_kan_indices, player_wind, round_wind, count_of_dora,
+                 count_of_aka_dora):
+        """
+        Canonical, hashable form of everything the value of a hand depends on. Hands which only differ by the copies
+        of their tiles, the order of their open sets or their dora indicators (but not the count of dora) have the
+        same key.
+        :param tiles_34: 34 tiles format array of the 14 tiles
+        :param win_tile: 136 tiles format
+        :param flags: tuple of the situational booleans
+        :param open_sets: list of open sets in 34 tiles format
+        :param called_kan_indices: list of kan tiles in 34 tiles format
+        :return: tuple
+        """
+        return (tuple(tiles_34), win_tile // 4, flags, tuple(sorted(tuple(item) for item in open_sets)),
+                tuple(sorted(called_kan_indices)), player_wind, round_wind, count_of_dora, count_of_aka_dora,
+                settings.OPEN_TANYAO)
+
+    def _calculate_hand_value(self, tiles_34, win_tile, is_tsumo, is_riichi, is_dealer, is_ippatsu, is_rinshan,
+                              is_chankan, is_haitei, is_houtei, is_daburu_riichi, is_tenhou, is_renhou, is_chiihou,
+                              open_sets, called_kan_indices, player_wind, round_wind, count_of_dora,
+                              count_of_aka_dora):
+        """
+        The uncached part of estimate_hand_value(), with the open sets and kans in 34 tiles format and the dora
+        already counted
+        """
+        is_open_hand = len(open_sets) > 0
 
-        agari = Agari()
         cost = None
         error = None
         hand_yaku = []
@@ -91,18 +275,6 @@ class FinishedHand(object):
         def return_response():
             return {'cost': cost, 'error': error, 'han': han, 'fu': fu, 'hand_yaku': hand_yaku}
 
-        # special situation
-        if is_nagashi_mangan:
-            hand_yaku.append(yaku.nagashi_mangan)
-            fu = 30
-            han = yaku.nagashi_mangan.han['closed']
-            cost = self.calculate_scores(han, fu, is_tsumo, is_dealer)
-            return return_response()
-
-        if win_tile not in tiles:
-            error = "Win tile not in the hand"
-            return return_response()
-
         if is_riichi and is_open_hand:
             error = "Riichi can't be declared with open hand"
             return return_response()
@@ -115,14 +287,23 @@ class FinishedHand(object):
             error = "Ippatsu can't be declared without riichi"
             return return_response()
 
-        tiles_34 = TilesConverter.to_34_array(tiles)
-        divider = HandDivider()
-
-        if not agari.is_agari(tiles_34):
+        shape = self.classify_shape(tiles_34, win_tile)
+        if shape is None:
             error = 'Hand is not winning'
             return return_response()
 
-        hand_options = divider.divide_hand(tiles_34, open_sets, called_kan_indices)
+        # the special forms are found without dividing the hand
+        if shape in [KOKUSHI_SHAPE, KOKUSHI_13_SIDED_SHAPE] and not is_open_hand:
+            han = shape.yaku.han['closed']
+            fu = shape.fu
+            cost = self.calculate_scores(han, fu, is_tsumo, is_dealer)
+            hand_yaku = [shape.yaku]
+            return return_response()
+
+        if shape == CHIITOITSU_SHAPE and not is_open_hand:
+            hand_options = [[[x, x] for x in range(0, 34) if tiles_34[x] == 2]]
+        else:
+            hand_options = HandDivider().divide_hand(tiles_34, open_sets, called_kan_indices)
 
         calculated_hands = []
         for hand in hand_options:
@@ -137,10 +318,12 @@ class FinishedHand(object):
             else:
                 fu += 30
 
-            pon_sets = [x for x in hand if is_pon(x)]
-            chi_sets = [x for x in hand if is_chi(x)]
+            # everything the rules below look at, collected once for this division
+            features = HandFeatures(hand)
+            pon_sets = features.pon_sets
+            chi_sets = features.chi_sets
             additional_fu = self.calculate_additional_fu(win_tile,
-                                                         hand,
+                                                         features,
                                                          is_tsumo,
                                                          player_wind,
                                                          round_wind,
@@ -174,15 +357,15 @@ class FinishedHand(object):
             if is_pinfu:
                 hand_yaku.append(yaku.pinfu)
 
-            is_chitoitsu = self.is_chitoitsu(hand)
+            is_chitoitsu = self.is_chitoitsu(features)
             # let's skip hand that looks like chitoitsu, but it contains open sets
             if is_chitoitsu and is_open_hand:
                 continue
 
             if is_chitoitsu:
-                hand_yaku.append(yaku.chiitoitsu)
+                hand_yaku.append(CHIITOITSU_SHAPE.yaku)
 
-            is_tanyao = self.is_tanyao(hand)
+            is_tanyao = self.is_tanyao(features)
             if is_open_hand and not settings.OPEN_TANYAO:
                 is_tanyao = False
 
@@ -219,147 +402,131 @@ class FinishedHand(object):
             if is_chiihou:
                 hand_yaku.append(yaku.chiihou)
 
-            if self.is_honitsu(hand):
+            if self.is_honitsu(features):
                 hand_yaku.append(yaku.honitsu)
 
-            if self.is_chinitsu(hand):
+            if self.is_chinitsu(features):
                 hand_yaku.append(yaku.chinitsu)
 
-            if self.is_tsuisou(hand):
+            if self.is_tsuisou(features):
                 hand_yaku.append(yaku.tsuisou)
 
-            if self.is_honroto(hand):
+            if self.is_honroto(features):
                 hand_yaku.append(yaku.honroto)
 
-            if self.is_chinroto(hand):
+            if self.is_chinroto(features):
                 hand_yaku.append(yaku.chinroto)
 
             # small optimization, try to detect yaku with chi required sets only if we have chi sets in hand
             if len(chi_sets):
-                if self.is_chanta(hand):
+                if self.is_chanta(features):
                     hand_yaku.append(yaku.chanta)
 
-                if self.is_junchan(hand):
+                if self.is_junchan(features):
                     hand_yaku.append(yaku.junchan)
 
-                if self.is_ittsu(hand):
+                if self.is_ittsu(features):
                     hand_yaku.append(yaku.ittsu)
 
                 if not is_open_hand:
-                    if self.is_ryanpeiko(hand):
+                    if self.is_ryanpeiko(features):
                         hand_yaku.append(yaku.ryanpeiko)
-                    elif self.is_iipeiko(hand):
+                    elif self.is_iipeiko(features):
                         hand_yaku.append(yaku.iipeiko)
 
-                if self.is_sanshoku(hand):
+                if self.is_sanshoku(features):
                     hand_yaku.append(yaku.sanshoku)
 
             # small optimization, try to detect yaku with pon required sets only if we have pon sets in hand
             if len(pon_sets):
-                if self.is_toitoi(hand):
+                if self.is_toitoi(features):
                     hand_yaku.append(yaku.toitoi)
 
-                if self.is_sanankou(win_tile, hand, open_sets, is_tsumo):
+                if self.is_sanankou(win_tile, features, open_sets, is_tsumo):
                     hand_yaku.append(yaku.sanankou)
 
-                if self.is_sanshoku_douko(hand):
+                if self.is_sanshoku_douko(features):
                     hand_yaku.append(yaku.sanshoku_douko)
 
-                if self.is_shosangen(hand):
+                if self.is_shosangen(features):
                     hand_yaku.append(yaku.shosangen)
 
-                if self.is_haku(hand):
+                if self.is_haku(features):
                     hand_yaku.append(yaku.haku)
 
-                if self.is_hatsu(hand):
+                if self.is_hatsu(features):
                     hand_yaku.append(yaku.hatsu)
 
-                if self.is_chun(hand):
+                if self.is_chun(features):
                     hand_yaku.append(yaku.hatsu)
 
-                if self.is_east(hand, player_wind, round_wind):
+                if self.is_east(features, player_wind, round_wind):
                     if player_wind == EAST:
                         hand_yaku.append(yaku.yakuhai_place)
 
                     if round_wind == EAST:
                         hand_yaku.append(yaku.yakuhai_round)
 
-                if self.is_south(hand, player_wind, round_wind):
+                if self.is_south(features, player_wind, round_wind):
                     if player_wind == SOUTH:
                         hand_yaku.append(yaku.yakuhai_place)
 
                     if round_wind == SOUTH:
                         hand_yaku.append(yaku.yakuhai_round)
 
-                if self.is_west(hand, player_wind, round_wind):
+                if self.is_west(features, player_wind, round_wind):
                     if player_wind == WEST:
                         hand_yaku.append(yaku.yakuhai_place)
 
                     if round_wind == WEST:
                         hand_yaku.append(yaku.yakuhai_round)
 
-                if self.is_north(hand, player_wind, round_wind):
+                if self.is_north(features, player_wind, round_wind):
                     if player_wind == NORTH:
                         hand_yaku.append(yaku.yakuhai_place)
 
                     if round_wind == NORTH:
                         hand_yaku.append(yaku.yakuhai_round)
 
-                if self.is_daisangen(hand):
+                if self.is_daisangen(features):
                     hand_yaku.append(yaku.daisangen)
 
-                if self.is_shosuushi(hand):
+                if self.is_shosuushi(features):
                     hand_yaku.append(yaku.shosuushi)
 
-                if self.is_daisuushi(hand):
+                if self.is_daisuushi(features):
                     hand_yaku.append(yaku.daisuushi)
 
-                if self.is_ryuisou(hand):
+                if self.is_ryuisou(features):
                     hand_yaku.append(yaku.ryuisou)
 
-                if not is_open_hand and self.is_chuuren_poutou(hand):
+                if not is_open_hand and self.is_chuuren_poutou(features):
                     if tiles_34[win_tile // 4] == 2:
                         hand_yaku.append(yaku.daburu_chuuren_poutou)
                     else:
                         hand_yaku.append(yaku.chuuren_poutou)
 
-                if not is_open_hand and self.is_suuankou(win_tile, hand, is_tsumo):
+                if not is_open_hand and self.is_suuankou(win_tile, features, is_tsumo):
                     if tiles_34[win_tile // 4] == 2:
                         hand_yaku.append(yaku.suuankou_tanki)
                     else:
                         hand_yaku.append(yaku.suuankou)
 
-                if self.is_sankantsu(hand, called_kan_indices):
+                if self.is_sankantsu(features, called_kan_indices):
                     hand_yaku.append(yaku.sankantsu)
 
-                if self.is_suukantsu(hand, called_kan_indices):
+                if self.is_suukantsu(features, called_kan_indices):
                     hand_yaku.append(yaku.suukantsu)
 
-            # chitoitsu is always 25 fu
             if is_chitoitsu:
-                fu = 25
-
-            tiles_for_dora = tiles + kan_indices_136
-            count_of_dora = 0
-            count_of_aka_dora = 0
-            for tile in tiles_for_dora:
-                count_of_dora += plus_dora(tile, dora_indicators)
-
-            for tile in tiles_for_dora:
-                if is_aka_dora(tile):
-                    count_of_aka_dora += 1
+                fu = CHIITOITSU_SHAPE.fu
 
+            # new items rather than changing yaku.dora, as results with other counts of dora are kept in the cache
             if count_of_dora:
-                yaku_item = yaku.dora
-                yaku_item.han['open'] = count_of_dora
-                yaku_item.han['closed'] = count_of_dora
-                hand_yaku.append(yaku_item)
+                hand_yaku.append(yaku.Yaku(yaku.dora.name, count_of_dora, count_of_dora))
 
             if count_of_aka_dora:
-                yaku_item = yaku.aka_dora
-                yaku_item.han['open'] = count_of_aka_dora
-                yaku_item.han['closed'] = count_of_aka_dora
-                hand_yaku.append(yaku_item)
+                hand_yaku.append(yaku.Yaku(yaku.aka_dora.name, count_of_aka_dora, count_of_aka_dora))
 
             # yakuman is not connected with other yaku
             yakuman_list = [x for x in hand_yaku if x.is_yakuman]
@@ -393,22 +560,6 @@ class FinishedHand(object):
             }
             calculated_hands.append(calculated_hand)
 
-        # exception hand
-        if not is_open_hand and self.is_kokushi(tiles_34):
-            if tiles_34[win_tile // 4] == 2:
-                han = yaku.daburu_kokushi.han['closed']
-            else:
-                han = yaku.kokushi.han['closed']
-            fu = 0
-            cost = self.calculate_scores(han, fu, is_tsumo, is_dealer)
-            calculated_hands.append({
-                'cost': cost,
-                'error': None,
-                'hand_yaku': [yaku.kokushi],
-                'han': han,
-                'fu': fu
-            })
-
         # let's use cost for most expensive hand
         calculated_hands = sorted(calculated_hands, key=lambda x: (x['han'], x['fu']), reverse=True)
         calculated_hand = calculated_hands[0]
@@ -420,6 +571,22 @@ class FinishedHand(object):
 
         return return_response()
 
+    def classify_shape(self, tiles_34, win_tile):
+        """
+        Tell the special forms of a complete hand from the regular one, in one pass over the tiles.
+        A hand which is both seven pairs and sets (e.g. ryanpeiko) is regular, its divisions include the pairs.
+        :param tiles_34: 34 tiles format array, including the tiles of open sets
+        :param win_tile: 136 tiles format
+        :return: HandShape, or None if the hand is not complete
+        """
+        if is_kokushi(tiles_34):
+            return tiles_34[win_tile // 4] == 2 and KOKUSHI_13_SIDED_SHAPE or KOKUSHI_SHAPE
+        if is_regular_agari(tiles_34):
+            return REGULAR_SHAPE
+        if is_chiitoitsu(tiles_34):
+            return CHIITOITSU_SHAPE
+        return None
+
     def calculate_scores(self, han, fu, is_tsumo, is_dealer):
         """
         Calculate how much scores cost a hand with given han and fu
@@ -432,58 +599,13 @@ class FinishedHand(object):
         for tsumo main cost is cost for dealer and additional is cost for player
         {'main': 1000, 'additional': 0}
         """
-        if han >= 5:
-            # double yakuman
-            if han >= 26:
-                rounded = 16000
-            # yakuman
-            elif han >= 13:
-                rounded = 8000
-            # sanbaiman
-            elif han >= 11:
-                rounded = 6000
-            # baiman
-            elif han >= 8:
-                rounded = 4000
-            # haneman
-            elif han >= 6:
-                rounded = 3000
-            else:
-                rounded = 2000
-
-            double_rounded = rounded * 2
-            four_rounded = double_rounded * 2
-            six_rounded = double_rounded * 3
-        else:
-            base_points = fu * pow(2, 2 + han)
-            rounded = math.ceil(base_points / 100.) * 100
-            double_rounded = math.ceil(2 * base_points / 100.) * 100
-            four_rounded = math.ceil(4 * base_points / 100.) * 100
-            six_rounded = math.ceil(6 * base_points / 100.) * 100
-
-            # mangan
-            if rounded > 2000:
-                rounded = 2000
-                double_rounded = rounded * 2
-                four_rounded = double_rounded * 2
-                six_rounded = double_rounded * 3
-
-            # kiriage mangan
-            if han == 4 and fu == 30:
-                rounded = 2000
-                double_rounded = 3900
-                four_rounded = 7700
-                six_rounded = 11600
-
-        if is_tsumo:
-            return {'main': double_rounded, 'additional': is_dealer and double_rounded or rounded}
-        else:
-            return {'main': is_dealer and six_rounded or four_rounded, 'additional': 0}
+        main, additional = SCORE_TABLE.cost(han, fu, is_tsumo, is_dealer)
+        return {'main': main, 'additional': additional}
 
     def calculate_additional_fu(self, win_tile, hand, is_tsumo, player_wind, round_wind, open_sets, called_kan_indices):
         """
         :param win_tile: "136 format" tile
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param player_wind:
         :param round_wind:
         :param open_sets: array of array with 34 tiles format
@@ -492,14 +614,12 @@ class FinishedHand(object):
         """
         win_tile //= 4
         additional_fu = 0
+        features = HandFeatures.of(hand)
 
-        closed_hand = []
-        for set_item in hand:
-            if not is_pair(set_item) and set_item not in open_sets:
-                closed_hand.append(set_item)
+        closed_hand = [x for x in features.pon_sets + features.chi_sets if x not in open_sets]
 
-        pon_sets = [x for x in hand if is_pon(x)]
-        chi_sets = [x for x in hand if (win_tile in x and is_chi(x))]
+        pon_sets = features.pon_sets
+        chi_sets = [x for x in features.chi_sets if win_tile in x]
         closed_hand_indices = closed_hand and reduce(lambda z, y: z + y, closed_hand) or []
 
         # there is no sense to check identical sets
@@ -552,7 +672,7 @@ class FinishedHand(object):
                     additional_fu += set_was_open and 2 or 4
 
         # valued pair
-        pair = [x for x in hand if is_pair(x)][0][0]
+        pair = features.pairs[0]
         valued_indices = [HAKU, HATSU, CHUN, player_wind, round_wind]
         count_of_valued_pairs = [x for x in valued_indices if x == pair]
         if len(count_of_valued_pairs):
@@ -586,515 +706,291 @@ class FinishedHand(object):
     def is_chitoitsu(self, hand):
         """
         Hand contains only pairs
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        return len(hand) == 7
+        return len(HandFeatures.of(hand).hand) == 7
 
     def is_tanyao(self, hand):
         """
         Hand without 1, 9, dragons and winds
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        indices = reduce(lambda z, y: z + y, hand)
-        result = TERMINAL_INDICES + HONOR_INDICES
-        return not any(x in result for x in indices)
+        return not HandFeatures.of(hand).tile_mask & (TERMINAL_MASK | HONOR_MASK)
 
     def is_iipeiko(self, hand):
         """
         Hand with two identical chi
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        chi_sets = [i for i in hand if is_chi(i)]
-
-        count_of_identical_chi = 0
-        for x in chi_sets:
-            count = 0
-            for y in chi_sets:
-                if x == y:
-                    count += 1
-            if count > count_of_identical_chi:
-                count_of_identical_chi = count
-
-        return count_of_identical_chi >= 2
+        return max(HandFeatures.of(hand).chi_counts) >= 2
 
     def is_ryanpeiko(self, hand):
         """
         The hand contains two different Iipeikou’s
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        chi_sets = [i for i in hand if is_chi(i)]
-        count_of_identical_chi = []
-        for x in chi_sets:
-            count = 0
-            for y in chi_sets:
-                if x == y:
-                    count += 1
-            count_of_identical_chi.append(count)
-
-        return len([x for x in count_of_identical_chi if x >= 2]) == 4
+        return sum(x for x in HandFeatures.of(hand).chi_counts if x >= 2) == 4
 
     def is_toitoi(self, hand):
         """
         The hand consists of all pon sets (and of course a pair), no sequences.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        count_of_pon = len([i for i in hand if is_pon(i)])
-        return count_of_pon == 4
+        return len(HandFeatures.of(hand).pon_sets) == 4
 
     def is_sankantsu(self, hand, called_kan_indices):
         """
         The hand with three kan sets
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param called_kan_indices: array of 34 tiles format
         :return: true|false
         """
         if len(called_kan_indices) != 3:
             return False
 
-        pon_sets = [i for i in hand if is_pon(i)]
-        count_of_kan_sets = 0
-        for item in pon_sets:
-            if item[0] in called_kan_indices:
-                count_of_kan_sets += 1
-
-        return count_of_kan_sets == 3
+        pon_counts = HandFeatures.of(hand).pon_counts
+        return sum(pon_counts[x] for x in set(called_kan_indices)) == 3
 
     def is_honroto(self, hand):
         """
         All tiles are terminals or honours
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        indices = reduce(lambda z, y: z + y, hand)
-        result = HONOR_INDICES + TERMINAL_INDICES
-        return all(x in result for x in indices)
+        return not HandFeatures.of(hand).tile_mask & ~(TERMINAL_MASK | HONOR_MASK)
 
     def is_sanankou(self, win_tile, hand, open_sets, is_tsumo):
         """
         Three closed pon sets, the other sets need not to be closed
         :param win_tile: 136 tiles format
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param open_sets: list of open sets
         :param is_tsumo:
         :return: true|false
         """
         win_tile //= 4
+        features = HandFeatures.of(hand)
 
-        chi_sets = [x for x in hand if (is_chi(x) and win_tile in x and x not in open_sets)]
-        pon_sets = [x for x in hand if is_pon(x)]
+        # if we do the ron on syanpon wait our pon will be consider as open
+        # and it is not 789999 set
+        ron_on_pon = not is_tsumo and not any(win_tile in x and x not in open_sets for x in features.chi_sets)
 
-        closed_pon_sets = []
-        for item in pon_sets:
-            if item in open_sets:
+        count_of_closed_pon_sets = 0
+        for item in features.pon_sets:
+            if item in open_sets or (ron_on_pon and item[0] == win_tile):
                 continue
+            count_of_closed_pon_sets += 1
 
-            # if we do the ron on syanpon wait our pon will be consider as open
-            # and it is not 789999 set
-            if win_tile in item and not is_tsumo and not len(chi_sets):
-                continue
-
-            closed_pon_sets.append(item)
-
-        return len(closed_pon_sets) == 3
+        return count_of_closed_pon_sets == 3
 
     def is_shosangen(self, hand):
         """
         Hand with two dragon pon sets and one dragon pair
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        dragons = [CHUN, HAKU, HATSU]
-        count_of_conditions = 0
-        for item in hand:
-            # dragon pon or pair
-            if (is_pair(item) or is_pon(item)) and item[0] in dragons:
-                count_of_conditions += 1
-
+        features = HandFeatures.of(hand)
+        count_of_conditions = sum(features.pon_counts[x] for x in DRAGONS)
+        count_of_conditions += len([x for x in features.pairs if x in DRAGONS])
         return count_of_conditions == 3
 
     def is_chanta(self, hand):
         """
         Every set must have at least one terminal or honour tile, and the pair must be of
         a terminal or honour tile. Must contain at least one sequence (123 or 789).
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-
-        def tile_in_indices(item_set, indices_array):
-            for x in item_set:
-                if x in indices_array:
-                    return True
-            return False
-
-        honor_sets = 0
-        terminal_sets = 0
-        count_of_chi = 0
-        for item in hand:
-            if is_chi(item):
-                count_of_chi += 1
-
-            if tile_in_indices(item, TERMINAL_INDICES):
-                terminal_sets += 1
-
-            if tile_in_indices(item, HONOR_INDICES):
-                honor_sets += 1
-
-        if count_of_chi == 0:
+        features = HandFeatures.of(hand)
+        if not features.chi_sets:
             return False
 
+        terminal_sets = features.count_of_terminal_sets
+        honor_sets = features.count_of_honor_sets
         return terminal_sets + honor_sets == 5 and terminal_sets != 0 and honor_sets != 0
 
     def is_junchan(self, hand):
         """
         Every set must have at least one terminal, and the pair must be of
         a terminal tile. Must contain at least one sequence (123 or 789).
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-
-        def tile_in_indices(item_set, indices_array):
-            for x in item_set:
-                if x in indices_array:
-                    return True
-            return False
-
-        terminal_sets = 0
-        count_of_chi = 0
-        for item in hand:
-            if is_chi(item):
-                count_of_chi += 1
-
-            if tile_in_indices(item, TERMINAL_INDICES):
-                terminal_sets += 1
-
-        if count_of_chi == 0:
-            return False
-
-        return terminal_sets == 5
+        features = HandFeatures.of(hand)
+        return len(features.chi_sets) > 0 and features.count_of_terminal_sets == 5
 
     def is_ittsu(self, hand):
         """
         Three sets of same suit: 1-2-3, 4-5-6, 7-8-9
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-
-        chi_sets = [i for i in hand if is_chi(i)]
-        if len(chi_sets) < 3:
-            return False
-
-        sou_chi = []
-        pin_chi = []
-        man_chi = []
-        for item in chi_sets:
-            if is_sou(item[0]):
-                sou_chi.append(item)
-            elif is_pin(item[0]):
-                pin_chi.append(item)
-            elif is_man(item[0]):
-                man_chi.append(item)
-
-        sets = [sou_chi, pin_chi, man_chi]
-
-        for suit_item in sets:
-            if len(suit_item) < 3:
-                continue
-
-            casted_sets = []
-
-            for set_item in suit_item:
-                # cast tiles indices to 0..8 representation
-                casted_sets.append([simplify(set_item[0]),
-                                    simplify(set_item[1]),
-                                    simplify(set_item[2])])
-
-            if [0, 1, 2] in casted_sets and [3, 4, 5] in casted_sets and [6, 7, 8] in casted_sets:
-                return True
-
-        return False
+        chi_counts = HandFeatures.of(hand).chi_counts
+        return any(chi_counts[x] and chi_counts[x + 3] and chi_counts[x + 6] for x in [0, 9, 18])
 
     def is_sanshoku(self, hand):
         """
         The same chi in three suits
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        chi_sets = [i for i in hand if is_chi(i)]
-        if len(chi_sets) < 3:
-            return False
-
-        sou_chi = []
-        pin_chi = []
-        man_chi = []
-        for item in chi_sets:
-            if is_sou(item[0]):
-                sou_chi.append(item)
-            elif is_pin(item[0]):
-                pin_chi.append(item)
-            elif is_man(item[0]):
-                man_chi.append(item)
-
-        for sou_item in sou_chi:
-            for pin_item in pin_chi:
-                for man_item in man_chi:
-                    # cast tile indices to 0..8 representation
-                    sou_item = [simplify(x) for x in sou_item]
-                    pin_item = [simplify(x) for x in pin_item]
-                    man_item = [simplify(x) for x in man_item]
-                    if sou_item == pin_item == man_item:
-                        return True
-        return False
+        chi_counts = HandFeatures.of(hand).chi_counts
+        return any(chi_counts[x] and chi_counts[x + 9] and chi_counts[x + 18] for x in range(0, 7))
 
     def is_sanshoku_douko(self, hand):
         """
         Three pon sets consisting of the same numbers in all three suits
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        pon_sets = [i for i in hand if is_pon(i)]
-        if len(pon_sets) < 3:
-            return False
-
-        sou_pon = []
-        pin_pon = []
-        man_pon = []
-        for item in pon_sets:
-            if is_sou(item[0]):
-                sou_pon.append(item)
-            elif is_pin(item[0]):
-                pin_pon.append(item)
-            elif is_man(item[0]):
-                man_pon.append(item)
-
-        for sou_item in sou_pon:
-            for pin_item in pin_pon:
-                for man_item in man_pon:
-                    # cast tile indices to 1..9 representation
-                    sou_item = [simplify(x) for x in sou_item]
-                    pin_item = [simplify(x) for x in pin_item]
-                    man_item = [simplify(x) for x in man_item]
-                    if sou_item == pin_item == man_item:
-                        return True
-        return False
+        pon_counts = HandFeatures.of(hand).pon_counts
+        return any(pon_counts[x] and pon_counts[x + 9] and pon_counts[x + 18] for x in range(0, 9))
 
     def is_honitsu(self, hand):
         """
         The hand contains tiles from a single suit plus honours.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        honor_sets = 0
-        sou_sets = 0
-        pin_sets = 0
-        man_sets = 0
-        for item in hand:
-            if item[0] in HONOR_INDICES:
-                honor_sets += 1
-
-            if is_sou(item[0]):
-                sou_sets += 1
-            elif is_pin(item[0]):
-                pin_sets += 1
-            elif is_man(item[0]):
-                man_sets += 1
-
-        sets = [sou_sets, pin_sets, man_sets]
-        only_one_suit = len([x for x in sets if x != 0]) == 1
-
-        return only_one_suit and honor_sets != 0
+        features = HandFeatures.of(hand)
+        return features.count_of_suits == 1 and bool(features.suit_mask & HONOR_SET)
 
     def is_chinitsu(self, hand):
         """
         The hand contains tiles from a single suit
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        honor_sets = 0
-        sou_sets = 0
-        pin_sets = 0
-        man_sets = 0
-        for item in hand:
-            if item[0] in HONOR_INDICES:
-                honor_sets += 1
-
-            if is_sou(item[0]):
-                sou_sets += 1
-            elif is_pin(item[0]):
-                pin_sets += 1
-            elif is_man(item[0]):
-                man_sets += 1
-
-        sets = [sou_sets, pin_sets, man_sets]
-        only_one_suit = len([x for x in sets if x != 0]) == 1
-
-        return only_one_suit and honor_sets == 0
+        features = HandFeatures.of(hand)
+        return features.count_of_suits == 1 and not features.suit_mask & HONOR_SET
 
     def is_haku(self, hand):
         """
         Pon of white dragons
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        return len([x for x in hand if is_pon(x) and x[0] == HAKU]) == 1
+        return HandFeatures.of(hand).pon_counts[HAKU] == 1
 
     def is_hatsu(self, hand):
         """
         Pon of green dragons
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        return len([x for x in hand if is_pon(x) and x[0] == HATSU]) == 1
+        return HandFeatures.of(hand).pon_counts[HATSU] == 1
 
     def is_chun(self, hand):
         """
         Pon of red dragons
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        return len([x for x in hand if is_pon(x) and x[0] == CHUN]) == 1
+        return HandFeatures.of(hand).pon_counts[CHUN] == 1
+
+    def _is_wind_pon(self, hand, wind, player_wind, round_wind):
+        """
+        Pon of the given wind, if it is the wind of the player or of the round
+        """
+        if wind != player_wind and wind != round_wind:
+            return False
+        return HandFeatures.of(hand).pon_counts[wind] == 1
 
     def is_east(self, hand, player_wind, round_wind):
         """
         Pon of east winds
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param player_wind: index of player wind
         :param round_wind: index of round wind
         :return: true|false
         """
-
-        if len([x for x in hand if is_pon(x) and x[0] == player_wind]) == 1 and player_wind == EAST:
-            return True
-
-        if len([x for x in hand if is_pon(x) and x[0] == round_wind]) == 1 and round_wind == EAST:
-            return True
-
-        return False
+        return self._is_wind_pon(hand, EAST, player_wind, round_wind)
 
     def is_south(self, hand, player_wind, round_wind):
         """
         Pon of south winds
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param player_wind: index of player wind
         :param round_wind: index of round wind
         :return: true|false
         """
-
-        if len([x for x in hand if is_pon(x) and x[0] == player_wind]) == 1 and player_wind == SOUTH:
-            return True
-
-        if len([x for x in hand if is_pon(x) and x[0] == round_wind]) == 1 and round_wind == SOUTH:
-            return True
-
-        return False
+        return self._is_wind_pon(hand, SOUTH, player_wind, round_wind)
 
     def is_west(self, hand, player_wind, round_wind):
         """
         Pon of west winds
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param player_wind: index of player wind
         :param round_wind: index of round wind
         :return: true|false
         """
-
-        if len([x for x in hand if is_pon(x) and x[0] == player_wind]) == 1 and player_wind == WEST:
-            return True
-
-        if len([x for x in hand if is_pon(x) and x[0] == round_wind]) == 1 and round_wind == WEST:
-            return True
-
-        return False
+        return self._is_wind_pon(hand, WEST, player_wind, round_wind)
 
     def is_north(self, hand, player_wind, round_wind):
         """
         Pon of north winds
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param player_wind: index of player wind
         :param round_wind: index of round wind
         :return: true|false
         """
-
-        if len([x for x in hand if is_pon(x) and x[0] == player_wind]) == 1 and player_wind == NORTH:
-            return True
-
-        if len([x for x in hand if is_pon(x) and x[0] == round_wind]) == 1 and round_wind == NORTH:
-            return True
-
-        return False
+        return self._is_wind_pon(hand, NORTH, player_wind, round_wind)
 
     def is_daisangen(self, hand):
         """
         The hand contains three sets of dragons
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        count_of_dragon_pon_sets = 0
-        for item in hand:
-            if is_pon(item) and item[0] in [CHUN, HAKU, HATSU]:
-                count_of_dragon_pon_sets += 1
-        return count_of_dragon_pon_sets == 3
+        pon_counts = HandFeatures.of(hand).pon_counts
+        return sum(pon_counts[x] for x in DRAGONS) == 3
 
     def is_shosuushi(self, hand):
         """
         The hand contains three sets of winds and a pair of the remaining wind.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        pon_sets = [x for x in hand if is_pon(x)]
-        if len(pon_sets) < 3:
+        features = HandFeatures.of(hand)
+        if len(features.pon_sets) < 3:
             return False
 
-        count_of_wind_sets = 0
-        wind_pair = 0
-        winds = [EAST, SOUTH, WEST, NORTH]
-        for item in hand:
-            if is_pon(item) and item[0] in winds:
-                count_of_wind_sets += 1
-
-            if is_pair(item) and item[0] in winds:
-                wind_pair += 1
-
+        count_of_wind_sets = sum(features.pon_counts[x] for x in WINDS)
+        wind_pair = len([x for x in features.pairs if x in WINDS])
         return count_of_wind_sets == 3 and wind_pair == 1
 
     def is_daisuushi(self, hand):
         """
         The hand contains four sets of winds
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        pon_sets = [x for x in hand if is_pon(x)]
-        if len(pon_sets) != 4:
+        features = HandFeatures.of(hand)
+        if len(features.pon_sets) != 4:
             return False
 
-        count_wind_sets = 0
-        winds = [EAST, SOUTH, WEST, NORTH]
-        for item in pon_sets:
-            if is_pon(item) and item[0] in winds:
-                count_wind_sets += 1
-
-        return count_wind_sets == 4
+        return sum(features.pon_counts[x] for x in WINDS) == 4
 
     def is_tsuisou(self, hand):
         """
         Hand composed entirely of honour tiles.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        indices = reduce(lambda z, y: z + y, hand)
-        return all(x in HONOR_INDICES for x in indices)
+        return not HandFeatures.of(hand).tile_mask & ~HONOR_MASK
 
     def is_chinroto(self, hand):
         """
         Hand composed entirely of terminal tiles.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        indices = reduce(lambda z, y: z + y, hand)
-        return all(x in TERMINAL_INDICES for x in indices)
+        return not HandFeatures.of(hand).tile_mask & ~TERMINAL_MASK
 
     def is_kokushi(self, tiles_34):
         """
@@ -1111,102 +1007,61 @@ class FinishedHand(object):
     def is_ryuisou(self, hand):
         """
         Hand composed entirely of green tiles. Green tiles are: green dragons and 2, 3, 4, 6 and 8 of sou.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-        green_indices = [19, 20, 21, 23, 25, HATSU]
-        indices = reduce(lambda z, y: z + y, hand)
-        return all(x in green_indices for x in indices)
+        return not HandFeatures.of(hand).tile_mask & ~GREEN_MASK
 
     def is_suuankou(self, win_tile, hand, is_tsumo):
         """
         Four closed pon sets
         :param win_tile: 136 tiles format
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param is_tsumo:
         :return: true|false
         """
         win_tile //= 4
-        closed_hand = []
-        for item in hand:
-            # if we do the ron on syanpon wait our pon will be consider as open
-            if is_pon(item) and win_tile in item and not is_tsumo:
-                continue
-
-            closed_hand.append(item)
+        features = HandFeatures.of(hand)
 
-        count_of_pon = len([i for i in closed_hand if is_pon(i)])
+        count_of_pon = len(features.pon_sets)
+        # if we do the ron on syanpon wait our pon will be consider as open
+        if not is_tsumo:
+            count_of_pon -= features.pon_counts[win_tile]
         return count_of_pon == 4
 
     def is_chuuren_poutou(self, hand):
         """
         The hand contains 1-1-1-2-3-4-5-6-7-8-9-9-9 of one suit, plus any other tile of the same suit.
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :return: true|false
         """
-
-        sou_sets = 0
-        pin_sets = 0
-        man_sets = 0
-        honor_sets = 0
-        for item in hand:
-            if is_sou(item[0]):
-                sou_sets += 1
-            elif is_pin(item[0]):
-                pin_sets += 1
-            elif is_man(item[0]):
-                man_sets += 1
-            else:
-                honor_sets += 1
-
-        sets = [sou_sets, pin_sets, man_sets]
-        only_one_suit = len([x for x in sets if x != 0]) == 1
-        if not only_one_suit or honor_sets > 0:
+        features = HandFeatures.of(hand)
+        if features.count_of_suits != 1 or features.suit_mask & HONOR_SET:
             return False
 
-        indices = reduce(lambda z, y: z + y, hand)
-        # cast tile indices to 0..8 representation
-        indices = [simplify(x) for x in indices]
-
-        # 1-1-1
-        if len([x for x in indices if x == 0]) < 3:
-            return False
+        first_index = {SOU_SET: 0, PIN_SET: 9, MAN_SET: 18}[features.suit_mask]
+        counts = features.tile_counts[first_index:first_index + 9]
 
-        # 9-9-9
-        if len([x for x in indices if x == 8]) < 3:
+        # 1-1-1 and 9-9-9
+        if counts[0] < 3 or counts[8] < 3:
             return False
 
         # 1-2-3-4-5-6-7-8-9 and one tile to any of them
-        indices.remove(0)
-        indices.remove(0)
-        indices.remove(8)
-        indices.remove(8)
-        for x in range(0, 9):
-            if x in indices:
-                indices.remove(x)
-
-        if len(indices) == 1:
-            return True
-
-        return False
+        count_of_kinds = len([x for x in counts if x])
+        return sum(counts) - 4 - count_of_kinds == 1
 
     def is_suukantsu(self, hand, called_kan_indices):
         """
         The hand with four kan sets
-        :param hand: list of hand's sets
+        :param hand: list of hand's sets, or their HandFeatures
         :param called_kan_indices: array of 34 tiles format
         :return: true|false
         """
         if len(called_kan_indices) != 4:
             return False
 
-        pon_sets = [i for i in hand if is_pon(i)]
-        count_of_kan_sets = 0
-        for item in pon_sets:
-            if item[0] in called_kan_indices:
-                count_of_kan_sets += 1
-
-        return count_of_kan_sets == 4
+        pon_counts = HandFeatures.of(hand).pon_counts
+        return sum(pon_counts[x] for x in set(called_kan_indices)) == 4
 
 
 class HandDivider(object):
@@ -1223,6 +1078,8 @@ class HandDivider(object):
         # small optimization, we can't have a pair in open part of the hand,
         # so we don't need to try find pairs in open sets
         open_tile_indices = open_sets and reduce(lambda x, y: x + y, open_sets) or []
+        # closed kans are removed below, from a copy so that the caller's array is not changed
+        tiles_34 = tiles_34[:]
         closed_hand_tiles_34 = tiles_34[:]
         for open_item in open_tile_indices:
             closed_hand_tiles_34[open_item] -= 1
@@ -1299,9 +1156,12 @@ class HandDivider(object):
 
         # small optimization, let's remove hand duplicates
         unique_hands = []
+        seen_hands = set()
         for hand in hands:
             hand = sorted(hand, key=lambda x: (x[0], x[1]))
-            if hand not in unique_hands:
+            key = tuple(tuple(x) for x in hand)
+            if key not in seen_hands:
+                seen_hands.add(key)
                 unique_hands.append(hand)
 
         hands = unique_hands
@@ -1338,88 +1198,46 @@ class HandDivider(object):
         :param second_index:
         :return: list of valid combinations
         """
-        indices = []
-        for x in range(first_index, second_index + 1):
-            if tiles_34[x] > 0:
-                indices.extend([x] * tiles_34[x])
-
-        if not indices:
+        counts = tuple(tiles_34[first_index:second_index + 1])
+        if not any(counts):
             return []
 
-        all_possible_combinations = list(itertools.permutations(indices, 3))
-
-        def is_valid_combination(possible_set):
-            if is_chi(possible_set):
-                return True
-
-            if is_pon(possible_set):
-                return True
-
-            return False
-
-        valid_combinations = []
-        for combination in all_possible_combinations:
-            if is_valid_combination(combination):
-                valid_combinations.append(list(combination))
-
-        if not valid_combinations:
-            return []
+        return [[[first_index + x for x in set_item] for set_item in combination]
+                for combination in suit_combinations(counts)]
+
+
+@lru_cache(maxsize=None)
+def suit_combinations(counts):
+    """
+    Find every way to split the tiles of a suit into chi and pon sets, using all of the tiles.
+    Results are memoized by the count vector, so each suit shape is only decomposed once.
+    :param counts: tuple with the count of each of the 9 tiles of the suit
+    :return: tuple of combinations, each a tuple of sets of 0..8 indices ordered by their first tile
+    """
+    first_index = 0
+    while first_index < len(counts) and not counts[first_index]:
+        first_index += 1
+    if first_index == len(counts):
+        return ((),)
+
+    combinations = []
+    # every copy of the first remaining tile begins a set, so it is either in a pon or the first tile of a chi.
+    # Deciding only how many of them are in a pon, each combination is found exactly once
+    count = counts[first_index]
+    for count_of_pon in (0, 1):
+        count_of_chi = count - 3 * count_of_pon
+        if count_of_chi < 0:
+            break
+        rest = list(counts)
+        rest[first_index] = 0
+        if count_of_chi:
+            if first_index + 2 >= len(counts) or \
+                    rest[first_index + 1] < count_of_chi or rest[first_index + 2] < count_of_chi:
+                continue
+            rest[first_index + 1] -= count_of_chi
+            rest[first_index + 2] -= count_of_chi
+        chi = (first_index, first_index + 1, first_index + 2)
+        sets = ((first_index,) * 3,) * count_of_pon + (chi,) * count_of_chi
+        combinations.extend(sets + x for x in suit_combinations(tuple(rest)))
 
-        count_of_needed_combinations = int(len(indices) / 3)
-
-        # simple case, we have count of sets == count of tiles
-        if count_of_needed_combinations == len(valid_combinations) and \
-                reduce(lambda z, y: z + y, valid_combinations) == indices:
-            return [valid_combinations]
-
-        # filter and remove not possible pon sets
-        for item in valid_combinations:
-            if is_pon(item):
-                count_of_sets = 1
-                count_of_tiles = 0
-                while count_of_sets > count_of_tiles:
-                    count_of_tiles = len([x for x in indices if x == item[0]]) / 3
-                    count_of_sets = len([x for x in valid_combinations
-                                         if x[0] == item[0] and x[1] == item[1] and x[2] == item[2]])
-
-                    if count_of_sets > count_of_tiles:
-                        valid_combinations.remove(item)
-
-        # filter and remove not possible chi sets
-        for item in valid_combinations:
-            if is_chi(item):
-                count_of_sets = 5
-                # TODO calculate real count of possible sets
-                count_of_possible_sets = 4
-                while count_of_sets > count_of_possible_sets:
-                    count_of_sets = len([x for x in valid_combinations
-                                         if x[0] == item[0] and x[1] == item[1] and x[2] == item[2]])
-
-                    if count_of_sets > count_of_possible_sets:
-                        valid_combinations.remove(item)
-
-        # hard case - we can build a lot of sets from our tiles
-        # for example we have 123456 tiles and we can build sets:
-        # [1, 2, 3] [4, 5, 6] [2, 3, 4] [3, 4, 5]
-        # and only two of them valid in the same time [1, 2, 3] [4, 5, 6]
-
-        possible_combinations = set(itertools.permutations(
-            range(0, len(valid_combinations)), count_of_needed_combinations
-        ))
-
-        combinations_results = []
-        for combination in possible_combinations:
-            result = []
-            for item in combination:
-                result += valid_combinations[item]
-            result = sorted(result)
-
-            if result == indices:
-                results = []
-                for item in combination:
-                    results.append(valid_combinations[item])
-                results = sorted(results, key=lambda z: z[0])
-                if results not in combinations_results:
-                    combinations_results.append(results)
-
-        return combinations_results
+    return tuple(combinations)
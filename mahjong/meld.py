@@ -15,6 +15,14 @@ class Meld(object):
     from_who = None
     kan_type = None
 
+    def __eq__(self, other):
+        if not isinstance(other, Meld):
+            return NotImplemented
+        return (self.who, list(self.tiles), self.call_tile, self.type, self.from_who, self.kan_type) == \
+               (other.who, list(other.tiles), other.call_tile, other.type, other.from_who, other.kan_type)
+
+    __hash__ = None  # Melds are mutable
+
     def __str__(self):
         return 'Who: {0}, Type: {1}, Tiles: {2}'.format(self.who, self.type, self.tiles)
 
@@ -29,9 +29,23 @@ class Player(object):
         self.sex = ''
         self.is_tempai = False
         self.is_riichi = False
+        # tiles discarded by the others since this player declared riichi
+        self.safe_tiles: [Tile] = []
         self.tiles_hidden = False  # TODO: This should be True by default, and disabled for replays?
 
+    @property
+    def in_riichi(self):
+        # the name the bot clients use
+        return self.is_riichi
+
+    @in_riichi.setter
+    def in_riichi(self, value):
+        self.is_riichi = value
+
     def add_meld(self, meld):
+        undo_log = self.table.undo_log
+        if undo_log is not None:
+            undo_log.record(self._undo_add_meld, self.tiles[:], self.tsumohai)
         self.melds.append(meld)
         # Remove used tiles from hand
         if self.tiles_hidden:
@@ -55,44 +69,80 @@ class Player(object):
                 pass
 
     def init_hand(self, tiles):
+        undo_log = self.table.undo_log
+        if undo_log is not None:
+            undo_log.record(setattr, self, 'tiles', self.tiles)
         self.tiles = [Tile(i) for i in tiles]
 
     def draw_tile(self, tile_id):
         if tile_id is None:
             tile_id = -1
         tile = Tile(tile_id)
-        self.tiles.append(tile)
+        undo_log = self.table.undo_log
+        if undo_log is not None:
+            undo_log.record(self._undo_draw_tile, self.tiles, self.tsumohai)
         self.tsumohai = tile
         # we need sort it to have a better string presentation
-        self.tiles = sorted(self.tiles)
+        self.tiles = sorted(self.tiles + [tile])
 
     def discard_tile(self, tile_id):
         tile = Tile(tile_id)
-        self.tsumohai = None
-        self.discards.append(tile)
         if self.tiles_hidden:
-            self.tiles.pop()  # Just remove anything
+            index = len(self.tiles) - 1  # Just remove anything
         else:
-            self.tiles.remove(tile)
-        if self.is_riichi and self.not_rotated_discard:
+            index = self.tiles.index(tile)
+        is_riichi_discard = self.is_riichi and self.not_rotated_discard
+        undo_log = self.table.undo_log
+        if undo_log is not None:
+            undo_log.record(self._undo_discard_tile, index, self.tiles[index], self.tsumohai, is_riichi_discard)
+        self.tsumohai = None
+        self.discards.append(tile)
+        del self.tiles[index]
+        if is_riichi_discard:
             self.riichi_discards.append(tile)
             self.not_rotated_discard = False
         return tile
 
     def call_discard(self):
         tile = self.discards[-1]
+        undo_log = self.table.undo_log
+        if undo_log is not None:
+            undo_log.record(self._undo_call_discard, tile, tile in self.called_discards, self.not_rotated_discard)
         self.called_discards.add(tile)
         if self.is_riichi and tile == self.riichi_discards[-1]:
             # The rotated tile was called, ensure next discard is rotated
             self.not_rotated_discard = True
         return tile
 
+    def _undo_add_meld(self, tiles, tsumohai):
+        self.melds.pop()
+        self.tiles = tiles
+        self.tsumohai = tsumohai
+
+    def _undo_draw_tile(self, tiles, tsumohai):
+        self.tiles = tiles
+        self.tsumohai = tsumohai
+
+    def _undo_discard_tile(self, index, tile, tsumohai, is_riichi_discard):
+        self.discards.pop()
+        self.tiles.insert(index, tile)
+        self.tsumohai = tsumohai
+        if is_riichi_discard:
+            self.riichi_discards.pop()
+            self.not_rotated_discard = True
+
+    def _undo_call_discard(self, tile, was_called, not_rotated_discard):
+        if not was_called:
+            self.called_discards.discard(tile)
+        self.not_rotated_discard = not_rotated_discard
+
     def erase_state(self):
         self.discards = []
         self.melds = []
         self.tiles = []
         self.is_tempai = False
         self.is_riichi = False
+        self.safe_tiles = []
         self.dealer_seat = 0
         self.tsumohai = None
         self.riichi_discards = []
@@ -101,6 +151,23 @@ class Player(object):
         self.called_discards = set()
         self.tiles_hidden = False
 
+    def snapshot(self):
+        """Return a compact, immutable copy of the player's state, which can be given back to restore()"""
+        return (tuple(self.discards), tuple(self.melds), tuple(self.tiles), self.seat, self.dealer_seat,
+                self.tsumohai, tuple(self.riichi_discards), frozenset(self.called_discards), self.score,
+                self.not_rotated_discard, self.name, self.rank, self.rate, self.sex, self.is_tempai, self.is_riichi,
+                self.tiles_hidden)
+
+    def restore(self, snapshot):
+        (discards, melds, tiles, self.seat, self.dealer_seat, self.tsumohai, riichi_discards, called_discards,
+         self.score, self.not_rotated_discard, self.name, self.rank, self.rate, self.sex, self.is_tempai,
+         self.is_riichi, self.tiles_hidden) = snapshot
+        self.discards = list(discards)
+        self.melds = list(melds)
+        self.tiles = list(tiles)
+        self.riichi_discards = list(riichi_discards)
+        self.called_discards = set(called_discards)
+
     def can_call_riichi(self):
         return all([self.is_tempai, not self.is_riichi, self.score >= 1000, self.table.count_of_remaining_tiles > 4])
 
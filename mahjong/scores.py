@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import math
+from types import MappingProxyType
+
+# fu of every hand that can be scored: 25 for chiitoitsu, everything else is rounded up to 10
+FU_VALUES = (20, 25) + tuple(range(30, 120, 10))
+# from 5 han on the cost doesn't depend on fu, limit hands are looked up with this fu
+LIMIT_FU = 0
+# the han of a yakuman, a hand with 26 han is a double yakuman and so on
+YAKUMAN_HAN = 13
+MAX_YAKUMAN_MULTIPLE = 6
+
+HONBA_RON_COST = 300
+HONBA_TSUMO_COST = 100
+RIICHI_STICK_COST = 1000
+
+
+def calculate_cost(han, fu, is_tsumo, is_dealer):
+    """
+    Calculate how much scores cost a hand with given han and fu, without the table
+    :return: tuple of the main and additional cost, see ScoreTable.cost()
+    """
+    if han >= 5:
+        if han >= YAKUMAN_HAN:
+            rounded = 8000 * (han // YAKUMAN_HAN)
+        # sanbaiman
+        elif han >= 11:
+            rounded = 6000
+        # baiman
+        elif han >= 8:
+            rounded = 4000
+        # haneman
+        elif han >= 6:
+            rounded = 3000
+        else:
+            rounded = 2000
+
+        double_rounded = rounded * 2
+        four_rounded = double_rounded * 2
+        six_rounded = double_rounded * 3
+    else:
+        base_points = fu * pow(2, 2 + han)
+        rounded = math.ceil(base_points / 100.) * 100
+        double_rounded = math.ceil(2 * base_points / 100.) * 100
+        four_rounded = math.ceil(4 * base_points / 100.) * 100
+        six_rounded = math.ceil(6 * base_points / 100.) * 100
+
+        # mangan
+        if rounded > 2000:
+            rounded = 2000
+            double_rounded = rounded * 2
+            four_rounded = double_rounded * 2
+            six_rounded = double_rounded * 3
+
+        # kiriage mangan
+        if han == 4 and fu == 30:
+            rounded = 2000
+            double_rounded = 3900
+            four_rounded = 7700
+            six_rounded = 11600
+
+    if is_tsumo:
+        return double_rounded, is_dealer and double_rounded or rounded
+    else:
+        return is_dealer and six_rounded or four_rounded, 0
+
+
+class ScoreTable(object):
+    """
+    Cost of every han and fu, dealer or not, ron or tsumo, computed once.
+    Shared by the hand calculator, payouts and anything else that needs to price many hands.
+    """
+
+    def __init__(self):
+        costs = {}
+        for is_tsumo in (False, True):
+            for is_dealer in (False, True):
+                for han in range(1, 5):
+                    for fu in FU_VALUES:
+                        costs[(han, fu, is_tsumo, is_dealer)] = calculate_cost(han, fu, is_tsumo, is_dealer)
+                for han in list(range(5, YAKUMAN_HAN)) + \
+                        [YAKUMAN_HAN * x for x in range(1, MAX_YAKUMAN_MULTIPLE + 1)]:
+                    costs[(han, LIMIT_FU, is_tsumo, is_dealer)] = calculate_cost(han, LIMIT_FU, is_tsumo, is_dealer)
+        self.costs = MappingProxyType(costs)
+
+    def cost(self, han, fu, is_tsumo, is_dealer):
+        """
+        :param han:
+        :param fu: rounded fu of the hand
+        :param is_tsumo:
+        :param is_dealer:
+        :return: tuple of the main and additional cost.
+        for ron additional cost is always = 0
+        for tsumo main cost is cost for dealer and additional is cost for player
+        """
+        if han >= 5:
+            fu = LIMIT_FU
+            if han >= YAKUMAN_HAN:
+                han = YAKUMAN_HAN * min(han // YAKUMAN_HAN, MAX_YAKUMAN_MULTIPLE)
+        result = self.costs.get((han, fu, is_tsumo, is_dealer))
+        if result is None:
+            # e.g. fu which was not rounded, it is not worth to fail over
+            result = calculate_cost(han, fu, is_tsumo, is_dealer)
+        return result
+
+    def payment(self, han, fu, is_tsumo, is_dealer, count_of_honba_sticks=0, count_of_riichi_sticks=0):
+        """
+        Cost of a hand with the honba and riichi sticks on the table
+        :param han:
+        :param fu: rounded fu of the hand
+        :param is_tsumo:
+        :param is_dealer:
+        :param count_of_honba_sticks:
+        :param count_of_riichi_sticks:
+        :return: a dictionary with main and additional cost as in cost(), both with the honba added,
+        the riichi sticks which go to the winner, and the total amount the winner gets
+        {'main': 1300, 'additional': 0, 'riichi_sticks': 1000, 'total': 2300}
+        """
+        main, additional = self.cost(han, fu, is_tsumo, is_dealer)
+        if is_tsumo:
+            main += HONBA_TSUMO_COST * count_of_honba_sticks
+            additional += HONBA_TSUMO_COST * count_of_honba_sticks
+            # the dealer and two other players pay, or three other players for the dealer
+            total = main + additional * 2
+        else:
+            main += HONBA_RON_COST * count_of_honba_sticks
+            total = main
+
+        riichi_sticks = RIICHI_STICK_COST * count_of_riichi_sticks
+        return {'main': main, 'additional': additional, 'riichi_sticks': riichi_sticks, 'total': total + riichi_sticks}
+
+
+SCORE_TABLE = ScoreTable()
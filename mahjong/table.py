@@ -3,11 +3,13 @@
 from mahjong.constants import EAST, SOUTH, WEST, NORTH
 from mahjong.player import Player
 from mahjong.tile import Tile
-from mahjong.utils import plus_dora, is_aka_dora
+from mahjong.utils import aka_dora_mask, count_dora, dora_index, dora_vector
 
 
 class Table(object):
     def __init__(self):
+        # count of dora of each of the 34 tiles, kept in step with dora_indicators
+        self.dora_vector = [0] * 34
         self.dora_indicators: [Tile] = []
         self.players: [Player] = []
         self.dealer_seat = 0
@@ -16,6 +18,8 @@ class Table(object):
         self.count_of_honba_sticks = 0
         self.count_of_remaining_tiles = 0
         self.count_of_players = 4
+        # An UndoLog which mutations of the table and its players are recorded in, if any
+        self.undo_log = None
 
         self._init_players()
 
@@ -24,6 +28,9 @@ class Table(object):
                                                                      self.dora_indicators)
 
     def init_round(self, round_number, count_of_honba_sticks, count_of_riichi_sticks, dora_indicator, oya, scores):
+        if self.undo_log is not None:
+            # Everything is reset for the new round, so the inverse is simply the previous state
+            self.undo_log.record(self.restore, self.snapshot())
 
         self.round_number = round_number
         self.count_of_honba_sticks = count_of_honba_sticks
@@ -54,11 +61,39 @@ class Table(object):
     def add_open_set(self, meld):
         self.get_player(meld.who).add_meld(meld)
 
+    @property
+    def dora_indicators(self):
+        return self._dora_indicators
+
+    @dora_indicators.setter
+    def dora_indicators(self, dora_indicators):
+        self._dora_indicators = list(dora_indicators)
+        self.dora_vector = dora_vector(self._dora_indicators)
+
     def add_dora_indicator(self, tile):
-        self.dora_indicators.append(tile)
+        if self.undo_log is not None:
+            self.undo_log.record(self._undo_add_dora_indicator)
+        self._dora_indicators.append(tile)
+        self.dora_vector[dora_index(tile)] += 1
+
+    def _undo_add_dora_indicator(self):
+        self.dora_vector[dora_index(self._dora_indicators.pop())] -= 1
+
+    @property
+    def aka_dora_mask(self):
+        """Bit mask of the 136 tiles format red fives, if they are in play"""
+        return aka_dora_mask()
 
     def is_dora(self, tile):
-        return plus_dora(tile, self.dora_indicators) or is_aka_dora(tile)
+        return bool(self.dora_vector[tile // 4] or self.aka_dora_mask >> tile & 1)
+
+    def count_of_dora(self, tiles, aka_mask=None):
+        """
+        :param tiles: array of 136 tiles format
+        :param aka_mask: red fives of the game, see mahjong.utils.aka_dora_mask(), settings.FIVE_REDS by default
+        :return: tuple of the count of dora and of red fives in the tiles
+        """
+        return count_dora(tiles, self.dora_vector, self.aka_dora_mask if aka_mask is None else aka_mask)
 
     def set_players_scores(self, scores):
         for i in range(len(scores)):
@@ -76,6 +111,19 @@ class Table(object):
             self.get_player(x).name = values[x]['name']
             self.get_player(x).rank = values[x]['rank']
 
+    def snapshot(self):
+        """Return a compact, immutable copy of the table and players' state, which can be given back to restore()"""
+        return (tuple(self.dora_indicators), self.dealer_seat, self.round_number, self.count_of_riichi_sticks,
+                self.count_of_honba_sticks, self.count_of_remaining_tiles, self.count_of_players,
+                tuple(player.snapshot() for player in self.players))
+
+    def restore(self, snapshot):
+        (dora_indicators, self.dealer_seat, self.round_number, self.count_of_riichi_sticks,
+         self.count_of_honba_sticks, self.count_of_remaining_tiles, self.count_of_players, players) = snapshot
+        self.dora_indicators = dora_indicators
+        for player, player_snapshot in zip(self.players, players):
+            player.restore(player_snapshot)
+
     def get_player(self, player_seat: int) -> Player:
         return self.players[player_seat]
 
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mahjong.ai.agari import Agari
+from utils.tests import TestMixin
+
+
+class AgariTestCase(unittest.TestCase, TestMixin):
+
+    def test_is_agari(self):
+        agari = Agari()
+
+        tiles = self._string_to_34_array(sou='123456789', pin='123', man='33')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='123456789', pin='11123')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='123456789', honors='11777')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='12345556778899')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='11123456788999')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='233334', pin='789', man='345', honors='55')
+        self.assertTrue(agari.is_agari(tiles))
+
+    def test_is_not_agari(self):
+        agari = Agari()
+
+        tiles = self._string_to_34_array(sou='123456789', pin='12345')
+        self.assertFalse(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='111222444', pin='11568')
+        self.assertFalse(agari.is_agari(tiles))
+
+        # two pairs
+        tiles = self._string_to_34_array(sou='123456789', pin='11', honors='22')
+        self.assertFalse(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='123456789', honors='12233')
+        self.assertFalse(agari.is_agari(tiles))
+
+    def test_is_chitoitsu_agari(self):
+        agari = Agari()
+
+        tiles = self._string_to_34_array(sou='1133557799', pin='1199')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='2244', pin='1199', man='11', honors='2277')
+        self.assertTrue(agari.is_agari(tiles))
+
+        # four identical tiles are not two pairs
+        tiles = self._string_to_34_array(sou='1111557799', pin='1199')
+        self.assertFalse(agari.is_agari(tiles))
+
+    def test_is_kokushi_agari(self):
+        agari = Agari()
+
+        tiles = self._string_to_34_array(sou='19', pin='19', man='199', honors='1234567')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='19', pin='19', man='19', honors='11234567')
+        self.assertTrue(agari.is_agari(tiles))
+
+        tiles = self._string_to_34_array(sou='129', pin='19', man='19', honors='1234567')
+        self.assertFalse(agari.is_agari(tiles))
+
+    def test_is_agari_with_open_sets(self):
+        agari = Agari()
+
+        tiles = self._string_to_34_array(sou='123345', pin='222', man='55', honors='111')
+        self.assertTrue(agari.is_agari(tiles))
+
+        open_sets = [self._string_to_open_34_set(sou='345'), self._string_to_open_34_set(honors='111')]
+        self.assertTrue(agari.is_agari(tiles, open_sets))
+
+        # the open set can't be split into other sets
+        open_sets = [self._string_to_open_34_set(sou='234')]
+        self.assertFalse(agari.is_agari(tiles, open_sets))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mahjong.ai.agari import Agari
+from mahjong.batch import HandBatch
+from mahjong.constants import FIVE_RED_SOU
+from mahjong.utils import AKA_DORA_MASK, dora_vector
+from utils.tests import TestMixin
+
+
+class HandBatchTestCase(unittest.TestCase, TestMixin):
+
+    def _batch(self):
+        return HandBatch.from_136_arrays([
+            self._string_to_136_array(sou='123456789', pin='11', man='234'),
+            self._string_to_136_array(sou='1133557799', pin='1199'),
+            self._string_to_136_array(sou='19', pin='19', man='19', honors='12345677'),
+            self._string_to_136_array(sou='234567', pin='234', man='2355'),
+            self._string_to_136_array(sou='11', honors='111222333'),
+        ])
+
+    def test_conversion(self):
+        hands = [self._string_to_136_array(sou='123', man='55'), self._string_to_136_array(honors='7777')]
+        batch = HandBatch.from_136_arrays(hands)
+
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.to_34_arrays(), [self._to_34_array(x) for x in hands])
+        self.assertEqual(batch.count_of_tiles().tolist(), [5, 4])
+        self.assertEqual(HandBatch.from_34_arrays(batch.to_34_arrays()).to_34_arrays(), batch.to_34_arrays())
+        self.assertEqual(batch[1].to_34_arrays(), [self._to_34_array(hands[1])])
+
+    def test_is_agari(self):
+        batch = self._batch()
+        agari = Agari()
+        expected = [agari.is_agari(x) for x in batch.to_34_arrays()]
+
+        # the last hand is the closed part of a hand with one meld
+        self.assertEqual(batch.is_agari().tolist(), [True, True, True, False, True])
+        self.assertEqual(batch.is_agari().tolist(), expected)
+        self.assertEqual(batch.is_chiitoitsu().tolist(), [False, True, False, False, False])
+        self.assertEqual(batch.is_kokushi().tolist(), [False, False, True, False, False])
+        self.assertEqual(len(batch[batch.is_agari()]), 4)
+
+    def test_suits_and_terminals(self):
+        batch = self._batch()
+
+        self.assertEqual(batch.is_tanyao().tolist(), [False, False, False, True, False])
+        self.assertEqual(batch.is_honitsu().tolist(), [False, False, False, False, True])
+        self.assertEqual(batch.count_of_honors().tolist(), [0, 0, 8, 0, 9])
+        self.assertEqual(batch.count_of_terminals().tolist(), [4, 8, 6, 0, 2])
+
+        batch = HandBatch.from_136_arrays([self._string_to_136_array(sou='11122233344455')])
+        self.assertEqual(batch.is_chinitsu().tolist(), [True])
+
+    def test_count_of_dora(self):
+        hands = [self._string_to_136_array(sou='123', honors='11'), self._string_to_136_array(sou='4') + [FIVE_RED_SOU]]
+        batch = HandBatch.from_136_arrays(hands)
+
+        count_of_dora, count_of_aka_dora = batch.count_of_dora(dora_vector(self._string_to_136_array(sou='4')))
+        self.assertEqual(count_of_dora.tolist(), [0, 1])
+        self.assertEqual(count_of_aka_dora.tolist(), [0, 0])
+
+        vectors = [dora_vector(self._string_to_136_array(honors='4')), dora_vector(self._string_to_136_array(sou='3'))]
+        count_of_dora, count_of_aka_dora = batch.count_of_dora(vectors, AKA_DORA_MASK)
+        self.assertEqual(count_of_dora.tolist(), [2, 1])
+        self.assertEqual(count_of_aka_dora.tolist(), [0, 1])
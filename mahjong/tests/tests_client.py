@@ -3,9 +3,10 @@ import unittest
 
 from mahjong.client import Client
 from mahjong.meld import Meld
+from utils.tests import TestMixin
 
 
-class ClientTestCase(unittest.TestCase):
+class ClientTestCase(unittest.TestCase, TestMixin):
 
     def test_draw_tile(self):
         client = Client()
@@ -32,6 +33,19 @@ class ClientTestCase(unittest.TestCase):
         self.assertEqual(len(client.table.get_main_player().discards), 1)
         self.assertFalse(tile in client.table.get_main_player().tiles)
 
+    def test_choose_discard(self):
+        client = Client()
+        client.table.init_round(0, 0, 0, 0, 0, [0, 0, 0, 0])
+        client.table.init_main_player_hand(self._string_to_136_array(sou='123456789', pin='11', man='45'))
+
+        tile = self._string_to_136_tile(honors='7')
+        client.draw_tile(tile)
+        self.assertEqual(client.choose_discard(tile), tile)
+
+        tile = client.choose_discard(self._string_to_136_tile(man='3'))
+        client.discard_tile(tile)
+        self.assertTrue(client.player.is_tempai)
+
     def test_call_meld(self):
         client = Client()
 
@@ -2,8 +2,10 @@
 import unittest
 
 from mahjong.constants import EAST, SOUTH, WEST, NORTH
+from mahjong.meld import Meld
 from mahjong.player import Player
 from mahjong.table import Table
+from mahjong.undo_log import UndoLog
 
 
 class PlayerTestCase(unittest.TestCase):
@@ -82,3 +84,29 @@ class PlayerTestCase(unittest.TestCase):
 
         player = Player(0, 3, table)
         self.assertEqual(player.player_wind, SOUTH)
+
+    def test_undo_mutations(self):
+        table = Table()
+        table.init_round(0, 0, 0, 110, 0, [250, 250, 250, 250])
+        player = table.get_player(0)
+        player.init_hand([1, 5, 9, 13, 17, 21, 25, 29, 33, 37, 41, 45, 49])
+        player.is_riichi = True
+        player.not_rotated_discard = True
+        meld = Meld()
+        meld.type = Meld.PON
+        meld.tiles = [52, 53, 54]
+        table.undo_log = UndoLog()
+
+        snapshots = []
+        for mutate in [lambda: player.draw_tile(2), lambda: player.discard_tile(21), lambda: player.call_discard(),
+                       lambda: table.get_player(1).add_meld(meld), lambda: table.add_dora_indicator(120),
+                       lambda: table.init_round(1, 0, 0, 30, 1, [250, 250, 250, 250])]:
+            snapshots.append(table.snapshot())
+            table.undo_log.mark()
+            mutate()
+
+        self.assertEqual(len(table.undo_log), 6)
+        for snapshot in reversed(snapshots):
+            self.assertTrue(table.undo_log.undo())
+            self.assertEqual(table.snapshot(), snapshot)
+        self.assertFalse(table.undo_log.undo())
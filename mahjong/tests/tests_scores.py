@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mahjong.scores import SCORE_TABLE, calculate_cost
+
+
+class ScoreTableTestCase(unittest.TestCase):
+
+    def test_cost(self):
+        self.assertEqual(SCORE_TABLE.cost(1, 30, False, False), (1000, 0))
+        self.assertEqual(SCORE_TABLE.cost(1, 30, False, True), (1500, 0))
+        self.assertEqual(SCORE_TABLE.cost(2, 25, False, False), (1600, 0))
+        self.assertEqual(SCORE_TABLE.cost(3, 40, True, False), (2600, 1300))
+        self.assertEqual(SCORE_TABLE.cost(3, 40, True, True), (2600, 2600))
+        self.assertEqual(SCORE_TABLE.cost(4, 30, False, False), (7700, 0))
+        self.assertEqual(SCORE_TABLE.cost(4, 40, False, False), (8000, 0))
+        self.assertEqual(SCORE_TABLE.cost(6, 30, False, True), (18000, 0))
+
+    def test_yakuman_multiples(self):
+        self.assertEqual(SCORE_TABLE.cost(13, 0, False, False), (32000, 0))
+        self.assertEqual(SCORE_TABLE.cost(15, 40, False, False), (32000, 0))
+        self.assertEqual(SCORE_TABLE.cost(26, 0, False, False), (64000, 0))
+        self.assertEqual(SCORE_TABLE.cost(39, 0, True, True), (48000, 48000))
+
+    def test_table_matches_calculation(self):
+        for (han, fu, is_tsumo, is_dealer), cost in SCORE_TABLE.costs.items():
+            self.assertEqual(cost, calculate_cost(han, fu, is_tsumo, is_dealer))
+
+        # fu which are not in the table are still priced
+        self.assertEqual(SCORE_TABLE.cost(2, 22, False, False), calculate_cost(2, 22, False, False))
+
+        with self.assertRaises(TypeError):
+            SCORE_TABLE.costs[(1, 30, False, False)] = (0, 0)
+
+    def test_payment(self):
+        payment = SCORE_TABLE.payment(1, 30, False, False, count_of_honba_sticks=1, count_of_riichi_sticks=2)
+        self.assertEqual(payment, {'main': 1300, 'additional': 0, 'riichi_sticks': 2000, 'total': 3300})
+
+        payment = SCORE_TABLE.payment(3, 40, True, False, count_of_honba_sticks=2)
+        self.assertEqual(payment, {'main': 2800, 'additional': 1500, 'riichi_sticks': 0, 'total': 5800})
+
+        payment = SCORE_TABLE.payment(5, 30, True, True, count_of_riichi_sticks=1)
+        self.assertEqual(payment, {'main': 4000, 'additional': 4000, 'riichi_sticks': 1000, 'total': 13000})
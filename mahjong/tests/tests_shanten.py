@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mahjong.ai.shanten import Shanten, chiitoitsu_shanten, kokushi_shanten, regular_shanten
+from utils.tests import TestMixin
+
+
+class ShantenTestCase(unittest.TestCase, TestMixin):
+
+    def test_shanten_number(self):
+        shanten = Shanten()
+
+        tiles = self._string_to_34_array(sou='111234567', pin='11', man='567')
+        self.assertEqual(shanten.calculate_shanten(tiles), Shanten.AGARI_STATE)
+
+        tiles = self._string_to_34_array(sou='111345677', pin='11', man='567')
+        self.assertEqual(shanten.calculate_shanten(tiles), 0)
+
+        tiles = self._string_to_34_array(sou='111345677', pin='15', man='567')
+        self.assertEqual(shanten.calculate_shanten(tiles), 1)
+
+        tiles = self._string_to_34_array(sou='11134567', pin='15', man='1578')
+        self.assertEqual(shanten.calculate_shanten(tiles), 2)
+
+        tiles = self._string_to_34_array(sou='113456', pin='1358', man='1358')
+        self.assertEqual(shanten.calculate_shanten(tiles), 3)
+
+        tiles = self._string_to_34_array(sou='1589', pin='13588', man='1358', honors='1')
+        self.assertEqual(shanten.calculate_shanten(tiles), 4)
+
+        tiles = self._string_to_34_array(sou='159', pin='13588', man='1358', honors='12')
+        self.assertEqual(shanten.calculate_shanten(tiles), 5)
+
+        tiles = self._string_to_34_array(sou='1589', pin='258', man='1358', honors='123')
+        self.assertEqual(shanten.calculate_shanten(tiles), 6)
+
+        # tempai with 13 tiles, waiting for 2s or 5s
+        tiles = self._string_to_34_array(sou='34', pin='123456', man='999')
+        tiles[self._string_to_34_tile(honors='1')] += 2
+        self.assertEqual(shanten.calculate_shanten(tiles), 0)
+
+    def test_shanten_with_open_sets(self):
+        shanten = Shanten()
+
+        tiles = self._string_to_34_array(sou='123345', pin='222', man='55', honors='111')
+        open_sets = [self._string_to_open_34_set(sou='345'), self._string_to_open_34_set(honors='111')]
+        self.assertEqual(shanten.calculate_shanten(tiles, open_sets), Shanten.AGARI_STATE)
+
+        # after two melds only two sets and a pair are needed from the closed tiles
+        tiles = self._string_to_34_array(sou='123', pin='2258', honors='111')
+        tiles[self._string_to_34_tile(man='5')] += 3
+        open_sets = [self._string_to_open_34_set(man='555'), self._string_to_open_34_set(honors='111')]
+        self.assertEqual(shanten.calculate_shanten(tiles, open_sets), 1)
+
+        # the same as giving only the closed tiles with the number of melds
+        tiles = self._string_to_34_array(sou='123', pin='2258')
+        self.assertEqual(regular_shanten(tiles, count_of_melds=2), 1)
+
+        # naked tanki
+        tiles = self._string_to_34_array(pin='5')
+        self.assertEqual(regular_shanten(tiles, count_of_melds=4), 0)
+
+    def test_chiitoitsu_shanten(self):
+        shanten = Shanten()
+
+        tiles = self._string_to_34_array(sou='114477', pin='114477', man='77')
+        self.assertEqual(chiitoitsu_shanten(tiles), Shanten.AGARI_STATE)
+        self.assertEqual(shanten.calculate_shanten(tiles), Shanten.AGARI_STATE)
+
+        tiles = self._string_to_34_array(sou='114477', pin='114477', man='76')
+        self.assertEqual(chiitoitsu_shanten(tiles), 0)
+        self.assertEqual(shanten.calculate_shanten(tiles), 0)
+
+        # four of a kind count as one pair only
+        tiles = self._string_to_34_array(sou='1111', pin='114477', man='779')
+        self.assertEqual(chiitoitsu_shanten(tiles), 2)
+
+    def test_kokushi_shanten(self):
+        shanten = Shanten()
+
+        tiles = self._string_to_34_array(sou='19', pin='19', man='199', honors='1234567')
+        self.assertEqual(kokushi_shanten(tiles), Shanten.AGARI_STATE)
+        self.assertEqual(shanten.calculate_shanten(tiles), Shanten.AGARI_STATE)
+
+        tiles = self._string_to_34_array(sou='129', pin='19', man='19', honors='1234567')
+        self.assertEqual(kokushi_shanten(tiles), 0)
+        self.assertEqual(shanten.calculate_shanten(tiles), 0)
+
+        tiles = self._string_to_34_array(sou='1129', pin='159', man='159', honors='12345')
+        self.assertEqual(kokushi_shanten(tiles), 1)
+        self.assertEqual(shanten.calculate_shanten(tiles), 1)
@@ -3,6 +3,7 @@ import unittest
 
 from mahjong.constants import FIVE_RED_MAN, FIVE_RED_PIN, FIVE_RED_SOU, EAST, SOUTH, WEST, NORTH
 from mahjong.table import Table
+from mahjong.undo_log import UndoLog
 from utils.tests import TestMixin
 from utils.settings_handler import settings
 
@@ -186,3 +187,29 @@ class TableTestCase(unittest.TestCase, TestMixin):
 
         table.init_round(12, 0, 0, 0, 0, [])
         self.assertEqual(table.round_wind, NORTH)
+
+    def test_dora_vector(self):
+        table = Table()
+        table.init_round(0, 0, 0, self._string_to_136_tile(sou='9'), 0, [])
+        table.undo_log = UndoLog()
+
+        table.undo_log.mark()
+        table.add_dora_indicator(self._string_to_136_tile(honors='4'))
+        self.assertEqual(table.dora_vector[self._string_to_34_tile(sou='1')], 1)
+        self.assertEqual(table.dora_vector[self._string_to_34_tile(honors='1')], 1)
+        self.assertEqual(sum(table.dora_vector), 2)
+
+        tiles = self._string_to_136_array(sou='11', honors='1') + [FIVE_RED_MAN]
+        self.assertEqual(table.count_of_dora(tiles), (3, 0))
+        settings.FIVE_REDS = True
+        self.assertEqual(table.count_of_dora(tiles), (3, 1))
+        settings.FIVE_REDS = False
+
+        snapshot = table.snapshot()
+        table.undo_log.undo()
+        self.assertEqual(sum(table.dora_vector), 1)
+        self.assertEqual(table.dora_vector[self._string_to_34_tile(honors='1')], 0)
+
+        table.restore(snapshot)
+        self.assertEqual(table.dora_vector[self._string_to_34_tile(honors='1')], 1)
+        self.assertEqual(sum(table.dora_vector), 2)
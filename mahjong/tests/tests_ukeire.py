@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mahjong.ai.ukeire import discard_options, hand_waits, improving_tiles, unseen_tiles_34, waits
+from mahjong.meld import Meld
+from mahjong.table import Table
+from utils.tests import TestMixin
+
+
+class UkeireTestCase(unittest.TestCase, TestMixin):
+
+    @staticmethod
+    def _copies(tiles):
+        """Give each copy of a tile its own 136 tiles format id, as in a real hand"""
+        return [tile + tiles[:n].count(tile) for n, tile in enumerate(tiles)]
+
+    def test_improving_tiles(self):
+        tiles = self._string_to_34_array(sou='123456789', pin='11', man='45')
+        shanten, tiles_34 = improving_tiles(tiles)
+        self.assertEqual(shanten, 0)
+        self.assertEqual(tiles_34, sorted([self._string_to_34_tile(man='3'), self._string_to_34_tile(man='6')]))
+
+        # a pon of the other honor also completes the hand, as a shanpon wait
+        tiles = self._string_to_34_array(sou='123456789', honors='1133')
+        shanten, tiles_34 = improving_tiles(tiles)
+        self.assertEqual(tiles_34, [self._string_to_34_tile(honors='1'), self._string_to_34_tile(honors='3')])
+
+        # with two melds, a ryanmen, a pair and two single tiles are two tiles from tempai
+        tiles = self._string_to_34_array(sou='45', pin='11', man='19')
+        shanten, tiles_34 = improving_tiles(tiles, count_of_melds=2)
+        self.assertEqual(shanten, 2)
+        self.assertIn(self._string_to_34_tile(man='1'), tiles_34)
+        self.assertIn(self._string_to_34_tile(sou='3'), tiles_34)
+        self.assertIn(self._string_to_34_tile(man='2'), tiles_34)
+
+        # the tiles of the hand are not changed
+        self.assertEqual(tiles, self._string_to_34_array(sou='45', pin='11', man='19'))
+
+    def test_hand_waits_are_cached(self):
+        tiles = tuple(self._string_to_34_array(sou='123456789', pin='11', man='45'))
+        hits = hand_waits.cache_info().hits
+        self.assertEqual(hand_waits(tiles), hand_waits(tiles))
+        self.assertEqual(hand_waits.cache_info().hits, hits + 1)
+
+    def test_unseen_tiles(self):
+        table = Table()
+        table.init_round(0, 0, 0, self._string_to_136_tile(man='3'), 0, [250, 250, 250, 250])
+        table.init_main_player_hand(self._copies(self._string_to_136_array(sou='123456789', pin='11', man='45')))
+
+        # a discard of the player on the left which is called: the tile is both a discard and in the meld
+        discard = self._copies(self._string_to_136_array(man='666'))[2]
+        table.get_player(3).init_hand([discard])
+        table.get_player(3).discard_tile(discard)
+        table.get_player(3).call_discard()
+        meld = Meld()
+        meld.who = 1
+        meld.type = Meld.PON
+        meld.tiles = self._copies(self._string_to_136_array(man='666'))
+        table.get_player(1).add_meld(meld)
+
+        unseen = unseen_tiles_34(table)
+        self.assertEqual(unseen[self._string_to_34_tile(man='3')], 3)
+        self.assertEqual(unseen[self._string_to_34_tile(man='6')], 1)
+        self.assertEqual(unseen[self._string_to_34_tile(pin='1')], 2)
+        self.assertEqual(unseen[self._string_to_34_tile(honors='1')], 4)
+
+        shanten, player_waits = waits(table.get_main_player())
+        self.assertEqual(shanten, 0)
+        self.assertEqual(player_waits, {self._string_to_34_tile(man='3'): 3, self._string_to_34_tile(man='6'): 1})
+
+    def _meld(self, meld_type, tiles):
+        meld = Meld()
+        meld.who = 0
+        meld.type = meld_type
+        meld.tiles = self._copies(tiles)
+        return meld
+
+    def test_waits_after_chakan(self):
+        table = Table()
+        table.init_round(0, 0, 0, self._string_to_136_tile(man='3'), 0, [250, 250, 250, 250])
+        table.init_main_player_hand(self._string_to_136_array(sou='123456', man='789', honors='2'))
+        player = table.get_main_player()
+        # the upgraded pon is kept next to the pon, it is still one set
+        player.add_meld(self._meld(Meld.PON, self._string_to_136_array(pin='555')))
+        player.add_meld(self._meld(Meld.CHAKAN, self._string_to_136_array(pin='5555')))
+
+        shanten, player_waits = waits(player)
+        self.assertEqual(shanten, 0)
+        self.assertEqual(player_waits, {self._string_to_34_tile(honors='2'): 3})
+
+    def test_waits_after_nuki(self):
+        table = Table()
+        table.init_round(0, 0, 0, self._string_to_136_tile(man='3'), 0, [250, 250, 250, 250])
+        table.init_main_player_hand(self._string_to_136_array(sou='123456789', pin='11', man='45'))
+        player = table.get_main_player()
+        # a north taken out of the hand is not a set
+        player.add_meld(self._meld(Meld.NUKI, self._string_to_136_array(honors='4')))
+
+        shanten, player_waits = waits(player)
+        self.assertEqual(shanten, 0)
+        self.assertEqual(player_waits, {self._string_to_34_tile(man='3'): 3, self._string_to_34_tile(man='6'): 4})
+
+    def test_discard_options(self):
+        table = Table()
+        table.init_round(0, 0, 0, self._string_to_136_tile(man='3'), 0, [250, 250, 250, 250])
+        table.init_main_player_hand(self._string_to_136_array(sou='123456789', pin='11', man='45', honors='7'))
+
+        options = discard_options(table.get_main_player())
+        self.assertEqual(len(options), 13)
+
+        best = options[0]
+        self.assertEqual(best.tile_34, self._string_to_34_tile(honors='7'))
+        self.assertEqual(best.shanten, 0)
+        self.assertEqual(best.waits, {self._string_to_34_tile(man='3'): 3, self._string_to_34_tile(man='6'): 4})
+        self.assertEqual(best.count_of_waits, 7)
+        self.assertTrue(all(option.shanten >= 0 for option in options))
+
+        # hidden hands can't be analysed
+        table.get_main_player().tiles_hidden = True
+        self.assertEqual(discard_options(table.get_main_player()), [])
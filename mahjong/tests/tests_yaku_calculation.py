@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 import unittest
 
-from mahjong.hand import FinishedHand, HandDivider
+from mahjong.hand import FinishedHand, HandDivider, HandFeatures, REGULAR_SHAPE, CHIITOITSU_SHAPE, KOKUSHI_SHAPE, \
+    KOKUSHI_13_SIDED_SHAPE
 from mahjong.constants import EAST, SOUTH, WEST, NORTH, FIVE_RED_SOU
 from utils.tests import TestMixin
 from utils.settings_handler import settings
@@ -54,6 +55,26 @@ class YakuCalculationTestCase(unittest.TestCase, TestMixin):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0], [[10, 11, 12], [15, 16, 17], [15, 16, 17], [15, 16, 17], [28, 28]])
 
+    def test_find_valid_combinations(self):
+        hand = HandDivider()
+
+        tiles_34 = self._string_to_34_array(man='111222333')
+        result = hand.find_valid_combinations(tiles_34, 0, 8)
+        self.assertEqual(result, [[[0, 1, 2], [0, 1, 2], [0, 1, 2]], [[0, 0, 0], [1, 1, 1], [2, 2, 2]]])
+
+        tiles_34 = self._string_to_34_array(pin='2223')
+        self.assertEqual(hand.find_valid_combinations(tiles_34, 9, 17), [])
+
+        tiles_34 = self._string_to_34_array(pin='222233334444')
+        result = hand.find_valid_combinations(tiles_34, 9, 17)
+        self.assertEqual(len(result), 2)
+        self.assertIn([[10, 10, 10], [10, 11, 12], [11, 11, 11], [12, 12, 12]], result)
+
+        # chinitsu with a lot of possible divisions
+        tiles_34 = self._string_to_34_array(man='11122233344455')
+        result = hand.divide_hand(tiles_34, [], [])
+        self.assertEqual(len(result), 4)
+
     def test_fu_calculation(self):
         hand = FinishedHand()
         player_wind, round_wind = EAST, WEST
@@ -1246,3 +1267,111 @@ class YakuCalculationTestCase(unittest.TestCase, TestMixin):
         self.assertEqual(result['han'], 4)
         self.assertEqual(result['fu'], 50)
         self.assertEqual(len(result['hand_yaku']), 1)
+
+    def test_hand_value_cache(self):
+        hand = FinishedHand()
+        hand.value_cache.clear()
+
+        tiles = self._string_to_136_array(sou='123456', man='123456', pin='33')
+        win_tile = self._string_to_136_tile(man='6')
+        dora_indicators = [self._string_to_136_tile(pin='2')]
+        result = hand.estimate_hand_value(tiles, win_tile, dora_indicators=dora_indicators)
+        self.assertEqual(hand.value_cache.misses, 1)
+
+        # another indicator for the same count of dora gives the same key
+        dora_indicators = [self._string_to_136_tile(pin='2') + 1]
+        cached_result = hand.estimate_hand_value(tiles, win_tile, dora_indicators=dora_indicators)
+        self.assertEqual(hand.value_cache.hits, 1)
+        self.assertEqual(cached_result, result)
+
+        # results are copies, which can be changed without changing the cache
+        cached_result['hand_yaku'].clear()
+        cached_result['cost']['main'] = 0
+        result = hand.estimate_hand_value(tiles, win_tile, dora_indicators=dora_indicators)
+        self.assertEqual(len(result['hand_yaku']), 2)
+        self.assertNotEqual(result['cost']['main'], 0)
+
+        # a dora count of a later hand doesn't change the yaku of an earlier result
+        dora_indicators = [self._string_to_136_tile(pin='2'), self._string_to_136_tile(sou='1')]
+        self.assertEqual(hand.estimate_hand_value(tiles, win_tile, dora_indicators=dora_indicators)['han'], 4)
+        self.assertEqual(str(result['hand_yaku'][-1]), 'Dora 2')
+
+        self.assertEqual(hand.value_cache.misses, 2)
+
+    def test_hand_value_cache_size(self):
+        hand = FinishedHand()
+        hand.value_cache.clear()
+        maxsize = hand.value_cache.maxsize
+        hand.value_cache.maxsize = 2
+        try:
+            tiles = self._string_to_136_array(sou='123456', man='123456', pin='33')
+            for win_tile in [self._string_to_136_tile(man='6'), self._string_to_136_tile(man='3'),
+                             self._string_to_136_tile(sou='6')]:
+                hand.estimate_hand_value(tiles, win_tile)
+            self.assertEqual(len(hand.value_cache), 2)
+
+            # the oldest result was dropped
+            hand.estimate_hand_value(tiles, self._string_to_136_tile(man='6'))
+            self.assertEqual(hand.value_cache.hits, 0)
+            self.assertEqual(hand.value_cache.misses, 4)
+        finally:
+            hand.value_cache.maxsize = maxsize
+            hand.value_cache.clear()
+
+    def test_open_sets_are_not_changed(self):
+        hand = FinishedHand()
+
+        tiles = self._string_to_136_array(sou='222', man='123456', pin='33', honors='666')
+        win_tile = self._string_to_136_tile(man='6')
+        open_sets = [self._string_to_136_array(sou='222')]
+        result = hand.estimate_hand_value(tiles, win_tile, open_sets=open_sets)
+        self.assertEqual(result['error'], None)
+        self.assertEqual(open_sets, [self._string_to_136_array(sou='222')])
+
+        # closed kans are taken out of a copy of the tiles
+        tiles_34 = self._string_to_34_array(man='777', pin='34577', sou='123345')
+        HandDivider().divide_hand(tiles_34, [], [self._string_to_34_tile(man='7')])
+        self.assertEqual(tiles_34, self._string_to_34_array(man='777', pin='34577', sou='123345'))
+
+    def test_hand_features(self):
+        hand = FinishedHand()
+
+        tiles = self._string_to_34_array(sou='112233', man='123', pin='99', honors='555')
+        features = HandFeatures(self._hand(tiles, 0))
+        self.assertEqual(len(features.chi_sets), 3)
+        self.assertEqual(len(features.pon_sets), 1)
+        self.assertEqual(features.pairs, [self._string_to_34_tile(pin='9')])
+        self.assertEqual(features.chi_counts[self._string_to_34_tile(sou='1')], 2)
+        self.assertEqual(features.pon_counts[self._string_to_34_tile(honors='5')], 1)
+        self.assertEqual(features.count_of_suits, 3)
+
+        # the rules give the same answer for the features as for the list of sets
+        for item in [self._hand(tiles, 0), features]:
+            self.assertTrue(hand.is_iipeiko(item))
+            self.assertTrue(hand.is_haku(item))
+            self.assertFalse(hand.is_tanyao(item))
+            self.assertFalse(hand.is_honitsu(item))
+
+    def test_classify_shape(self):
+        hand = FinishedHand()
+
+        tiles = self._string_to_34_array(sou='123456', pin='55', man='234678')
+        self.assertEqual(hand.classify_shape(tiles, self._string_to_136_tile(pin='5')), REGULAR_SHAPE)
+
+        # seven pairs which are also sets are divided as usual
+        tiles = self._string_to_34_array(sou='112233', pin='445566', man='77')
+        self.assertEqual(hand.classify_shape(tiles, self._string_to_136_tile(man='7')), REGULAR_SHAPE)
+
+        tiles = self._string_to_34_array(sou='1133', pin='5577', man='2299', honors='11')
+        self.assertEqual(hand.classify_shape(tiles, self._string_to_136_tile(man='9')), CHIITOITSU_SHAPE)
+
+        tiles = self._string_to_34_array(sou='119', man='19', pin='19', honors='1234567')
+        self.assertEqual(hand.classify_shape(tiles, self._string_to_136_tile(sou='9')), KOKUSHI_SHAPE)
+        self.assertEqual(hand.classify_shape(tiles, self._string_to_136_tile(sou='1')), KOKUSHI_13_SIDED_SHAPE)
+
+        tiles = self._string_to_34_array(sou='119', man='19', pin='19', honors='1234566')
+        self.assertEqual(hand.classify_shape(tiles, self._string_to_136_tile(sou='1')), None)
+
+        tiles = self._string_to_136_array(sou='119', man='19', pin='19', honors='1234567')
+        result = hand.estimate_hand_value(tiles, self._string_to_136_tile(sou='1'))
+        self.assertEqual(result['hand_yaku'], [KOKUSHI_13_SIDED_SHAPE.yaku])
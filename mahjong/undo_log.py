@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+
+class UndoLog(object):
+    """Record the inverse of every mutation made to a Table and its Players, so that they can be undone in order.
+
+    Inverses are grouped into steps (e.g. one per replay event) with mark(), and undo() reverts the latest step. The
+    mutators of Table and Player record their inverses while a log is set on Table.undo_log.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._marks = []
+
+    def __len__(self):
+        return len(self._marks)
+
+    def mark(self):
+        """Begin a new step, all inverses recorded until the next mark are undone together."""
+        self._marks.append(len(self._entries))
+
+    def record(self, inverse, *args):
+        """Record that `inverse(*args)` undoes the mutation that is about to be made."""
+        self._entries.append((inverse, args))
+
+    def undo(self) -> bool:
+        """Undo every mutation of the latest step, in reverse order.
+
+        :return: True if a step was undone, else False if the log is empty
+        """
+        if not self._marks:
+            return False
+        mark = self._marks.pop()
+        while len(self._entries) > mark:
+            inverse, args = self._entries.pop()
+            inverse(*args)
+        return True
+
+    def clear(self):
+        self._entries = []
+        self._marks = []
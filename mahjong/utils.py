@@ -62,6 +62,59 @@ def plus_dora(tile, dora_indicators):
     return dora_count
 
 
+# bit n is set for each 136 tiles format red five n
+AKA_DORA_MASK = (1 << FIVE_RED_MAN) | (1 << FIVE_RED_PIN) | (1 << FIVE_RED_SOU)
+
+
+def dora_index(indicator):
+    """
+    :param indicator: int 136 tiles format dora indicator
+    :return: int 34 tiles format index of the dora it indicates
+    """
+    indicator //= 4
+    if indicator < EAST:
+        # with indicator 9, dora will be 1
+        return indicator - 8 if indicator % 9 == 8 else indicator + 1
+    if indicator < 31:
+        # winds: north indicates east
+        return EAST if indicator == 30 else indicator + 1
+    # dragons: chun indicates haku
+    return 31 if indicator == 33 else indicator + 1
+
+
+def dora_vector(dora_indicators):
+    """
+    :param dora_indicators: array of 136 tiles format
+    :return: array of the count of dora of each of the 34 tiles
+    """
+    vector = [0] * 34
+    for indicator in dora_indicators:
+        vector[dora_index(indicator)] += 1
+    return vector
+
+
+def aka_dora_mask():
+    """
+    :return: AKA_DORA_MASK if the game is played with red fives, else 0
+    """
+    return settings.FIVE_REDS and AKA_DORA_MASK or 0
+
+
+def count_dora(tiles, vector, aka_mask=0):
+    """
+    :param tiles: array of 136 tiles format
+    :param vector: result of dora_vector()
+    :param aka_mask: result of aka_dora_mask()
+    :return: tuple of the count of dora and of red fives in the tiles
+    """
+    count = 0
+    count_of_aka = 0
+    for tile in tiles:
+        count += vector[tile // 4]
+        count_of_aka += aka_mask >> tile & 1
+    return count, count_of_aka
+
+
 def is_chi(item):
     """
     :param item: array of tile 34 indices
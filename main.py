@@ -5,6 +5,7 @@ Endpoint to run bot. It will play a game on tenhou.net
 from optparse import OptionParser
 
 from tenhou.main import connect_and_play, start_client
+from tenhou.sessions import SessionManager
 from utils.logger import set_up_logging
 from utils.settings_handler import settings
 
@@ -30,6 +31,10 @@ def parse_args_and_set_up_settings():
 
     parser.add_option('-d', '--disable_ai', action='store_false', default=settings.ENABLE_AI, help='Enable AI')
 
+    parser.add_option('-a', '--accounts', type='string',
+                      help='Comma separated tenhou user ids. Every account plays in its own session, '
+                           'all of them in this process, without the GUI.')
+
     opts, _ = parser.parse_args()
 
     settings.USER_ID = opts.user_id
@@ -42,10 +47,17 @@ def parse_args_and_set_up_settings():
         settings.IS_TOURNAMENT = True
         settings.LOBBY = opts.championship
 
+    return opts
+
 
 def main():
-    parse_args_and_set_up_settings()
+    opts = parse_args_and_set_up_settings()
     set_up_logging()
+
+    if opts.accounts:
+        SessionManager([{'USER_ID': x.strip()} for x in opts.accounts.split(',')]).run()
+        return
+
     # connect_and_play()
     start_client()
 
@@ -17,6 +17,9 @@ STAT_TOKEN = ''
 
 ENABLE_AI = True
 
+# file to which the client appends the latency percentiles of every game, one JSON object per line
+LATENCY_METRICS_FILE = ''
+
 """
   0 - 1 - online, 0 - bots
   1 - aka forbidden
@@ -14,6 +14,7 @@ from mahjong.client import Client
 from mahjong.meld import Meld
 from mahjong.tile import TilesConverter
 from tenhou.decoder import TenhouDecoder
+from tenhou.framing import FrameBuffer
 
 logger = logging.getLogger('tenhou')
 
@@ -30,6 +31,9 @@ class TenhouClient(Client):
         super(TenhouClient, self).__init__()
         self.socket = socket_object
         self.user_id = user_id
+        self.frame_buffer = FrameBuffer()
+        # complete messages which were received but not handled yet
+        self.pending_messages = []
 
     def on_event(self, event):
         # logger.debug('TenhouClient ignored event {0}'.format(event))
@@ -174,6 +178,8 @@ class TenhouClient(Client):
 
                         logger.info('Hand: {0}'.format(TilesConverter.to_one_line_string(main_player.tiles)))
 
+                        if settings.ENABLE_AI:
+                            tile = self.choose_discard(tile)
                         self.discard_tile(tile)
 
                     if 't="16"' in message:
@@ -282,24 +288,32 @@ class TenhouClient(Client):
         self.socket.sendall(message.encode())
 
     def _read_message(self):
-        message = self.socket.recv(1024)
-        logger.debug('Get: {0}'.format(message.decode('utf-8').replace('\x00', ' ')))
-
-        message = message.decode('utf-8')
-        # sometimes tenhou send messages in lower case, sometime in upper case, let's unify the behaviour
-        message = message.lower()
-
-        return message
+        """
+        :return: the next complete message, or an empty string if the connection was closed
+        """
+        if not self.pending_messages:
+            self.pending_messages = self._get_multiple_messages()
+        return self.pending_messages.pop(0) if self.pending_messages else ''
 
     def _get_multiple_messages(self):
-        # tenhou can send multiple messages in one request
-        messages = self._read_message()
-        messages = messages.split('\x00')
-        # last message always is empty after split, so let's exclude it
-        messages = messages[0:-1]
-
+        """
+        Wait for at least one complete message, a message can come in several pieces
+        or many messages in one piece
+        :return: list of all complete messages received so far, empty if the connection was closed
+        """
+        messages, self.pending_messages = self.pending_messages, []
+        while not messages:
+            if not self.frame_buffer.recv_from(self.socket):
+                break
+            messages = [self._decode_frame(x) for x in self.frame_buffer.frames()]
         return messages
 
+    def _decode_frame(self, frame):
+        message = frame.decode('utf-8')
+        logger.debug('Get: {0}'.format(message))
+        # sometimes tenhou send messages in lower case, sometime in upper case, let's unify the behaviour
+        return message.lower()
+
     def _send_keep_alive_ping(self):
         def send_request():
             while self.game_is_continue:
@@ -1,330 +1,385 @@
 # -*- coding: utf-8 -*-
-import datetime
+import asyncio
 import logging
 import re
-import socket
-from threading import Thread
-from time import sleep
 from urllib.parse import quote
 
-import pygame
-
 from mahjong.client import Client
 from mahjong.constants import WINDS_TO_STR
 from mahjong.meld import Meld
 from mahjong.tile import TilesConverter
 from tenhou.decoder import TenhouDecoder
-from tenhou.events import GameEvents, GameEvent
-from utils.settings_handler import settings
+from tenhou.event_model import GameEvents
+from tenhou.latency import DECIDED, DECODED, SENT, LatencyRecorder, open_timed_connection
+from utils.logger import SessionLogger
+from utils.settings_handler import SettingsOverride
 
 logger = logging.getLogger('tenhou')
 
+KEEP_ALIVE_INTERVAL = 15
+# sometimes tenhou send an empty tag after authentication (in tournament mode),
+# so the reply with <LN> is waited for this long rather than taken from the first message
+AUTH_TIMEOUT = 3
+# the lobby has to be entered before joining a game
+LOBBY_DELAY = 2
 
-def post_event(game_event: GameEvents, data: dict = None):
-    pygame.event.post(GameEvent(game_event, data))
+# the t attribute of draws and of other players' discards: the actions we are offered
+CALL_FLAGS_RE = re.compile(r'\st="(\d+)"')
+RON_FLAG = 8
+TSUMO_FLAG = 16
+DRAW_RE = re.compile(r'^<t\d')
+DISCARD_RE = re.compile(r'^<[efg]\d')
+# the message type for the latency statistics: the tag name without the tile, e.g. 't' for <t12/>
+MESSAGE_TYPE_RE = re.compile(r'^<([a-z]*)')
 
 
 class TenhouClient(Client):
-
-    def __init__(self, socket_object):
+    """Tenhou client on asyncio streams.
+
+    Every server message is handled as soon as it has been read, there is no polling, and the keep-alive ping is a
+    task on the same event loop. Events such as GameEvents.SENT_KEEP_ALIVE are given to `event_sink`, if any, e.g. a
+    function posting them to the GUI.
+    """
+
+    # the decoder keeps no state, so every session shares one
+    decoder = TenhouDecoder()
+
+    def __init__(self, user_id=None, event_sink=None, overrides=None):
+        """
+        :param user_id: tenhou's user id, settings.USER_ID by default
+        :param event_sink: function called with (game_event, data) for every GameEvents the client posts
+        :param overrides: dict of settings which apply to this client only, e.g. {'LOBBY': '0', 'GAME_TYPE': '9'}
+        """
         super(TenhouClient, self).__init__()
-        self.socket = socket_object
+        self.settings = SettingsOverride(**(overrides or {}))
+        if user_id is not None:
+            self.settings.USER_ID = user_id
+        self.user_id = self.settings.USER_ID
+        self.logger = SessionLogger(logger, self.user_id)
+        self.event_sink = event_sink
+        self.latency = LatencyRecorder()
+        self.reader = None
+        self.writer = None
         self.game_is_continue = True
         self.looking_for_game = True
-        self.connection_thread = None
-        self.keep_alive_thread = None
-        self.decoder = TenhouDecoder()
-
-    def __send_login_request(self, user_id):
-        self._send_message('<HELO name="{0}" tid="f0" sx="M" />'.format(quote(user_id)))
-        post_event(GameEvents.SENT_LOGIN_REQUEST, {'user_id': user_id})
-
-    def __send_auth_token(self, auth_token):
-        self._send_message('<AUTH val="{0}"/>'.format(auth_token))
-        self._send_message(self._pxr_tag())
-        post_event(GameEvents.SENT_AUTH_TOKEN, {'auth_token': auth_token})
-
-    def _authenticate(self):
-        self.__send_login_request(settings.USER_ID)
-        auth_message = self._read_message()
-
-        auth_string = self.decoder.parse_auth_string(auth_message)
+        self.keep_alive_task = None
+        # our riichi discard, sent once the server accepted the riichi declaration
+        self.riichi_discard = None
+
+    async def connect(self, host=None, port=None):
+        self.reader, self.writer = await open_timed_connection(host or self.settings.TENHOU_HOST,
+                                                               port or self.settings.TENHOU_PORT)
+
+    async def play(self, host=None, port=None):
+        """Connect, log in and play one game"""
+        await self.connect(host, port)
+        try:
+            if await self.authenticate():
+                await self.start_game()
+        finally:
+            await self.end_game()
+
+    def post_event(self, game_event: GameEvents, data: dict = None):
+        if self.event_sink is not None:
+            self.event_sink(game_event, data or {})
+
+    async def authenticate(self):
+        self._send_message('<HELO name="{0}" tid="f0" sx="M" />'.format(quote(self.user_id)))
+        self.post_event(GameEvents.SENT_LOGIN_REQUEST, {'user_id': self.user_id})
+        auth_message = await self._read_message()
+
+        auth_string = auth_message and self.decoder.parse_auth_string(auth_message)
         if not auth_string:
-            post_event(GameEvents.LOGIN_REQUEST_FAILED, {})
+            self.post_event(GameEvents.LOGIN_REQUEST_FAILED)
             return False
 
         auth_token = self.decoder.generate_auth_token(auth_string)
-        self.__send_auth_token(auth_token)
-
-        # sometimes tenhou send an empty tag after authentication (in tournament mode)
-        # and bot thinks that he was not auth
-        # to prevent it lets wait a little
-        # and read a group of tags
-        sleep(3)
-        authenticated = False
-        messages = self._get_multiple_messages()
-        for message in messages:
-            if '<ln' in message:
-                authenticated = True
-                post_event(GameEvents.RECV_AUTH_SUCCESSFUL, {'message': message})
-                break
+        self._send_message('<AUTH val="{0}"/>'.format(auth_token))
+        self._send_message(self._pxr_tag())
+        self.post_event(GameEvents.SENT_AUTH_TOKEN, {'auth_token': auth_token})
 
-        if authenticated:
-            self._send_keep_alive_ping()
-            logger.info('Successfully authenticated')
-            return True
-        else:
-            logger.info('Failed to authenticate')
-            post_event(GameEvents.AUTH_FAILED, {})
+        message = await self._wait_for_message('<ln', AUTH_TIMEOUT)
+        if message is None:
+            self.logger.info('Failed to authenticate')
+            self.post_event(GameEvents.AUTH_FAILED)
             return False
 
-    def authenticate(self):
-        pass
-
-    def start_game(self):  # TODO
-        log_link = ''
-
-        if settings.LOBBY != '0':
-            if settings.IS_TOURNAMENT:
-                logger.info('Go to the tournament lobby: {0}'.format(settings.LOBBY))
-                self._send_message('<CS lobby="{0}" />'.format(settings.LOBBY))
-                sleep(2)
+        self.post_event(GameEvents.RECV_AUTH_SUCCESSFUL, {'message': message})
+        self.keep_alive_task = asyncio.ensure_future(self._keep_alive())
+        self.logger.info('Successfully authenticated')
+        return True
+
+    async def start_game(self):
+        if self.settings.LOBBY != '0':
+            if self.settings.IS_TOURNAMENT:
+                self.logger.info('Go to the tournament lobby: {0}'.format(self.settings.LOBBY))
+                self._send_message('<CS lobby="{0}" />'.format(self.settings.LOBBY))
+                await asyncio.sleep(LOBBY_DELAY)
                 self._send_message('<DATE />')
             else:
-                logger.info('Go to the lobby: {0}'.format(settings.LOBBY))
-                self._send_message('<CHAT text="{0}" />'.format(quote('/lobby {0}'.format(settings.LOBBY))))
-                sleep(2)
+                self.logger.info('Go to the lobby: {0}'.format(self.settings.LOBBY))
+                self._send_message('<CHAT text="{0}" />'.format(quote('/lobby {0}'.format(self.settings.LOBBY))))
+                await asyncio.sleep(LOBBY_DELAY)
 
-        game_type = '{0},{1}'.format(settings.LOBBY, settings.GAME_TYPE)
+        game_type = '{0},{1}'.format(self.settings.LOBBY, self.settings.GAME_TYPE)
 
-        if not settings.IS_TOURNAMENT:
+        if not self.settings.IS_TOURNAMENT:
             self._send_message('<JOIN t="{0}" />'.format(game_type))
-            logger.info('Looking for the game...')
-
-        start_time = datetime.datetime.now()
+            self.logger.info('Looking for the game...')
 
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 60 * self.settings.WAITING_GAME_TIMEOUT_MINUTES
         while self.looking_for_game:
-            sleep(1)
-
-            messages = self._get_multiple_messages()
-
-            for message in messages:
-
-                if '<rejoin' in message:
-                    # game wasn't found, continue to wait
-                    self._send_message('<JOIN t="{0},r" />'.format(game_type))
-
-                if '<go' in message:
-                    self._send_message('<GOK />')
-                    self._send_message('<NEXTREADY />')
-
-                if '<taikyoku' in message:
-                    self.looking_for_game = False
-                    game_id, seat = self.decoder.parse_log_link(message)
-                    log_link = 'http://tenhou.net/0/?log={0}&tw={1}'.format(game_id, seat)
-                    self.statistics.game_id = game_id
-
-                if '<un' in message:
-                    values = self.decoder.parse_names_and_ranks(message)
-                    self.table.set_players_names_and_ranks(values)
-
-                if '<ln' in message:
-                    self._send_message(self._pxr_tag())
-
-            current_time = datetime.datetime.now()
-            time_difference = current_time - start_time
-
-            if time_difference.seconds > 60 * settings.WAITING_GAME_TIMEOUT_MINUTES:
+            try:
+                message = await asyncio.wait_for(self._read_message(), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+            if message is None:
                 break
+            self._on_lobby_message(message, game_type)
+            await self._drain()
 
         # we wasn't able to find the game in timeout minutes
         # sometimes it happens and we need to end process
         # and try again later
         if self.looking_for_game:
-            logger.error('Game is not started. Can\'t find the game')
-            self.end_game()
+            self.logger.error('Game is not started. Can\'t find the game')
             return
 
-        logger.info('Game started')
-        logger.info('Log: {0}'.format(log_link))
-        logger.info('Players: {0}'.format(self.table.players))
-
-        main_player = self.table.get_main_player()
+        self.logger.info('Game started')
+        self.logger.info('Players: {0}'.format(self.table.players))
 
         while self.game_is_continue:
-            sleep(1)
-
-            messages = self._get_multiple_messages()
-
-            for message in messages:
-
-                if '<init' in message:
-                    values = self.decoder.parse_initial_values(message)
-                    self.table.init_round(values['round_number'], values['count_of_honba_sticks'],
-                                          values['count_of_riichi_sticks'], values['dora_indicator'], values['dealer'],
-                                          values['scores'], )
-
-                    tiles = self.decoder.parse_initial_hand(message)
-                    self.table.init_main_player_hand(tiles)
-
-                    logger.info(self.table.__str__())
-                    logger.info('Players: {}'.format(self.table.get_players_sorted_by_scores()))
-                    logger.info('Dealer: {}'.format(self.table.get_player(values['dealer'])))
-                    logger.info('Round  wind: {}'.format(WINDS_TO_STR[self.table.round_wind]))
-                    logger.info('Player wind: {}'.format(WINDS_TO_STR[main_player.player_wind]))
-
-                # draw and discard
-                if '<t' in message:
-                    tile = self.decoder.parse_tile(message)
-
-                    if not main_player.in_riichi:
-                        self.draw_tile(tile)
-                        sleep(1)
-
-                        logger.info('Hand: {0}'.format(TilesConverter.to_one_line_string(main_player.tiles)))
-
-                        tile = self.discard_tile()
-
-                    if 't="16"' in message:
-                        # we win by self draw (tsumo)
-                        self._send_message('<N type="7" />')
-                    else:
-                        # let's call riichi and after this discard tile
-                        if main_player.can_call_riichi():
-                            self._send_message('<REACH hai="{0}" />'.format(tile))
-                            sleep(2)
-                            main_player.in_riichi = True
-
-                        # tenhou format: <D p="133" />
-                        self._send_message('<D p="{0}"/>'.format(tile))
-
-                        logger.info('Remaining tiles: {0}'.format(self.table.count_of_remaining_tiles))
-
-                # new dora indicator after kan
-                if '<dora' in message:
-                    tile = self.decoder.parse_dora_indicator(message)
-                    self.table.add_dora_indicator(tile)
-                    logger.info('New dora indicator: {0}'.format(tile))
-
-                if '<reach' in message and 'step="2"' in message:
-                    who_called_riichi = self.decoder.parse_who_called_riichi(message)
-                    self.enemy_riichi(who_called_riichi)
-                    logger.info('Riichi called by {0} player'.format(who_called_riichi))
-
-                # the end of round
-                if 'agari' in message or 'ryuukyoku' in message:
-                    sleep(2)
-                    self._send_message('<NEXTREADY />')
-
-                # t="7" - suggest to open kan
-                open_sets = ['t="1"', 't="2"', 't="3"', 't="4"', 't="5"', 't="7"']
-                if any(i in message for i in open_sets):
-                    sleep(1)
-                    self._send_message('<N />')
-
-                # set call
-                if '<n who=' in message:
-                    meld = self.decoder.parse_meld(message)
-                    self.call_meld(meld)
-                    logger.info('Meld: {0}, who {1}'.format(meld.type, meld.who))
-
-                    # other player upgraded pon to kan, and it is our winning tile
-                    if meld.type == Meld.CHAKAN and 't="8"' in message:
-                        # actually I don't know what exactly client response should be
-                        # let's try usual ron response
-                        self._send_message('<N type="6" />')
-
-                # other players discards: <e, <f, <g + tile number
-                match_discard = re.match(r"^<[efg]+\d.*", message)
-                if match_discard:
-                    # we win by other player's discard
-                    if 't="8"' in message:
-                        self._send_message('<N type="6" />')
-
-                    tile = self.decoder.parse_tile(message)
-
-                    if '<e' in message:
-                        player_seat = 1
-                    elif '<f' in message:
-                        player_seat = 2
-                    else:
-                        player_seat = 3
-
-                    self.enemy_discard(player_seat, tile)
-
-                if 'owari' in message:
-                    values = self.decoder.parse_final_scores_and_uma(message)
-                    self.table.set_players_scores(values['scores'], values['uma'])
-
-                if '<prof' in message:
-                    self.game_is_continue = False
-
-        logger.info('Final results: {0}'.format(self.table.get_players_sorted_by_scores()))
+            message = await self._read_message()
+            if message is None:
+                self.logger.error('Connection closed by the server')
+                break
+            if not message:
+                # tenhou sends an empty message from time to time
+                continue
+            message_type = MESSAGE_TYPE_RE.match(message)
+            self.latency.begin(message_type.group(1) if message_type else '')
+            self._on_game_message(message)
+            self.latency.end()
+            await self._drain()
+
+        self.logger.info('Final results: {0}'.format(self.table.get_players_sorted_by_scores()))
+
+    async def end_game(self):
+        """Say goodbye to the server and close the connection. Statistics are sent afterwards, if configured."""
+        was_playing = self.writer is not None and not self.looking_for_game
+        self.game_is_continue = False
+        if self.keep_alive_task:
+            self.keep_alive_task.cancel()
+            self.keep_alive_task = None
+
+        if self.writer is not None:
+            try:
+                self._send_message('<BYE />')
+                self.post_event(GameEvents.SENT_END_GAME)
+                await self._drain()
+                self.writer.close()
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.writer = None
+            self.logger.info('End of the game')
+
+        if self.latency.samples:
+            self.latency.dump(self.logger)
+            if self.settings.LATENCY_METRICS_FILE:
+                self.latency.export(self.settings.LATENCY_METRICS_FILE, user_id=self.user_id,
+                                    game_id=self.statistics.game_id)
+            self.latency.reset()
 
         # we need to finish the game, and only after this try to send statistics
         # if order will be different, tenhou will return 404 on log download endpoint
-        self.end_game()
-
-        # sometimes log is not available just after the game
-        # let's wait one minute before the statistics update
-        if settings.STAT_SERVER_URL:
-            sleep(60)
-            result = self.statistics.send_statistics()
-            logger.info('Statistics sent: {0}'.format(result))
-
-    def end_game(self):
-        self.game_is_continue = False
-        self._send_message('<BYE />')
-
-        if self.keep_alive_thread:
-            self.keep_alive_thread.join()
-
-        self.socket.shutdown(socket.SHUT_RDWR)
-        self.socket.close()
-
-        logger.info('End of the game')
+        if was_playing and self.settings.STAT_SERVER_URL:
+            # sometimes log is not available just after the game
+            # let's wait one minute before the statistics update
+            await asyncio.sleep(60)
+            result = await asyncio.get_running_loop().run_in_executor(None, self.statistics.send_statistics)
+            self.logger.info('Statistics sent: {0}'.format(result))
+
+    def _on_lobby_message(self, message, game_type):
+        if '<rejoin' in message:
+            # game wasn't found, continue to wait
+            self._send_message('<JOIN t="{0},r" />'.format(game_type))
+
+        if '<go' in message:
+            self._send_message('<GOK />')
+            self._send_message('<NEXTREADY />')
+
+        if '<taikyoku' in message:
+            self.looking_for_game = False
+            game_id, seat = self.decoder.parse_log_link(message)
+            self.statistics.game_id = game_id
+            self.logger.info('Log: http://tenhou.net/0/?log={0}&tw={1}'.format(game_id, seat))
+
+        if '<un' in message:
+            values = self.decoder.parse_un(message)
+            if not values['is_reconnect']:
+                self.table.set_players_names_and_ranks(values['data'])
+
+        if '<ln' in message:
+            self._send_message(self._pxr_tag())
+
+    def _on_game_message(self, message):
+        main_player = self.table.get_main_player()
+        flags = CALL_FLAGS_RE.search(message)
+        flags = flags and int(flags.group(1)) or 0
+
+        if '<init' in message:
+            values = self.decoder.parse_init(message)
+            self.table.init_round(values['round_number'], values['count_of_honba_sticks'],
+                                  values['count_of_riichi_sticks'], values['dora_indicator'], values['oya'],
+                                  values['ten'])
+            self.table.init_main_player_hand(values['haipai'][0])
+
+            self.logger.info(self.table.__str__())
+            self.logger.info('Players: {}'.format(self.table.get_players_sorted_by_scores()))
+            self.logger.info('Dealer: {}'.format(self.table.get_player(values['oya'])))
+            self.logger.info('Round  wind: {}'.format(WINDS_TO_STR[self.table.round_wind]))
+            self.logger.info('Player wind: {}'.format(WINDS_TO_STR[main_player.player_wind]))
+
+        # draw and discard
+        elif DRAW_RE.match(message):
+            tile = self.decoder.parse_tile(message)
+            self.latency.mark(DECODED)
+
+            if flags & TSUMO_FLAG:
+                # we win by self draw (tsumo)
+                self._send_message('<N type="7" />')
+                return
+
+            if not main_player.is_riichi:
+                self.draw_tile(tile)
+                self.logger.info('Hand: {0}'.format(TilesConverter.to_one_line_string(main_player.tiles)))
+
+                if self.settings.ENABLE_AI:
+                    tile = self.choose_discard(tile)
+                self.discard_tile(tile)
+                call_riichi = main_player.can_call_riichi()
+                self.latency.mark(DECIDED)
+
+                # let's call riichi, the tile is discarded once the server accepted it
+                if call_riichi:
+                    self._send_message('<REACH hai="{0}" />'.format(tile))
+                    self.riichi_discard = tile
+                    return
+
+            # tenhou format: <D p="133" />
+            self._send_message('<D p="{0}"/>'.format(tile))
+            self.logger.info('Remaining tiles: {0}'.format(self.table.count_of_remaining_tiles))
+
+        # other players discards: <e, <f, <g + tile number
+        elif DISCARD_RE.match(message):
+            tile = self.decoder.parse_tile(message)
+            self.latency.mark(DECODED)
+
+            if flags & RON_FLAG:
+                # we win by other player's discard
+                self._send_message('<N type="6" />')
+            elif flags:
+                # we don't call melds
+                self._send_message('<N />')
+
+            player_seat = {'e': 1, 'f': 2, 'g': 3}[message[1]]
+            self.enemy_discard(player_seat, tile)
+
+        # new dora indicator after kan
+        elif '<dora' in message:
+            tile = self.decoder.parse_dora_indicator(message)
+            self.table.add_dora_indicator(tile)
+            self.logger.info('New dora indicator: {0}'.format(tile))
+
+        elif '<reach' in message:
+            values = self.decoder.parse_riichi(message)
+            if values['step'] == 1 and values['who'] == 0 and self.riichi_discard is not None:
+                main_player.is_riichi = True
+                self._send_message('<D p="{0}"/>'.format(self.riichi_discard))
+                self.riichi_discard = None
+            elif values['step'] == 2:
+                self.enemy_riichi(values['who'])
+                self.logger.info('Riichi called by {0} player'.format(values['who']))
+
+        # set call
+        elif '<n who=' in message:
+            meld = self.decoder.parse_meld(message)
+            self.call_meld(meld)
+            self.logger.info('Meld: {0}, who {1}'.format(meld.type, meld.who))
+
+            # other player upgraded pon to kan, and it is our winning tile
+            if meld.type == Meld.CHAKAN and flags & RON_FLAG:
+                # actually I don't know what exactly client response should be
+                # let's try usual ron response
+                self._send_message('<N type="6" />')
+
+        # the end of round
+        if '<agari' in message or '<ryuukyoku' in message:
+            self._send_message('<NEXTREADY />')
+
+            if 'owari' in message:
+                values = self.decoder.parse_final_scores_and_uma(message)
+                self.table.set_players_scores(values['scores'])
+
+        if '<prof' in message:
+            self.game_is_continue = False
+
+    async def _keep_alive(self):
+        while self.game_is_continue:
+            self._send_message('<Z />')
+            self.post_event(GameEvents.SENT_KEEP_ALIVE)
+            await self._drain()
+            await asyncio.sleep(KEEP_ALIVE_INTERVAL)
 
     def _send_message(self, message):
         # tenhou required the empty byte in the end of each sending message
-        logger.debug('Send: {0}'.format(message))
-        message += '\0'
-        self.socket.sendall(message.encode())
-
-    def _read_message(self):
-        message = self.socket.recv(1024)
-        logger.debug('Get: {0}'.format(message.decode('utf-8').replace('\x00', ' ')))
-
-        message = message.decode('utf-8')
+        self.logger.debug('Send: {0}'.format(message))
+        self.writer.write(message.encode() + b'\0')
+        self.latency.mark(SENT)
+
+    async def _drain(self):
+        if self.writer is not None:
+            await self.writer.drain()
+
+    async def _read_message(self):
+        """
+        :return: the next message from the server, or None if the connection was closed
+        """
+        try:
+            message = await self.reader.readuntil(b'\0')
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        # the latency of the message starts when it came from the socket, if the reader knows it
+        self.latency.receive(getattr(self.reader, 'arrival', None))
+        message = message[:-1].decode('utf-8')
+        self.logger.debug('Get: {0}'.format(message))
         # sometimes tenhou send messages in lower case, sometime in upper case, let's unify the behaviour
-        message = message.lower()
-
-        return message
-
-    def _get_multiple_messages(self):
-        # tenhou can send multiple messages in one request
-        messages = self._read_message()
-        messages = messages.split('\x00')
-        # last message always is empty after split, so let's exclude it
-        messages = messages[0:-1]
-
-        return messages
-
-    def _send_keep_alive_ping(self):
-        def send_request():
-            while self.game_is_continue:
-                self._send_message('<Z />')
-                post_event(GameEvents.SENT_KEEP_ALIVE)
-                sleep(15)
-
-        self.keep_alive_thread = Thread(target=send_request)
-        self.keep_alive_thread.start()
+        return message.lower()
+
+    async def _wait_for_message(self, prefix, timeout):
+        """
+        Read messages until one starts with `prefix`
+        :return: the message, or None if there was none in `timeout` seconds
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        await self._drain()
+        while True:
+            try:
+                message = await asyncio.wait_for(self._read_message(), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return None
+            if message is None or message.startswith(prefix):
+                return message
 
     def _pxr_tag(self):
         # I have no idea why we need to send it, but better to do it
-        if settings.IS_TOURNAMENT:
+        if self.settings.IS_TOURNAMENT:
             return '<PXR V="-1" />'
 
-        if settings.USER_ID == 'NoName':
+        if self.user_id == 'NoName':
             return '<PXR V="1" />'
         else:
             return '<PXR V="9" />'
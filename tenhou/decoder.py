@@ -1,17 +1,26 @@
 # -*- coding: utf-8 -*-
 import logging
 import urllib
+from collections import namedtuple
 from urllib.parse import unquote
 
-from bs4 import BeautifulSoup
-from pygame.event import Event
-
 from mahjong.meld import Meld
 from mahjong.tile import Tile
-from tenhou.events import GameEvents, GameEvent
+from tenhou.event_model import DecodedEvent, ShuffleSeedEvent, JoinTableEvent, PlayerDetailsEvent, \
+    ReconnectedEvent, BeginGameEvent, BeginHandEvent, RiichiDeclaredEvent, RiichiStickPlacedEvent, DoraFlippedEvent, \
+    AgariEvent, RyuukyokuEvent, EndOfReplayEvent, DisconnectedEvent, CallEvent, DrawEvent, DiscardEvent
+from tenhou.tokenizer import Tag, find_tag, iter_stream_tags, parse_tag
 
 logger = logging.getLogger('tenhou')
 
+# first letter of a draw or discard tag -> (who, action)
+TILE_TAGS = {
+    't': (0, 'draw'), 'u': (1, 'draw'), 'v': (2, 'draw'), 'w': (3, 'draw'),
+    'd': (0, 'discard'), 'e': (1, 'discard'), 'f': (2, 'discard'), 'g': (3, 'discard'),
+}
+# Tags whose handlers never produce an event
+NO_EVENT_TAGS = frozenset(['mjloggm', 'prof'])
+
 
 class GameMode(object):
     # GAME_MODES = (field_name, bit_flag, display_name)
@@ -33,6 +42,18 @@ class GameMode(object):
                 else:
                     self.display_name += '　' + display_name
 
+    def __eq__(self, other):
+        if not isinstance(other, GameMode):
+            return NotImplemented
+        return self.game_mode_value == other.game_mode_value
+
+    def __hash__(self):
+        return hash(self.game_mode_value)
+
+
+# A decoded meld code, shared between every call with the same code, so it must not be modified
+MeldDescriptor = namedtuple('MeldDescriptor', ['type', 'from_who', 'tiles'])
+
 
 class TenhouDecoder(object):
     RANKS = [u'新人', u'9級', u'8級', u'7級', u'6級', u'5級', u'4級', u'3級', u'2級', u'1級', u'初段', u'二段', u'三段', u'四段', u'五段',
@@ -45,19 +66,29 @@ class TenhouDecoder(object):
                   '四暗刻単騎', '字一色', '緑一色', '清老頭', '九蓮宝燈', '純正九蓮宝燈', '国士無双',
                   '国士無双１３面', '大四喜', '小四喜', '四槓子', 'ドラ', '裏ドラ', '赤ドラ']
 
-    def _bs(self, message, tag_name):
-        soup = BeautifulSoup(message, 'html.parser')
-        return soup.find(tag_name)
+    # meld code -> MeldDescriptor, filled in lazily by decode_meld_code()
+    _meld_table = {}
+
+    def _tag(self, message, tag_name):
+        # parse_* methods accept either a raw message or a Tag that was already tokenized by message_to_event()
+        if isinstance(message, Tag):
+            return message
+        return find_tag(message, tag_name)
+
+    def _tag_name(self, message):
+        if isinstance(message, Tag):
+            return message.name
+        return parse_tag(message).name
 
     def parse_auth_string(self, message):
-        tag = self._bs(message, 'helo')
+        tag = self._tag(message, 'helo')
         if tag and 'auth' in tag.attrs:
             return tag.attrs['auth']
         else:
             return None
 
     def parse_initial_hand(self, message):
-        tag = self._bs(message, 'init')
+        tag = self._tag(message, 'init')
 
         tiles = tag.attrs['hai']
         tiles = [int(i) for i in tiles.split(',')]
@@ -65,7 +96,7 @@ class TenhouDecoder(object):
         return tiles
 
     def parse_init(self, message):
-        tag = self._bs(message, 'init')
+        tag = self._tag(message, 'init')
 
         seed = [int(s) for s in tag.attrs['seed'].split(',')]
         round_number = seed[0]
@@ -96,9 +127,9 @@ class TenhouDecoder(object):
                 'dora_indicator': dora_indicator}
 
     def parse_final_scores_and_uma(self, message):
-        tag = self._bs(message, 'agari')
+        tag = self._tag(message, 'agari')
         if not tag:
-            tag = self._bs(message, 'ryuukyoku')
+            tag = self._tag(message, 'ryuukyoku')
 
         data = tag.attrs['owari']
         data = [float(i) for i in data.split(',')]
@@ -111,7 +142,7 @@ class TenhouDecoder(object):
         return {'scores': scores, 'uma': uma}
 
     def parse_un(self, message):
-        tag = self._bs(message, 'un')
+        tag = self._tag(message, 'un')
 
         is_reconnect = False
         ranks = []
@@ -146,7 +177,7 @@ class TenhouDecoder(object):
         return self._parse_end_of_hand(message, True)
 
     def _parse_end_of_hand(self, message, ryuukyoku):
-        tag = self._bs(message, 'ryuukyoku' if ryuukyoku else 'agari')
+        tag = self._tag(message, 'ryuukyoku' if ryuukyoku else 'agari')
 
         if not ryuukyoku:
             hai = [[int(t) for t in tag.attrs['hai'].split(',')]]
@@ -163,10 +194,8 @@ class TenhouDecoder(object):
                 # In the case of a yakuman, yaku is not present
                 pass
             try:
-                ykr = [int(t) for t in tag.attrs['yakuman'].split(',')]
-                # as above
-                for idx in range(0, len(ykr), 2):
-                    yakuman.append((ykr[idx], ykr[idx + 1]))
+                # unlike yaku, this is just a list of yakuman ids, each of which is worth 13 han
+                yakuman = [(int(t), 13) for t in tag.attrs['yakuman'].split(',')]
             except KeyError:
                 pass
             dora_hai = [int(t) for t in tag.attrs['dorahai'].split(',')]
@@ -209,24 +238,24 @@ class TenhouDecoder(object):
                 'point_exchange': point_exchange, 'owari': owari}
 
     def parse_shuffle(self, message):
-        tag = self._bs(message, 'shuffle')
+        tag = self._tag(message, 'shuffle')
         seed = tag.attrs['seed']
         ref = tag.attrs['ref']
         return {'seed': seed, 'ref': ref}
 
     def parse_taikyoku(self, message):
-        tag = self._bs(message, 'taikyoku')
+        tag = self._tag(message, 'taikyoku')
         oya = int(tag.attrs['oya'])
         return {'oya': oya}
 
     def parse_go(self, message):
-        tag = self._bs(message, 'go')
+        tag = self._tag(message, 'go')
         game_mode = GameMode(int(tag.attrs['type']))
         lobby_id = int(tag.attrs['lobby'])
         return {'game_mode': game_mode, 'lobby_id': lobby_id}
 
     def parse_log_link(self, message):
-        tag = self._bs(message, 'taikyoku')
+        tag = self._tag(message, 'taikyoku')
 
         seat = int(tag.attrs['oya'])
         seat = (4 - seat) % 4
@@ -237,8 +266,7 @@ class TenhouDecoder(object):
     def parse_tile(self, message):
         # tenhou format: <t23/>, <e23/>, <f23 t="4"/>, <f23/>, <g23/>
         # in live games, enemy draws will have no number, e.g. <u />, in those cases return `None`
-        soup = BeautifulSoup(message, 'html.parser')
-        tag = soup.findChildren()[0].name
+        tag = self._tag_name(message)
         tile = tag.replace('t', '').replace('e', '').replace('f', '').replace('g', '').replace('u', '')
         tile = tile.replace('v', '').replace('w', '')
         try:
@@ -246,49 +274,48 @@ class TenhouDecoder(object):
         except ValueError:
             return None
 
-    def parse_tile_new(self, message):  # TODO: This method could be simplified
+    def parse_tile_new(self, message):
         # tenhou format: <t23/>, <e23/>, <f23 t="4"/>, <f23/>, <g23/>
         # in live games, enemy draws will have no number, e.g. <u />
-        soup = BeautifulSoup(message, 'html.parser')
-        tag = soup.findChildren()[0].name.lower()
+        tag = self._tag_name(message)
 
         # Determine what tile it was
-        tile = tag.replace('d', '').replace('e', '').replace('f', '').replace('g', '')
-        tile = tile.replace('t', '').replace('u', '').replace('v', '').replace('w', '')
         try:
-            tile_id = int(tile)
+            tile_id = int(tag[1:])
         except ValueError:
             tile_id = None
 
-        # Determine who drew/discarded the tile
-        if tag[0] in 'dt':
-            who = 0
-        elif tag[0] in 'eu':
-            who = 1
-        elif tag[0] in 'fv':
-            who = 2
-        elif tag[0] in 'gw':
-            who = 3
-        else:
-            who = None
-
-        # Determine whether it was a draw or a discard
-        if tag[0] in 'tuvw':
-            action = 'draw'
-        elif tag[0] in 'defg':
-            action = 'discard'
-        else:
-            action = None
+        # Determine who drew/discarded the tile, and whether it was a draw or a discard
+        who, action = TILE_TAGS.get(tag[0], (None, None))
 
         return {'tile': tile_id, 'who': who, 'action': action}
 
     def parse_meld(self, message):
-        soup = BeautifulSoup(message, 'html.parser')
-        data = soup.find('n').attrs['m']
-        data = int(data)
+        tag = self._tag(message, 'n')
+        return self.meld_from_code(int(tag.attrs['who']), int(tag.attrs['m']))
+
+    def meld_from_code(self, who, data):
+        """Create the Meld called by `who` with the meld code `data`."""
+        descriptor = self.decode_meld_code(data)
+
+        meld = Meld()
+        meld.who = who
+        meld.from_who = descriptor.from_who
+        meld.type = descriptor.type
+        meld.tiles = list(descriptor.tiles)
+
+        return meld
+
+    def decode_meld_code(self, data):
+        """Decode the `m` attribute of an <N> tag (or of <AGARI m="...">) into a shared MeldDescriptor.
+
+        Descriptors are computed once per meld code and then looked up, as the same codes recur in every game.
+        """
+        descriptor = TenhouDecoder._meld_table.get(data)
+        if descriptor is not None:
+            return descriptor
 
         meld = Meld()
-        meld.who = int(soup.find('n').attrs['who'])
         meld.from_who = data & 0x3
 
         if data & 0x4:
@@ -300,7 +327,9 @@ class TenhouDecoder(object):
         else:
             self.parse_kan(data, meld)
 
-        return meld
+        descriptor = MeldDescriptor(meld.type, meld.from_who, tuple(meld.tiles))
+        TenhouDecoder._meld_table[data] = descriptor
+        return descriptor
 
     def parse_chi(self, data, meld):
         meld.type = Meld.CHI
@@ -333,15 +362,15 @@ class TenhouDecoder(object):
         meld.tiles = [Tile(data >> 8)]
 
     def parse_dora_indicator(self, message):
-        tag = self._bs(message, 'dora')
+        tag = self._tag(message, 'dora')
         return int(tag.attrs['hai'])
 
     def parse_who_called_riichi(self, message):
-        tag = self._bs(message, 'reach')
+        tag = self._tag(message, 'reach')
         return int(tag.attrs['who'])
 
     def parse_riichi(self, message):
-        tag = self._bs(message, 'reach')
+        tag = self._tag(message, 'reach')
         who = int(tag.attrs['who'])
         step = int(tag.attrs['step'])
         if step == 2:
@@ -351,7 +380,7 @@ class TenhouDecoder(object):
         return {'who': who, 'step': step, 'ten': ten}
 
     def parse_bye(self, message):
-        tag = self._bs(message, 'bye')
+        tag = self._tag(message, 'bye')
         who = int(tag.attrs['who'])
         return {'who': who}
 
@@ -379,7 +408,7 @@ class TenhouDecoder(object):
 
         return result
 
-    def message_to_event(self, message: str) -> Event:
+    def message_to_event(self, message: str) -> DecodedEvent:
         """Convert a Tenhou.net server (or replay) message into an event."""
         try:
             return self._message_to_event(message)
@@ -387,60 +416,123 @@ class TenhouDecoder(object):
             logger.error('Error processing message: ' + message)
             raise
 
-    def _message_to_event(self, message: str) -> Event:
-        lower_msg = message.lower()
-        if not lower_msg[0] == '<':  # They should all start with a <, ignore the ones that don't
+    def _message_to_event(self, message: str) -> DecodedEvent:
+        if not message.startswith('<'):  # They should all start with a <, ignore the ones that don't
             return None
+        return self.tag_to_event(parse_tag(message), message)
 
-        lower_msg = lower_msg[1:]  # Cut off the <
-        if lower_msg.startswith('shuffle'):
-            data = self.parse_shuffle(message)
-            return GameEvent(GameEvents.RECV_SHUFFLE_SEED, data)
-        elif lower_msg.startswith('go'):
-            data = self.parse_go(message)
-            return GameEvent(GameEvents.RECV_JOIN_TABLE, data)
-        elif lower_msg.startswith('un'):
-            data = self.parse_un(message)
-            if data['is_reconnect']:
-                return GameEvent(GameEvents.RECV_RECONNECTED, data)
-            return GameEvent(GameEvents.RECV_PLAYER_DETAILS, data)
-        elif lower_msg.startswith('taikyoku'):
-            data = self.parse_taikyoku(message)
-            return GameEvent(GameEvents.RECV_BEGIN_GAME, data)
-        elif lower_msg.startswith('init'):
-            data = self.parse_init(message)
-            return GameEvent(GameEvents.RECV_BEGIN_HAND, data)
-        elif lower_msg.startswith('reach'):
-            data = self.parse_riichi(message)
-            if data['step'] == 1:
-                return GameEvent(GameEvents.RECV_RIICHI_DECLARED, data)
-            elif data['step'] == 2:
-                return GameEvent(GameEvents.RECV_RIICHI_STICK_PLACED, data)
-        elif lower_msg.startswith('dora'):
-            tile = self.parse_dora_indicator(message)
-            return GameEvent(GameEvents.RECV_DORA_FLIPPED, {'tile': tile})
-        elif lower_msg.startswith('agari'):
-            data = self.parse_agari(message)
-            return GameEvent(GameEvents.RECV_AGARI, data)
-        elif lower_msg.startswith('ryuukyoku'):  # TODO: What about abortive draws?
-            data = self.parse_ryuukyoku(message)
-            return GameEvent(GameEvents.RECV_RYUUKYOKU, data)
-        elif lower_msg.startswith('/mjloggm'):
-            return GameEvent(GameEvents.END_OF_REPLAY)
-        elif lower_msg.startswith('prof'):
-            # Not sure what this msg does, but it seems to be safe to ignore
-            return
-        elif lower_msg.startswith('bye'):
-            data = self.parse_bye(message)
-            return GameEvent(GameEvents.RECV_DISCONNECTED, data)
-        elif lower_msg[0] in 'n':  # MAKE SURE THESE BRANCHES ARE PROCESSED LAST
-            meld = self.parse_meld(message)
-            data = {'meld': meld}
-            return GameEvent(GameEvents.RECV_CALL, data)
-        elif lower_msg[0] in 'defgtuvw':  # MAKE SURE THESE BRANCHES ARE PROCESSED LAST
-            data = self.parse_tile_new(message)
-            if data['action'] == 'draw':
-                return GameEvent(GameEvents.RECV_DRAW, data)
-            elif data['action'] == 'discard':
-                return GameEvent(GameEvents.RECV_DISCARD, data)
-        raise NotImplementedError(message)
+    def decode_stream(self, source):
+        """Decode a whole mjlog document into events, in order and in a single pass.
+
+        :param source: the document as a str, bytes or a file object
+        :return: a generator of events, messages which do not produce an event (e.g. <PROF>) are skipped
+        """
+        for tag in iter_stream_tags(source):
+            try:
+                event = self.tag_to_event(tag)
+            except:
+                logger.error('Error processing tag: {0}'.format(tag))
+                raise
+            if event is not None:
+                yield event
+
+    def tag_to_event(self, tag: Tag, message: str = None) -> DecodedEvent:
+        """Convert an already tokenized message into an event, using the handler registered for its tag name."""
+        if tag is None:
+            raise NotImplementedError(message)
+        # Draws and discards carry the tile number in the tag name itself, e.g. <T12/>, so strip it off
+        handler = TenhouDecoder.message_handlers.get(tag.name.rstrip('0123456789'))
+        if handler is None:
+            raise NotImplementedError(message or tag)
+        event = handler(self, tag)
+        if event is NotImplemented:
+            raise NotImplementedError(message or tag)
+        return event
+
+    @classmethod
+    def register_handler(cls, tag_name, handler):
+        """Register `handler(decoder, tag)` for messages with the given (lowercase) tag name.
+
+        Draw and discard tags are registered under their letter alone, e.g. 't' for <T12/>. The handler should return
+        an event, None if the message should be ignored, or NotImplemented if it cannot be handled.
+        """
+        cls.message_handlers[tag_name] = handler
+
+    # Message handlers #
+
+    def _on_mjloggm(self, tag):
+        # Opening tag of a replay document, the game itself is in the tags that follow
+        return None
+
+    def _on_shuffle(self, tag):
+        return ShuffleSeedEvent(**self.parse_shuffle(tag))
+
+    def _on_go(self, tag):
+        return JoinTableEvent(**self.parse_go(tag))
+
+    def _on_un(self, tag):
+        data = self.parse_un(tag)
+        if data['is_reconnect']:
+            return ReconnectedEvent(**data)
+        return PlayerDetailsEvent(**data)
+
+    def _on_taikyoku(self, tag):
+        return BeginGameEvent(**self.parse_taikyoku(tag))
+
+    def _on_init(self, tag):
+        return BeginHandEvent(**self.parse_init(tag))
+
+    def _on_reach(self, tag):
+        data = self.parse_riichi(tag)
+        if data['step'] == 1:
+            return RiichiDeclaredEvent(**data)
+        elif data['step'] == 2:
+            return RiichiStickPlacedEvent(**data)
+        return NotImplemented
+
+    def _on_dora(self, tag):
+        return DoraFlippedEvent(tile=self.parse_dora_indicator(tag))
+
+    def _on_agari(self, tag):
+        return AgariEvent(**self.parse_agari(tag))
+
+    def _on_ryuukyoku(self, tag):  # TODO: What about abortive draws?
+        return RyuukyokuEvent(**self.parse_ryuukyoku(tag))
+
+    def _on_end_of_replay(self, tag):
+        return EndOfReplayEvent()
+
+    def _on_prof(self, tag):
+        # Not sure what this msg does, but it seems to be safe to ignore
+        return None
+
+    def _on_bye(self, tag):
+        return DisconnectedEvent(**self.parse_bye(tag))
+
+    def _on_meld(self, tag):
+        return CallEvent(meld=self.parse_meld(tag))
+
+    def _on_tile(self, tag):
+        data = self.parse_tile_new(tag)
+        if data['action'] == 'draw':
+            return DrawEvent(**data)
+        return DiscardEvent(**data)
+
+    # tag name -> handler(decoder, tag), see register_handler()
+    message_handlers = {
+        'mjloggm': _on_mjloggm,
+        'shuffle': _on_shuffle,
+        'go': _on_go,
+        'un': _on_un,
+        'taikyoku': _on_taikyoku,
+        'init': _on_init,
+        'reach': _on_reach,
+        'dora': _on_dora,
+        'agari': _on_agari,
+        'ryuukyoku': _on_ryuukyoku,
+        '/mjloggm': _on_end_of_replay,
+        'prof': _on_prof,
+        'bye': _on_bye,
+        'n': _on_meld,
+    }
+    message_handlers.update(dict.fromkeys(TILE_TAGS, _on_tile))
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Headless event model of the decoder layer. Nothing in here depends on pygame, the GUI wraps these events into pygame
+events with tenhou.events.to_pygame_event()
+"""
+from enum import Enum
+
+
+class GameEvents(Enum):  # TODO: Sort these nicely
+    RECV_DRAW = 0
+    SENT_LOGIN_REQUEST = 1
+    RECV_LOGIN_REQUEST_ACK = 2
+    SENT_AUTH_TOKEN = 3
+    RECV_AUTH_SUCCESSFUL = 4
+    SENT_KEEP_ALIVE = 5
+    SENT_UNKNOWN = 6
+    RECV_UNKNOWN = 7
+    SENT_END_GAME = 8
+    DISCONNECTED = 9
+    LOGIN_REQUEST_FAILED = 10
+    AUTH_FAILED = 11
+    RECV_SHUFFLE_SEED = 12
+    RECV_JOIN_TABLE = 13
+    RECV_PLAYER_DETAILS = 14
+    RECV_BEGIN_HAND = 15
+    RECV_RIICHI_DECLARED = 16
+    RECV_DORA_FLIPPED = 17
+    RECV_AGARI = 18
+    RECV_RYUUKYOKU = 19
+    RECV_CALL = 20
+    RECV_BEGIN_GAME = 21
+    RECV_DISCARD = 22
+    END_OF_GAME = 23
+    RECV_CALL_AVAILABLE = 24
+    CALL_STEP_FORWARD = 25
+    CALL_STEP_BACKWARD = 26
+    RECV_RIICHI_STICK_PLACED = 27
+    END_OF_REPLAY = 28
+    RECV_DISCONNECTED = 29
+    RECV_RECONNECTED = 30
+    STATE_RESTORED = 31
+
+
+class DecodedEvent(object):
+    """Base class of the events produced by TenhouDecoder.
+
+    Every GameEvents kind has its own subclass whose fields are listed in __slots__, so an event is a small fixed
+    size object rather than a dict. Fields that are not given default to None.
+    """
+    __slots__ = ()
+    game_event = None
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['game_event'] = self.game_event
+        return data
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__,
+                                 ', '.join('{0}={1!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+
+def _event_class(class_name, game_event, fields):
+    return type(class_name, (DecodedEvent,), {'__slots__': fields, 'game_event': game_event})
+
+
+END_OF_HAND_FIELDS = ('ba', 'hai', 'machi', 'ten', 'yaku', 'yakuman', 'dora_hai', 'dora_hai_ura', 'who', 'from_who',
+                      'points', 'point_exchange', 'owari')
+TILE_FIELDS = ('tile', 'who', 'action')
+RIICHI_FIELDS = ('who', 'step', 'ten')
+
+ShuffleSeedEvent = _event_class('ShuffleSeedEvent', GameEvents.RECV_SHUFFLE_SEED, ('seed', 'ref'))
+JoinTableEvent = _event_class('JoinTableEvent', GameEvents.RECV_JOIN_TABLE, ('game_mode', 'lobby_id'))
+PlayerDetailsEvent = _event_class('PlayerDetailsEvent', GameEvents.RECV_PLAYER_DETAILS, ('data', 'is_reconnect'))
+ReconnectedEvent = _event_class('ReconnectedEvent', GameEvents.RECV_RECONNECTED, ('names', 'who', 'is_reconnect'))
+BeginGameEvent = _event_class('BeginGameEvent', GameEvents.RECV_BEGIN_GAME, ('oya',))
+BeginHandEvent = _event_class('BeginHandEvent', GameEvents.RECV_BEGIN_HAND,
+                              ('seed', 'ten', 'oya', 'haipai', 'round_number', 'count_of_honba_sticks',
+                               'count_of_riichi_sticks', 'dora_indicator'))
+RiichiDeclaredEvent = _event_class('RiichiDeclaredEvent', GameEvents.RECV_RIICHI_DECLARED, RIICHI_FIELDS)
+RiichiStickPlacedEvent = _event_class('RiichiStickPlacedEvent', GameEvents.RECV_RIICHI_STICK_PLACED, RIICHI_FIELDS)
+DoraFlippedEvent = _event_class('DoraFlippedEvent', GameEvents.RECV_DORA_FLIPPED, ('tile',))
+AgariEvent = _event_class('AgariEvent', GameEvents.RECV_AGARI, END_OF_HAND_FIELDS)
+RyuukyokuEvent = _event_class('RyuukyokuEvent', GameEvents.RECV_RYUUKYOKU, END_OF_HAND_FIELDS)
+EndOfReplayEvent = _event_class('EndOfReplayEvent', GameEvents.END_OF_REPLAY, ())
+DisconnectedEvent = _event_class('DisconnectedEvent', GameEvents.RECV_DISCONNECTED, ('who',))
+CallEvent = _event_class('CallEvent', GameEvents.RECV_CALL, ('meld',))
+DrawEvent = _event_class('DrawEvent', GameEvents.RECV_DRAW, TILE_FIELDS)
+DiscardEvent = _event_class('DiscardEvent', GameEvents.RECV_DISCARD, TILE_FIELDS)
+# Not decoded from a message: posted by the replayer after seeking, with a GameStateEngine.snapshot() to restore
+StateRestoredEvent = _event_class('StateRestoredEvent', GameEvents.STATE_RESTORED, ('snapshot',))
+
+EVENT_CLASSES = {cls.game_event: cls for cls in
+                 [ShuffleSeedEvent, JoinTableEvent, PlayerDetailsEvent, ReconnectedEvent, BeginGameEvent,
+                  BeginHandEvent, RiichiDeclaredEvent, RiichiStickPlacedEvent, DoraFlippedEvent, AgariEvent,
+                  RyuukyokuEvent, EndOfReplayEvent, DisconnectedEvent, CallEvent, DrawEvent, DiscardEvent,
+                  StateRestoredEvent]}
+
+
+def make_event(game_event: GameEvents, data: dict = None) -> DecodedEvent:
+    """Create the headless event for `game_event` from a dict of its fields."""
+    if data is None:
+        data = {}
+    return EVENT_CLASSES[game_event](**data)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# tenhou ends every message with an empty byte
+FRAME_DELIMITER = 0
+INITIAL_BUFFER_SIZE = 4096
+# the least free space given to recv_into, so a nearly full buffer doesn't read a few bytes at a time
+MIN_READ_SIZE = 1024
+
+
+class FrameBuffer(object):
+    """
+    Receive buffer which splits the stream from the server into complete NUL terminated frames.
+
+    The bytes are received straight into one bytearray with recv_into. A frame which isn't complete yet stays in the
+    buffer until the rest of it arrives, and the buffer grows if a frame doesn't fit in it. Only the unread tail is
+    ever moved, to the start of the buffer, when there is no more room after it.
+    """
+
+    def __init__(self, size=INITIAL_BUFFER_SIZE):
+        self.buffer = bytearray(size)
+        # the unread bytes are buffer[start:end]
+        self.start = 0
+        self.end = 0
+        # frames before this position are known to be complete, the delimiter search continues from here
+        self.scanned = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def recv_from(self, sock):
+        """
+        Read whatever the socket has, at least one byte, into the buffer. Blocks like socket.recv
+        :param sock: socket object
+        :return: count of the received bytes, 0 if the connection was closed
+        """
+        self._reserve(MIN_READ_SIZE)
+        with memoryview(self.buffer) as view:
+            count = sock.recv_into(view[self.end:])
+        self.end += count
+        return count
+
+    def feed(self, data):
+        """
+        Add already received bytes to the buffer
+        :param data: bytes-like object
+        """
+        self._reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def frames(self):
+        """
+        Take the complete frames out of the buffer, the incomplete tail stays for the next read
+        :return: generator of frames, as bytes without the delimiter
+        """
+        while True:
+            position = self.buffer.find(FRAME_DELIMITER, max(self.start, self.scanned), self.end)
+            if position == -1:
+                self.scanned = self.end
+                break
+
+            # copied once, from a view; the view is released before the yield, so the buffer can still grow
+            with memoryview(self.buffer) as view:
+                frame = bytes(view[self.start:position])
+            self.start = self.scanned = position + 1
+            yield frame
+
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+
+    def _reserve(self, size):
+        """
+        Make room for `size` more bytes after the end of the unread data
+        """
+        if len(self.buffer) - self.end >= size:
+            return
+
+        unread = self.end - self.start
+        if len(self.buffer) - unread < size:
+            self.buffer.extend(bytes(max(len(self.buffer), unread + size - len(self.buffer))))
+
+        if self.start:
+            self.buffer[:unread] = self.buffer[self.start:self.end]
+            self.scanned -= self.start
+            self.start, self.end = 0, unread
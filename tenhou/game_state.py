@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from mahjong.meld import Meld
+from mahjong.table import Table
+from mahjong.utils import AKA_DORA_MASK
+from tenhou.event_model import GameEvents
+
+
+class GameStateEngine(object):
+    """Apply decoded game events to a Table.
+
+    This holds all of the rules for how a Tenhou message changes the state of the table, and has no GUI dependencies,
+    so replays can be reconstructed headlessly. Events can be headless events from TenhouDecoder or the pygame events
+    wrapping them, as only their attributes are used.
+    """
+
+    def __init__(self, table: Table = None):
+        self.table = table if table is not None else Table()
+        self.game_mode = None
+        self.lobby_id = None
+        self.has_red_fives = False
+        self.last_discarder = -1
+        self._handlers = {
+            GameEvents.RECV_JOIN_TABLE: self._on_join_table,
+            GameEvents.RECV_BEGIN_HAND: self._on_begin_hand,
+            GameEvents.RECV_PLAYER_DETAILS: self._on_player_details,
+            GameEvents.RECV_DISCARD: self._on_discard,
+            GameEvents.RECV_DRAW: self._on_draw,
+            GameEvents.RECV_CALL: self._on_call,
+            GameEvents.RECV_RIICHI_DECLARED: self._on_riichi_declared,
+            GameEvents.RECV_RIICHI_STICK_PLACED: self._on_riichi_stick_placed,
+            GameEvents.RECV_RYUUKYOKU: self._on_ryuukyoku,
+            GameEvents.RECV_DORA_FLIPPED: self._on_dora_flipped,
+            GameEvents.STATE_RESTORED: self._on_state_restored,
+        }
+
+    def apply(self, event) -> bool:
+        """Apply a single event to the table. If the table has an undo log, the event can then be reverted by undo().
+
+        :return: True if the event changed the game state, else False
+        """
+        if self.table.undo_log is not None:
+            self.table.undo_log.mark()
+        handler = self._handlers.get(event.game_event)
+        if handler is None:
+            return False
+        handler(event)
+        return True
+
+    def apply_all(self, events):
+        """Apply every event of e.g. TenhouDecoder.decode_stream() in order, and return the table."""
+        for event in events:
+            self.apply(event)
+        return self.table
+
+    def count_of_dora(self, tiles):
+        """Count the dora and, if the game is played with them, the red fives in the given 136 tiles format tiles.
+
+        :return: tuple of the count of dora and of red fives
+        """
+        return self.table.count_of_dora(tiles, AKA_DORA_MASK if self.has_red_fives else 0)
+
+    def undo(self) -> bool:
+        """Revert the last event applied while the table had an undo log.
+
+        :return: True if an event was reverted, else False if the undo log is missing or empty
+        """
+        return self.table.undo_log is not None and self.table.undo_log.undo()
+
+    def snapshot(self):
+        """Return a compact, immutable copy of the game state, which can be given back to restore()"""
+        return (self.table.snapshot(), self.game_mode, self.lobby_id, self.has_red_fives, self.last_discarder)
+
+    def restore(self, snapshot):
+        table, self.game_mode, self.lobby_id, self.has_red_fives, self.last_discarder = snapshot
+        self.table.restore(table)
+
+    def _set(self, obj, name, value):
+        """Set an attribute of the engine, table or a player that is not changed through one of their mutators."""
+        if self.table.undo_log is not None:
+            self.table.undo_log.record(setattr, obj, name, getattr(obj, name))
+        setattr(obj, name, value)
+
+    def _on_join_table(self, event):
+        self._set(self, 'game_mode', event.game_mode)
+        self._set(self, 'lobby_id', event.lobby_id)
+        self._set(self, 'has_red_fives', not self.game_mode.noaka)
+
+    def _on_begin_hand(self, event):
+        self.table.init_round(event.round_number, event.count_of_honba_sticks, event.count_of_riichi_sticks,
+                              event.dora_indicator, event.oya, event.ten)
+        haipai = list(event.haipai)
+        # If this is a live game, len(haipai) will be 1, in a replay it will be 4
+        if len(haipai) == 1:
+            # Extend with tile backs for other players' unknown tiles
+            for n in range(1, 4):
+                haipai.append([-1 for _ in range(13)])
+                # Mark player hand as invisible
+                self._set(self.table.players[n], 'tiles_hidden', True)
+        for n in range(len(haipai)):
+            self.table.players[n].init_hand(haipai[n])
+
+    def _on_player_details(self, event):
+        for n in range(len(event.data)):
+            for field in ['name', 'rank', 'rate', 'sex']:
+                self._set(self.table.players[n], field, event.data[n][field])
+        if len(event.data) == 3 or event.data[3]['name'] == '':
+            # This is a 3-player game
+            self._set(self.table, 'count_of_players', 3)
+
+    def _on_discard(self, event):
+        self.table.get_player(event.who).discard_tile(event.tile)
+        self._set(self, 'last_discarder', event.who)
+
+    def _on_draw(self, event):
+        self.table.get_player(event.who).draw_tile(event.tile)
+        self._set(self.table, 'count_of_remaining_tiles', self.table.count_of_remaining_tiles - 1)
+        if self.table.count_of_remaining_tiles < 0:
+            raise ValueError('Wall count dropped below zero!')
+
+    def _on_call(self, event):
+        # A closed kan (from_who == 0) is made from the player's own tiles, so no discard was called
+        if event.meld.type in [Meld.CHI, Meld.PON, Meld.KAN] and event.meld.from_who != 0:
+            self.table.get_player(self.last_discarder).call_discard()
+        self.table.get_player(event.meld.who).add_meld(event.meld)
+
+    def _on_riichi_declared(self, event):
+        player = self.table.get_player(event.who)
+        self._set(player, 'is_riichi', True)
+        self._set(player, 'not_rotated_discard', True)
+
+    def _on_riichi_stick_placed(self, event):
+        player = self.table.get_player(event.who)
+        self._set(player, 'score', player.score - 1000)
+
+    def _on_ryuukyoku(self, event):
+        for n in range(len(event.hai)):
+            hai = event.hai[n]
+            if hai is not None:
+                self._set(self.table.players[n], 'tiles', hai)
+
+    def _on_dora_flipped(self, event):
+        self.table.add_dora_indicator(event.tile)
+
+    def _on_state_restored(self, event):
+        self.restore(event.snapshot)
@@ -8,12 +8,14 @@ import pygame
 
 import tenhou.gui
 import tenhou.gui.gui
+from mahjong.ai.ukeire import count_of_sets, discard_options, unseen_tiles_34, waits
 from mahjong.constants import WINDS_TO_STR
 from mahjong.meld import Meld
 from mahjong.table import Table
 from mahjong.tile import Tile
-from tenhou.decoder import GameMode, TenhouDecoder
+from tenhou.decoder import TenhouDecoder
 from tenhou.events import GameEvents, GAMEEVENT
+from tenhou.game_state import GameStateEngine
 from tenhou.gui.screens import MenuButton, AbstractScreen, EventListener
 from tenhou.gui.screens.esc_menu import EscMenuScreen
 from tenhou.jong.classes import CallType, Position
@@ -86,10 +88,7 @@ class InGameScreen(AbstractScreen, EventListener):
     def __init__(self):
         self.table_name = None
         self.round_name = None
-        self.game_mode = None
         self.game_mode_display_name = '麻雀'  # Placeholder name
-        self.lobby_id = None
-        self.has_red_fives = False
 
         # TILES
         self.tiles_64px = _load_64px_tile_sprites()
@@ -142,6 +141,10 @@ class InGameScreen(AbstractScreen, EventListener):
         self.end_dialog_data = {}
         self._set_end_dialog()
         self.call_data = [None for _ in range(4)]
+        # Hand analysis of the main player, see _update_hand_analysis()
+        self.discard_options = []
+        self.waits = {}
+        self.waits_shanten = None
 
         # Consts
         self.END_DIALOG_SHOW_TIME_SECS = 5
@@ -149,11 +152,11 @@ class InGameScreen(AbstractScreen, EventListener):
 
         # Test vars
         self.discard_start_secs = time.time()
-        self.last_discarder = -1
 
         # Other
         self.esc_menu = EscMenuScreen()
-        self.table: Table = Table()
+        self.engine = GameStateEngine()
+        self.table: Table = self.engine.table
 
     # Private methods #
 
@@ -269,66 +272,23 @@ class InGameScreen(AbstractScreen, EventListener):
         self.esc_menu.on_window_resized(event)
 
     def on_game_event(self, event):
-        """Handle GameEvent events.
+        """Handle GameEvent events. The game state itself is updated by the GameStateEngine, this only takes care of
+        what is shown on screen.
 
         :return: True if the event was handled, else False
         """
         logger.debug(event)
+        handled = self.engine.apply(event)
+        if handled:
+            self._update_hand_analysis()
         if event.game_event == GameEvents.RECV_JOIN_TABLE:
-            self.game_mode: GameMode = event.game_mode
-            self.lobby_id = event.lobby_id
-            self.has_red_fives = (not self.game_mode.noaka)
-            self.game_mode_display_name = self.game_mode.display_name
-            return True
-        elif event.game_event == GameEvents.RECV_BEGIN_HAND:
-            self.table.init_round(event.round_number, event.count_of_honba_sticks, event.count_of_riichi_sticks,
-                                  event.dora_indicator, event.oya, event.ten)
-            # If this is a live game, len(haipai) will be 1, in a replay it will be 4
-            if len(event.haipai) == 1:
-                # Extend with tile backs for other players' unknown tiles
-                for n in range(1, 4):
-                    event.haipai.append([-1 for _ in range(13)])
-                    # Mark player hand as invisible
-                    self.table.players[n].tiles_hidden = True
-            for n in range(len(event.haipai)):
-                self.table.players[n].init_hand(event.haipai[n])
-            return True
-        elif event.game_event == GameEvents.RECV_PLAYER_DETAILS:
-            for n in range(len(event.data)):
-                self.table.players[n].name = event.data[n]['name']
-                self.table.players[n].rank = event.data[n]['rank']
-                self.table.players[n].rate = event.data[n]['rate']
-                self.table.players[n].sex = event.data[n]['sex']
-            if len(event.data) == 3 or event.data[3]['name'] == '':
-                # This is a 3-player game
-                self.table.count_of_players = 3
-            return True
-        elif event.game_event == GameEvents.RECV_DISCARD:
-            self.table.get_player(event.who).discard_tile(event.tile)
-            self.last_discarder = event.who
-            return True
-        elif event.game_event == GameEvents.RECV_DRAW:
-            self.table.get_player(event.who).draw_tile(event.tile)
-            self.table.count_of_remaining_tiles -= 1
-            if self.table.count_of_remaining_tiles < 0:
-                raise ValueError('Wall count dropped below zero!')
-            return True
+            self.game_mode_display_name = self.engine.game_mode.display_name
         elif event.game_event == GameEvents.RECV_CALL:
-            if event.meld.type in [Meld.CHI, Meld.PON, Meld.KAN]:
-                self.table.get_player(self.last_discarder).call_discard()
-            self.table.get_player(event.meld.who).add_meld(event.meld)
-            string = {Meld.CHI: 'チー', Meld.PON: 'ポン', Meld.KAN: 'カン', Meld.NUKI: '北'}[event.meld.type]
+            string = {Meld.CHI: 'チー', Meld.PON: 'ポン', Meld.KAN: 'カン', Meld.CHAKAN: 'カン',
+                      Meld.NUKI: '北'}[event.meld.type]
             self._add_call(event.meld.who, string)
-            return True
         elif event.game_event == GameEvents.RECV_RIICHI_DECLARED:
-            player = self.table.get_player(event.who)
-            player.is_riichi = True
-            player.not_rotated_discard = True
             self._add_call(event.who, 'リーチ')
-            return True
-        elif event.game_event == GameEvents.RECV_RIICHI_STICK_PLACED:
-            self.table.get_player(event.who).score -= 1000
-            return True
         elif event.game_event == GameEvents.RECV_AGARI:
             yaku_list = sorted(event.yaku)
             yakuman_string = None  # TODO
@@ -340,16 +300,35 @@ class InGameScreen(AbstractScreen, EventListener):
             return True
         elif event.game_event == GameEvents.RECV_RYUUKYOKU:
             for n in range(len(event.hai)):
-                hai = event.hai[n]
-                if hai is not None:
-                    self.table.players[n].tiles = hai
+                if event.hai[n] is not None:
                     self._add_call(n, 'テンパイ')
             self._set_end_dialog('流局')
-            return True
-        elif event.game_event == GameEvents.RECV_DORA_FLIPPED:
-            self.table.add_dora_indicator(event.tile)
-            return True
-        return False
+        return handled
+
+    def _update_hand_analysis(self):
+        """Analyse the main player's hand for the overlay: the best discards when the hand has a tile to discard, else
+        the tiles which improve it. Improving tiles are cached per hand, so only hands that were not seen before are
+        analysed in full, while the unseen counts follow every discard, call and dora."""
+        player = self.table.get_main_player()
+        self.discard_options = []
+        self.waits = {}
+        self.waits_shanten = None
+        count_of_tiles = len(player.tiles) + 3 * count_of_sets(player)
+        if count_of_tiles % 3 == 0:
+            return
+        unseen = unseen_tiles_34(self.table)
+        if count_of_tiles % 3 == 2:
+            self.discard_options = discard_options(player, unseen)
+        else:
+            self.waits_shanten, self.waits = waits(player, unseen)
+
+    def _get_best_discards(self):
+        """Return the set of 34 format tiles which are the best discards of the main player's hand"""
+        if not self.discard_options:
+            return set()
+        best = self.discard_options[0]
+        return {option.tile_34 for option in self.discard_options
+                if option.shanten == best.shanten and option.count_of_waits == best.count_of_waits}
 
     def _get_round_name(self):
         round_num = (self.table.round_number % 4) + 1  # it starts from 0, so +1
@@ -394,6 +373,7 @@ class InGameScreen(AbstractScreen, EventListener):
         self._draw_discards(canvas)
         self._draw_calls(canvas)
         self._draw_hand(canvas)
+        self._draw_waits(canvas)
         self._draw_enemy_hands(canvas)
         self._draw_centre_console(canvas)
 
@@ -481,20 +461,42 @@ class InGameScreen(AbstractScreen, EventListener):
         total_width = self.hand_tile_width * num_tiles
         x = centre_x - (total_width / 2)
         y = canvas.get_height() - self.hand_tile_height - 30
+        best_discards = self._get_best_discards()
         for tile in tiles:
             if not skipped_tsumohai and player.tsumohai == tile:
                 # Don't draw the tsumohai here
                 skipped_tsumohai = True
                 continue
-            self._draw_tile(canvas, tile, (x, y))
+            self._draw_tile(canvas, tile, (x, y), highlight_id=2 if tile // 4 in best_discards else None)
             x += self.hand_tile_width
         if player.tsumohai is not None:
             x += 0.5 * self.hand_tile_width
-            self._draw_tile(canvas, player.tsumohai, (x, y))
+            self._draw_tile(canvas, player.tsumohai, (x, y),
+                            highlight_id=2 if player.tsumohai // 4 in best_discards else None)
             if discard_timer_text is not None:
                 canvas.blit(discard_timer_text,
                             (x - discard_timer_text.get_width() / 2 + self.hand_tile_width / 2, y - 13))
 
+    def _draw_waits(self, canvas):
+        """
+        Draw the waits of the main player's hand when it is in tempai, above the hand, each with the number of copies
+        which have not been seen yet.
+        :param canvas: the surface to render to
+        :return: None
+        """
+        if self.waits_shanten != 0 or not self.waits:
+            return
+        x = canvas.get_width() / 2 - self.hand_tile_width * 6.5
+        y = canvas.get_height() - self.hand_tile_height - 30 - self.tile_height - 20
+        text = self.name_font.render("待ち：", 1, (0, 0, 0))
+        canvas.blit(text, (x, y + self.tile_height / 2 - text.get_height() / 2))
+        x += text.get_width()
+        for tile_34, count in sorted(self.waits.items()):
+            self._draw_tile(canvas, tile_34, (x, y), small=True, highlight_id=None if count else 3)
+            count_text = self.discard_timer_font.render(str(count), 1, (0, 0, 0))
+            canvas.blit(count_text, (x + self.tile_width / 2 - count_text.get_width() / 2, y + self.tile_height))
+            x += self.tile_width + 4
+
     def _draw_tile(self, surface: pygame.Surface, tile, coordinates: (int, int), small: bool = False,
                    rotation: int = 0, highlight_id=None, sideways: bool = False):
         """
@@ -511,7 +513,7 @@ class InGameScreen(AbstractScreen, EventListener):
         if tile >= len(self.tiles_38px):
             tile = Tile(tile)
         if type(tile) == Tile:
-            if tile.is_five() and self.has_red_fives:
+            if tile.is_five() and self.engine.has_red_fives:
                 # 4 = 5s, 13 = 5p, 22 = 5m
                 # Draw red five, the last 4 tile sprite ids are 5sd, 5pd, 5md, back_face
                 tile_real = tile / 4  # Verify that tile is exactly divisible by 4
@@ -697,6 +699,14 @@ class InGameScreen(AbstractScreen, EventListener):
             img = pygame.transform.scale(img, (dora_width, dora_height))
             surface.blit(img, (dora_x, dora_y))
             dora_x += dora_x_offset + dora_width
+
+        # Dora (and red fives) in the main player's hand and calls
+        player = self.table.get_main_player()
+        if not player.tiles_hidden:
+            tiles = player.tiles + [tile for meld in player.melds for tile in meld.tiles]
+            count_of_dora, count_of_aka_dora = self.engine.count_of_dora([t for t in tiles if t is not None and t >= 0])
+            text = self.corner_font.render("ドラ{}".format(count_of_dora + count_of_aka_dora), 1, (0, 0, 0))
+            surface.blit(text, (dora_x + dora_x_offset, y))
         y += y_offset
 
         # Riichi stick count
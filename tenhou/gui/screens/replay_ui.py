@@ -45,8 +45,8 @@ class ReplayScreen(InGameScreen):
         """Overrides InGameScreen.draw_to_canvas()"""
         super().draw_to_canvas(canvas)
         font = pygame.font.SysFont("Arial", 13)
-        text = font.render("Replay Viewer: Press S to step forward, D to toggle autostep, R to restart replay", 1,
-                           (0, 0, 0))
+        text = font.render("Replay Viewer: Press S to step forward, A to step back, D to toggle autostep, "
+                           "R to restart replay", 1, (0, 0, 0))
         canvas.blit(text, (canvas.get_width() / 2 - text.get_width() / 2, 10))
 
         if not self.is_esc_menu_open and self.autoplay and self.last_autoplay + self.autoplay_delay_secs < time.time():
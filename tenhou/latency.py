@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import math
+import time
+from collections import defaultdict, deque
+
+# timestamps taken while the client handles a message, in this order
+RECEIVED = 'received'
+DECODED = 'decoded'
+DECIDED = 'decided'
+SENT = 'sent'
+STAGES = [RECEIVED, DECODED, DECIDED, SENT]
+# the duration which ends at each timestamp
+STAGE_DURATIONS = {DECODED: 'decode', DECIDED: 'decision', SENT: 'send'}
+TOTAL = 'total'
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(samples, p):
+    """
+    Nearest rank percentile
+    :param samples: sorted list
+    :param p: 0-100
+    :return: the sample, or None if there are none
+    """
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+
+class LatencyRecorder(object):
+    """
+    Time between receiving a message from the server and sending our answer.
+
+    For every message the client stamps the moment it was received, decoded, the decision was made and the answer
+    was sent, the stages a message doesn't go through are skipped. The durations between the stamps and the total
+    are collected per message type (the tag name without the tile, e.g. 't' for <T12/>). The total of a message
+    without an answer is the time it took to handle it. When the received stamp comes from a TimedStreamReader, the
+    decode time includes the time the message waited to be read.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # message type -> duration name -> list of seconds
+        self.samples = defaultdict(lambda: defaultdict(list))
+        self.message_type = None
+        self.stamps = {}
+
+    def receive(self, received_at=None):
+        """
+        Stamp a message which was just read, its type is known once it was decoded, see begin()
+        :param received_at: when the message came from the socket, e.g. TimedStreamReader.arrival, now by default
+        """
+        self.message_type = None
+        self.stamps = {RECEIVED: self.clock() if received_at is None else received_at}
+
+    def begin(self, message_type):
+        """
+        Start to time the message given to receive(), or a message received just now
+        """
+        self.message_type = message_type
+        if RECEIVED not in self.stamps:
+            self.stamps = {RECEIVED: self.clock()}
+
+    def mark(self, stage):
+        """
+        Stamp a stage of the current message, only the first stamp of each stage counts
+        """
+        if self.message_type is not None and stage not in self.stamps:
+            self.stamps[stage] = self.clock()
+
+    def end(self):
+        """
+        Keep the durations of the current message
+        """
+        if self.message_type is None:
+            return
+
+        samples = self.samples[self.message_type]
+        stamps = [(x, self.stamps[x]) for x in STAGES if x in self.stamps]
+        for (_, start), (stage, stop) in zip(stamps, stamps[1:]):
+            samples[STAGE_DURATIONS[stage]].append(stop - start)
+        # until the answer was sent, or for a message without answer until it was handled
+        stop = self.stamps[SENT] if SENT in self.stamps else self.clock()
+        samples[TOTAL].append(stop - self.stamps[RECEIVED])
+
+        self.message_type = None
+        self.stamps = {}
+
+    def reset(self):
+        self.samples.clear()
+
+    def percentiles(self):
+        """
+        :return: {message type: {duration name: {'count', 'p50', 'p95', 'p99', 'max'}}}, in milliseconds
+        """
+        result = {}
+        for message_type, durations in sorted(self.samples.items()):
+            result[message_type] = {}
+            for name, samples in durations.items():
+                samples = sorted(samples)
+                values = {'count': len(samples), 'max': round(samples[-1] * 1000, 3)}
+                for p in PERCENTILES:
+                    values['p{0}'.format(p)] = round(percentile(samples, p) * 1000, 3)
+                result[message_type][name] = values
+        return result
+
+    def dump(self, logger):
+        """
+        Log the percentiles of the total time of each message type
+        """
+        for message_type, durations in self.percentiles().items():
+            total = durations[TOTAL]
+            logger.info('Latency of <{0}>: {1} messages, p50 {2} ms, p95 {3} ms, p99 {4} ms, max {5} ms'.format(
+                message_type, total['count'], total['p50'], total['p95'], total['p99'], total['max']))
+
+    def export(self, path, **details):
+        """
+        Append the percentiles to a metrics file, one JSON object per line
+        :param path: file name
+        :param details: more values to write with them, e.g. the user and game id
+        """
+        record = dict(details, time=time.strftime('%Y-%m-%d %H:%M:%S'), latency=self.percentiles())
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+class TimedStreamReader(asyncio.StreamReader):
+    """
+    StreamReader which remembers when the data came from the socket. After readuntil(), `arrival` is the time the
+    last byte of the message was received, so the time the message then waited in the buffer, e.g. behind other
+    messages, and for the event loop to resume the reading task is part of its latency.
+
+    The time the data spent in the socket buffer of the system before the event loop got to it is still not seen,
+    when the event loop is busy with other sessions that can be a part of the latency too.
+    """
+
+    def __init__(self, *args, clock=time.perf_counter, **kwargs):
+        super(TimedStreamReader, self).__init__(*args, **kwargs)
+        self.clock = clock
+        # (count of bytes received up to the end of a piece of data, when it was received)
+        self.arrivals = deque()
+        self.count_of_received_bytes = 0
+        self.count_of_read_bytes = 0
+        self.arrival = None
+
+    def feed_data(self, data):
+        if data:
+            self.count_of_received_bytes += len(data)
+            self.arrivals.append((self.count_of_received_bytes, self.clock()))
+        super(TimedStreamReader, self).feed_data(data)
+
+    async def readuntil(self, separator=b'\n'):
+        data = await super(TimedStreamReader, self).readuntil(separator)
+        self.count_of_read_bytes += len(data)
+        # the piece of data which had the last byte of the message, it may have the next messages too
+        while self.arrivals[0][0] < self.count_of_read_bytes:
+            self.arrivals.popleft()
+        self.arrival = self.arrivals[0][1]
+        return data
+
+
+async def open_timed_connection(host, port):
+    """
+    Same as asyncio.open_connection(), with a TimedStreamReader
+    :return: (reader, writer)
+    """
+    loop = asyncio.get_running_loop()
+    reader = TimedStreamReader(loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.create_connection(lambda: protocol, host, port)
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the tenhou server, it replays a recorded game to the clients which connect to it.
+To benchmark the bot offline, e.g.:
+
+python -m tenhou.mock_server -p 10080 -d 0.1
+
+and set TENHOU_HOST = '127.0.0.1' in settings_local.py
+"""
+import asyncio
+import datetime
+import logging
+import os
+import random
+import re
+import time
+from optparse import OptionParser
+from urllib.parse import quote, unquote
+
+from tenhou.decoder import TenhouDecoder
+from tenhou.tokenizer import TAG_RE, find_tag
+from utils.logger import set_up_logging
+
+logger = logging.getLogger('tenhou')
+
+DEFAULT_RECORDING = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'gui', 'resources', 'live_game',
+                                 'gamelog_incl_conn.thr')
+# seconds to wait for the answer of the client, the real server gives a few seconds too
+REPLY_TIMEOUT = 5
+LOBBY_STATUS = '<LN n="BgZ1Cm" j="D1C2D2D2D1D12C3B13C1C2B1D12C4D8C1B2D1C3D2C1D1B1C2" g="HA1E12I3M48I8E4M4E" />'
+
+# the messages of the server which wait for an answer of the client, and the answers
+DRAW_RE = re.compile(r'^<t\d', re.I)
+CALL_OFFER_RE = re.compile(r'^<[efg]\d+[^>]*\st=', re.I)
+END_OF_ROUND_RE = re.compile(r'^<(agari|ryuukyoku)\b', re.I)
+DISCARD_REPLY_RE = re.compile(r'^<(d\s|reach\b|n\b)', re.I)
+CALL_REPLY_RE = re.compile(r'^<n\b', re.I)
+NEXT_READY_RE = re.compile(r'^<nextready\b', re.I)
+DISCARD_RE = re.compile(r'^<d\s', re.I)
+JOIN_RE = re.compile(r'^<join\b', re.I)
+BYE_RE = re.compile(r'^<bye\b', re.I)
+
+# tags of a mjlog replay which the client of a live game never gets
+REPLAY_ONLY_TAGS = frozenset(['mjloggm', '/mjloggm', 'shuffle'])
+OTHER_PLAYERS_DRAW_RE = re.compile(r'^<([uvw])\d+', re.I)
+# a replay doesn't know its own game id, the live <TAIKYOKU> has it
+REPLAY_GAME_ID = '2000010100gm-0001-0000-00000000'
+
+
+def load_recording(path):
+    """
+    :param path: .thr log of a live game, as received by the client, or a mjlog replay
+    :return: list of chunks, see parse_recording()
+    """
+    with open(path, encoding='utf-8') as f:
+        return parse_recording(f.read())
+
+
+def parse_recording(text):
+    """
+    Messages which the server sends to player 0 during a game, from <GO> to the end of it.
+    A live log keeps the messages which came in one read together, a replay is turned into what player 0 would have
+    seen: only its own starting hand and no tiles of the other players' draws.
+    :param text: content of a .thr or mjlog file
+    :return: list of chunks, each a list of messages to be sent at once
+    """
+    is_replay = '<mjloggm' in text.lower()
+    lines = [text] if is_replay else text.splitlines()
+
+    chunks = []
+    for line in lines:
+        messages = [_to_live_message(x.group(0)) if is_replay else x.group(0) for x in TAG_RE.finditer(line)]
+        messages = [x for x in messages if x]
+        if is_replay:
+            chunks.extend([x] for x in messages)
+        elif messages:
+            chunks.append(messages)
+
+    # a live game ends with <PROF> just before the final scores, a replay doesn't have it
+    if is_replay and chunks and 'owari' in chunks[-1][-1].lower():
+        chunks[-1].insert(0, '<PROF/>')
+
+    # the log of a live game starts with the connection, the server makes its own
+    for n, chunk in enumerate(chunks):
+        if any(x.lower().startswith('<go') for x in chunk):
+            return chunks[n:]
+    return chunks
+
+
+def _to_live_message(message):
+    tag_name = TAG_RE.match(message).group(1).lower()
+    if tag_name in REPLAY_ONLY_TAGS:
+        return None
+    if tag_name == 'init':
+        message = re.sub(r'\shai[123]="[^"]*"', '', message)
+        return re.sub(r'\shai0=', ' hai=', message)
+    if tag_name == 'taikyoku' and not re.search(r'\slog=', message, re.I):
+        return re.sub(r'\s*/?>$', ' log="{0}"/>'.format(REPLAY_GAME_ID), message)
+    return OTHER_PLAYERS_DRAW_RE.sub(lambda x: '<' + x.group(1), message)
+
+
+class MockTenhouServer(object):
+    """
+    Speaks the NUL delimited tenhou protocol: answers <HELO> with an auth challenge, checks the <AUTH> token and, after
+    <JOIN>, replays the recorded game. Every client plays the same game as player 0.
+
+    When the recording offers the client a turn (a draw, a call or the end of a round), the replay waits for its
+    answer and keeps the time it took. A client which disconnects without <BYE> continues from the start of the same
+    round when it logs in again with the same name.
+    """
+
+    decoder = TenhouDecoder()
+
+    def __init__(self, chunks, delay=0, max_games=None, reply_timeout=REPLY_TIMEOUT):
+        """
+        :param chunks: recorded game, see parse_recording()
+        :param delay: seconds to wait before each chunk, 0 to replay as fast as the clients answer
+        :param max_games: how many games are played at the same time, the other clients wait in the lobby
+        :param reply_timeout: seconds to wait for an answer of the client before going on
+        """
+        self.chunks = chunks
+        self.delay = delay
+        self.reply_timeout = reply_timeout
+        self.games = asyncio.Semaphore(max_games) if max_games else None
+        self.round_starts = [n for n, chunk in enumerate(chunks) if any(x.lower().startswith('<init') for x in chunk)]
+        self.server = None
+        # tasks serving the connected clients
+        self.connections = set()
+
+        # user id -> chunk to continue from, for the clients which were disconnected in the middle of a game
+        self.disconnected = {}
+        self.logins = []
+        self.count_of_auth_failures = 0
+        self.count_of_reconnects = 0
+        self.count_of_byes = 0
+        self.count_of_finished_games = 0
+        self.count_of_missed_replies = 0
+        # (tag name, seconds) for every answer of a client
+        self.reply_times = []
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        :return: (host, port) the server listens on
+        """
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """
+        Stop listening and wait until the games in progress have ended
+        """
+        self.server.close()
+        await asyncio.gather(*self.connections)
+        await self.server.wait_closed()
+
+    async def serve_forever(self, host='127.0.0.1', port=0):
+        await self.start(host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _serve(self, reader, writer):
+        connection = _Connection(reader, writer)
+        self.connections.add(asyncio.current_task())
+        try:
+            await self._play(connection)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.count_of_byes += connection.said_bye
+            self.connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def _play(self, connection):
+        helo = await connection.read(self.reply_timeout)
+        if not helo or not helo.lower().startswith('<helo'):
+            return
+        user_id = unquote(find_tag(helo, 'helo').attrs.get('name', ''))
+        self.logins.append(user_id)
+
+        auth_string = '{0}-{1:08x}'.format(datetime.date.today().strftime('%Y%m%d'), random.getrandbits(32))
+        connection.send(['<HELO uname="{0}" auth="{1}" ratingscale=""/>'.format(quote(user_id), auth_string)])
+        auth = await connection.read(self.reply_timeout)
+        tag = auth and find_tag(auth, 'auth')
+        if not tag or tag.attrs.get('val') != self.decoder.generate_auth_token(auth_string):
+            logger.info('Mock server: wrong auth token of {0}'.format(user_id))
+            self.count_of_auth_failures += 1
+            return
+        connection.send([LOBBY_STATUS])
+
+        start = self.disconnected.pop(user_id, None)
+        if start is None:
+            # a client which reconnects goes straight back to its game, the others have to join one
+            if not await connection.wait_for(JOIN_RE, None):
+                return
+            start = self.round_starts[0] if self.round_starts else len(self.chunks)
+        else:
+            self.count_of_reconnects += 1
+
+        if self.games:
+            async with self.games:
+                await self._replay(connection, user_id, start)
+        else:
+            await self._replay(connection, user_id, start)
+
+    async def _replay(self, connection, user_id, start):
+        """
+        Send <GO>, <UN>, <TAIKYOKU> of the recording, then the game from chunk `start`
+        """
+        preamble = range(self.round_starts[0] if self.round_starts else start)
+        current_round = start
+        for index in list(preamble) + list(range(start, len(self.chunks))):
+            if index in self.round_starts:
+                current_round = index
+            chunk = self.chunks[index]
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            sent_at = time.perf_counter()
+            connection.send(chunk)
+            if index == len(self.chunks) - 1:
+                # the client may say goodbye without answering the end of the game
+                self.count_of_finished_games += 1
+
+            for message in chunk:
+                expected = self._expected_reply(message)
+                if expected is None:
+                    continue
+                reply = await connection.wait_for(expected, self.reply_timeout)
+                if connection.is_closed:
+                    if not connection.said_bye:
+                        self.disconnected[user_id] = current_round
+                    return
+                if reply is None:
+                    self.count_of_missed_replies += 1
+                    continue
+                # <T12/> and <E34 t="1"/> are timed as 't' and 'e'
+                tag_name = TAG_RE.match(message).group(1).lower().rstrip('0123456789')
+                self.reply_times.append((tag_name, time.perf_counter() - sent_at))
+
+                # the declaration of riichi is accepted before the discard
+                if reply.lower().startswith('<reach'):
+                    connection.send(['<REACH who="0" step="1"/>'])
+                    await connection.wait_for(DISCARD_RE, self.reply_timeout)
+
+        await connection.wait_for(BYE_RE, self.reply_timeout)
+
+    def _expected_reply(self, message):
+        """
+        :return: regex of the answer the client has to give to the message, or None if it doesn't answer
+        """
+        if DRAW_RE.match(message):
+            return DISCARD_REPLY_RE
+        if CALL_OFFER_RE.match(message):
+            return CALL_REPLY_RE
+        if END_OF_ROUND_RE.match(message):
+            return NEXT_READY_RE
+        return None
+
+
+class _Connection(object):
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.is_closed = False
+        self.said_bye = False
+
+    def send(self, messages):
+        self.writer.write(b''.join(x.encode() + b'\0' for x in messages))
+
+    async def read(self, timeout):
+        """
+        :return: the next message of the client, keep-alive pings are skipped. None if the connection was closed
+        """
+        while not self.is_closed:
+            try:
+                message = await asyncio.wait_for(self.reader.readuntil(b'\0'), timeout)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.is_closed = True
+                return None
+            message = message[:-1].decode('utf-8')
+            if message.lower().startswith('<bye'):
+                self.is_closed = self.said_bye = True
+                return message
+            if not message.lower().startswith('<z'):
+                return message
+        return None
+
+    async def wait_for(self, pattern, timeout):
+        """
+        Skip the messages of the client until one matches the pattern
+        :return: the message, or None if the connection was closed or there was none in `timeout` seconds
+        """
+        loop = asyncio.get_running_loop()
+        deadline = timeout and loop.time() + timeout
+        while not self.is_closed:
+            try:
+                message = await self.read(deadline and max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return None
+            if message is not None and pattern.match(message):
+                return message
+        return None
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [recording]')
+    parser.add_option('-H', '--host', type='string', default='127.0.0.1', help='Default is 127.0.0.1')
+    parser.add_option('-p', '--port', type='int', default=10080, help='Default is 10080')
+    parser.add_option('-d', '--delay', type='float', default=0,
+                      help='Seconds between the recorded messages. Default is 0, as fast as the clients answer')
+    parser.add_option('-g', '--games', type='int', help='How many games are played at the same time. No limit by '
+                                                        'default')
+    opts, args = parser.parse_args()
+
+    set_up_logging()
+    server = MockTenhouServer(load_recording(args[0] if args else DEFAULT_RECORDING), opts.delay, opts.games)
+    logger.info('Mock tenhou server on {0}:{1}'.format(opts.host, opts.port))
+    try:
+        asyncio.run(server.serve_forever(opts.host, opts.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
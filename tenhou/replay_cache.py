@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import copy
+import hashlib
+import json
+import logging
+import os
+import struct
+
+from tenhou.decoder import GameMode, TenhouDecoder
+from tenhou.event_model import GameEvents, DecodedEvent, EVENT_CLASSES, CallEvent, DiscardEvent, DoraFlippedEvent, \
+    DrawEvent, RiichiDeclaredEvent
+from tenhou.replay_index import ReplayEvents, MappedReplay
+
+logger = logging.getLogger('tenhou')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'cache', 'replays')
+
+# magic, format version, modification time of the replay file in ns, count of records, length of the side table
+HEADER = struct.Struct('<4sHqII')
+MAGIC = b'THRC'
+VERSION = 2
+# event type (GameEvents value), seat, tile, meld code or index into the side table
+RECORD = struct.Struct('<BBhH')
+
+# Events which fit into a record on their own, every other event is kept in the side table
+RECORD_EVENTS = frozenset([GameEvents.RECV_DRAW, GameEvents.RECV_DISCARD, GameEvents.RECV_CALL,
+                           GameEvents.RECV_DORA_FLIPPED, GameEvents.RECV_RIICHI_DECLARED])
+
+
+def _to_tuples(values):
+    return None if values is None else [tuple(x) for x in values]
+
+
+# Fields of the side table which JSON can't keep as they are: how to store them, and how to restore them
+FIELD_ENCODERS = {'game_mode': lambda game_mode: game_mode.game_mode_value}
+FIELD_DECODERS = {'game_mode': GameMode, 'yaku': _to_tuples, 'yakuman': _to_tuples}
+
+
+class CompiledReplay(ReplayEvents):
+    """The events of a replay, loaded from the binary form written by ReplayCache.
+
+    Draws, discards, calls, dora and riichi declarations are fixed width records of 6 bytes. The other events (e.g.
+    <INIT> and <AGARI>) are records pointing into a side table of their fields, which is stored as JSON. Events are
+    created from the records when they are accessed, without any XML being tokenized.
+    """
+
+    def __init__(self, records, side_table, decoder: TenhouDecoder = None):
+        self.decoder = decoder if decoder is not None else TenhouDecoder()
+        self.records = records
+        self.side_table = side_table
+        self.hand_indices = [n for n, (event_type, _, _, _) in enumerate(RECORD.iter_unpack(records))
+                             if event_type == GameEvents.RECV_BEGIN_HAND.value]
+
+    def __len__(self):
+        return len(self.records) // RECORD.size
+
+    def decode(self, index) -> DecodedEvent:
+        event_type, seat, tile, code = RECORD.unpack_from(self.records, index * RECORD.size)
+        game_event = GameEvents(event_type)
+        if game_event not in RECORD_EVENTS:
+            # Copied every time, so that events never share mutable fields such as lists of tiles
+            data = copy.deepcopy(self.side_table[code])
+            for name, decode_field in FIELD_DECODERS.items():
+                if name in data:
+                    data[name] = decode_field(data[name])
+            return EVENT_CLASSES[game_event](**data)
+        if game_event == GameEvents.RECV_DRAW:
+            return DrawEvent(tile=tile, who=seat, action='draw')
+        elif game_event == GameEvents.RECV_DISCARD:
+            return DiscardEvent(tile=tile, who=seat, action='discard')
+        elif game_event == GameEvents.RECV_CALL:
+            return CallEvent(meld=self.decoder.meld_from_code(seat, code))
+        elif game_event == GameEvents.RECV_DORA_FLIPPED:
+            return DoraFlippedEvent(tile=tile)
+        return RiichiDeclaredEvent(who=seat, step=1, ten=None)
+
+    @staticmethod
+    def compile(replay: MappedReplay):
+        """Encode every event of a replay.
+
+        :return: The records as bytes and the side table as a list of the fields of events, as JSON values
+        """
+        records = bytearray()
+        side_table = []
+        for index in range(len(replay)):
+            tag = replay.tag(index)
+            event = replay.decoder.tag_to_event(tag, replay.message(index))
+            record = CompiledReplay._encode(event, tag)
+            if record is None:
+                record = (event.game_event.value, 0, -1, len(side_table))
+                data = event.to_dict()
+                del data['game_event']
+                for name, encode_field in FIELD_ENCODERS.items():
+                    if data.get(name) is not None:
+                        data[name] = encode_field(data[name])
+                side_table.append(data)
+            records += RECORD.pack(*record)
+        return bytes(records), side_table
+
+    @staticmethod
+    def _encode(event, tag):
+        """Return the record of an event which fits into one, else None"""
+        game_event = event.game_event
+        if game_event not in RECORD_EVENTS:
+            return None
+        if game_event in [GameEvents.RECV_DRAW, GameEvents.RECV_DISCARD]:
+            if event.tile is None:
+                return None
+            return game_event.value, event.who, event.tile, 0
+        elif game_event == GameEvents.RECV_CALL:
+            return game_event.value, event.meld.who, -1, int(tag.attrs['m'])
+        elif game_event == GameEvents.RECV_DORA_FLIPPED:
+            return game_event.value, 0, event.tile, 0
+        elif event.step == 1 and event.ten is None:
+            return game_event.value, event.who, -1, 0
+        return None
+
+
+class ReplayCache(object):
+    """A directory of compiled replays, one per replay file, keyed by its path. The modification time of the replay
+    file is kept in the compiled one, a compiled replay which is out of date is replaced.
+
+    load() compiles a replay the first time it is opened (or after it changed), and afterwards reads the compiled
+    form, so that replay viewers and analysis tools skip decoding the XML.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, decoder: TenhouDecoder = None):
+        self.cache_dir = cache_dir
+        self.decoder = decoder if decoder is not None else TenhouDecoder()
+
+    def cache_path(self, replay_file_path):
+        key = os.path.abspath(replay_file_path)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.thrc')
+
+    def load(self, replay_file_path) -> CompiledReplay:
+        """Load the events of a replay file, compiling and caching it first if there is no up to date cache of it."""
+        cache_path = self.cache_path(replay_file_path)
+        mtime_ns = os.stat(replay_file_path).st_mtime_ns
+        compiled = self._read(cache_path, mtime_ns)
+        if compiled is not None:
+            return compiled
+
+        with MappedReplay(replay_file_path, self.decoder) as replay:
+            records, side_table = CompiledReplay.compile(replay)
+        self._write(cache_path, mtime_ns, records, side_table)
+        return CompiledReplay(records, side_table, self.decoder)
+
+    def _read(self, cache_path, mtime_ns):
+        """Return the compiled replay, or None if there is none of the replay file as it was modified at `mtime_ns`"""
+        try:
+            with open(cache_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            magic, version, cached_mtime_ns, count, side_table_length = HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION or cached_mtime_ns != mtime_ns:
+                return None
+            records_end = HEADER.size + count * RECORD.size
+            if len(data) < records_end + side_table_length:
+                raise ValueError('truncated')
+            side_table = json.loads(data[records_end:records_end + side_table_length].decode('utf-8'))
+            if not isinstance(side_table, list) or not all(isinstance(x, dict) for x in side_table):
+                raise ValueError('not a side table')
+        except (struct.error, ValueError):
+            logger.warning('Ignoring corrupt replay cache file: ' + cache_path)
+            return None
+        return CompiledReplay(data[HEADER.size:records_end], side_table, self.decoder)
+
+    def _write(self, cache_path, mtime_ns, records, side_table):
+        side_table = json.dumps(side_table, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        temp_path = cache_path + '.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, mtime_ns, len(records) // RECORD.size, len(side_table)))
+                f.write(records)
+                f.write(side_table)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            # Not being able to cache a replay is not fatal, it is only decoded again next time
+            logger.warning('Unable to write replay cache file {0}: {1}'.format(cache_path, e))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import mmap
+import re
+from array import array
+
+from tenhou.decoder import TenhouDecoder, NO_EVENT_TAGS
+from tenhou.event_model import DecodedEvent
+from tenhou.tokenizer import Tag, parse_tag
+
+# Same as tokenizer.TAG_RE, but over the raw bytes of a file
+TAG_BYTES_RE = re.compile(rb'<(/?[A-Za-z][^\s/>]*)[^>]*>')
+NO_EVENT_TAG_NAMES = frozenset(name.encode('ascii') for name in NO_EVENT_TAGS)
+
+
+class ReplayEvents(object):
+    """Base class of read-only sequences of the events of a replay, which only produce an event when it is accessed.
+
+    Subclasses implement __len__() and decode(), and list the indices of the <INIT> events in hand_indices.
+    """
+    hand_indices = ()
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.decode(n) for n in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.decode(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.decode(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def decode(self, index) -> DecodedEvent:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MappedReplay(ReplayEvents):
+    """A replay file which is memory-mapped and indexed by the (offset, length) of each tag producing an event.
+
+    Loading only makes one pass over the bytes of the file, to build the index. Events are decoded when they are
+    accessed, by index like a list, and are not kept afterwards, so an open replay costs a few bytes per event plus
+    the mapped file, which is shared with any other process that has it open.
+    """
+
+    def __init__(self, replay_file_path, decoder: TenhouDecoder = None):
+        self.decoder = decoder if decoder is not None else TenhouDecoder()
+        self.offsets = array('I')
+        self.lengths = array('I')
+        # Indices of the events starting each hand (<INIT>), for seeking without decoding the whole replay
+        self.hand_indices = array('I')
+        self._data = b''
+        with open(replay_file_path, 'rb') as f:
+            try:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                pass  # An empty file (or a device such as os.devnull) cannot be mapped, and has no tags anyway
+        self._build_index()
+
+    def _build_index(self):
+        for match in TAG_BYTES_RE.finditer(self._data):
+            name = match.group(1).lower()
+            if name in NO_EVENT_TAG_NAMES:
+                continue
+            if name == b'init':
+                self.hand_indices.append(len(self.offsets))
+            self.offsets.append(match.start())
+            self.lengths.append(match.end() - match.start())
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def message(self, index) -> str:
+        """Return the raw text of the tag of the event at `index`."""
+        offset = self.offsets[index]
+        return self._data[offset:offset + self.lengths[index]].decode('utf-8')
+
+    def tag(self, index) -> Tag:
+        """Return the tokenized tag of the event at `index`."""
+        return parse_tag(self.message(index))
+
+    def decode(self, index) -> DecodedEvent:
+        """Decode the event at `index` from its tag."""
+        message = self.message(index)
+        return self.decoder.tag_to_event(parse_tag(message), message)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b''
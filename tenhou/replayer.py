@@ -1,27 +1,64 @@
 # -*- coding: utf-8 -*-
 import logging
+from bisect import bisect_right
 
 import pygame
 
+from mahjong.undo_log import UndoLog
 from tenhou.decoder import TenhouDecoder
-from tenhou.events import GameEvents, GameEvent, GAMEEVENT, UIEVENT, UiEvents
+from tenhou.event_model import StateRestoredEvent
+from tenhou.events import GameEvents, GameEvent, GAMEEVENT, UIEVENT, UiEvents, to_pygame_event
+from tenhou.game_state import GameStateEngine
 from tenhou.gui.screens import EventListener
+from tenhou.replay_cache import ReplayCache
 
 logger = logging.getLogger('tenhou')
 
+# A keyframe is kept at the start of every hand, and at least once every this many events
+KEYFRAME_INTERVAL = 32
+
 
 class ReplayClient(EventListener):
-    def __init__(self, replay_file_path=None):
+    """Steps through a replay, posting its events for the GUI.
+
+    The replay's game state is also tracked headlessly, with a snapshot of it (a keyframe) kept at the start of every
+    hand and every KEYFRAME_INTERVAL events. Seeking to any event restores the nearest keyframe before it and replays
+    forward from there, then posts the resulting state in a STATE_RESTORED event. Stepping back by a single event
+    reverts it through the table's undo log instead, while the log reaches back that far.
+    """
+
+    def __init__(self, replay_file_path=None, post_event=pygame.event.post, replay_cache: ReplayCache = None):
+        """
+        :param replay_file_path: The path of a replay file to load
+        :param post_event: The function to post events with, pygame.event.post unless testing
+        :param replay_cache: The cache of compiled replays to load replays through
+        """
         self.decoder = TenhouDecoder()
-        self.current_line_idx = 0
-        self.lines = []
+        self.post_event = post_event
+        self.replay_cache = replay_cache if replay_cache is not None else ReplayCache(decoder=self.decoder)
+        self.engine = self._new_engine()
+        self.current_event_idx = 0
+        self.events = None
+        self.keyframe_indices = []
+        self.keyframes = []
         self.current_replay = None
         if replay_file_path is not None:
             self.load_replay(replay_file_path)
 
+    @staticmethod
+    def _new_engine():
+        engine = GameStateEngine()
+        engine.table.undo_log = UndoLog()
+        return engine
+
     def _erase_state(self):
-        self.current_line_idx = 0
-        self.lines.clear()
+        if self.events is not None:
+            self.events.close()
+        self.engine = self._new_engine()
+        self.current_event_idx = 0
+        self.events = None
+        self.keyframe_indices = []
+        self.keyframes = []
         self.current_replay = None
 
     def reload_replay(self):
@@ -38,13 +75,9 @@ class ReplayClient(EventListener):
         self._erase_state()
         self.current_replay = replay_file_path
         logger.info('Loading replay file: ' + replay_file_path)
-        with open(replay_file_path, 'r') as f:  # TODO: Verify replay
-            tmp_lines = [line.strip() for line in f.readlines()]
-            for line in tmp_lines:
-                # Ensure there is only one tag per line
-                sep_lines = line.replace('><', '>\n<').split('\n')
-                # Add lines to list
-                self.lines.extend(sep_lines)
+        # TODO: Verify replay
+        # Events are created lazily from the compiled replay, as the replay is stepped through
+        self.events = self.replay_cache.load(replay_file_path)
         if autoskip:
             self.step(5)
 
@@ -53,28 +86,105 @@ class ReplayClient(EventListener):
         Step the replay forward, causing an event to be posted.
 
         :param steps: number of steps to advance
-        :return: True if the next game event was successfully posted, else False if the current line of the replay
-        could not be parsed into an event.
+        :return: True if the next game event was successfully posted, else False if the end of the replay was reached.
         """
         if steps < 0:
             return False
         if self.end_of_replay():
-            pygame.event.post(GameEvent(GameEvents.END_OF_REPLAY))
+            self.post_event(GameEvent(GameEvents.END_OF_REPLAY))
             return False
-        elif self.current_line_idx + steps >= len(self.lines) - 1:
-            steps = len(self.lines) - 1 - self.current_line_idx
 
         while steps > 0:
-            self.current_line_idx += 1
-            message = self.lines[self.current_line_idx]
-            event = self.decoder.message_to_event(message)
-            if event is not None:
-                pygame.event.post(event)
+            if self.end_of_replay():
+                self.post_event(GameEvent(GameEvents.END_OF_REPLAY))
+                return False
+            self.post_event(to_pygame_event(self._advance()))
+            steps -= 1
+        return True
+
+    def step_back(self, steps=1):
+        """
+        Step the replay backward, causing a STATE_RESTORED event to be posted.
+
+        :param steps: number of steps to go back
+        :return: True if the state was restored, else False if there is no replay loaded
+        """
+        if self.events is None:
+            return False
+        while steps > 0 and self.current_event_idx > 0 and self.engine.undo():
+            self.current_event_idx -= 1
             steps -= 1
+        if steps > 0:
+            return self.seek(self.current_event_idx - steps)
+        self.post_event(to_pygame_event(StateRestoredEvent(snapshot=self.engine.snapshot())))
         return True
 
+    def seek(self, event_idx):
+        """
+        Jump to the game state after the first `event_idx` events of the replay, causing a STATE_RESTORED event to be
+        posted. The state is restored from the nearest keyframe before `event_idx`, then the events after it are
+        replayed without being posted.
+
+        :param event_idx: The number of events to have been applied, clamped to the length of the replay
+        :return: True if the state was restored, else False if there is no replay loaded
+        """
+        if self.events is None:
+            return False
+        event_idx = max(0, min(event_idx, len(self.events)))
+        if event_idx < self.current_event_idx:
+            keyframe = bisect_right(self.keyframe_indices, event_idx) - 1
+            self.engine.restore(self.keyframes[keyframe])
+            self.current_event_idx = self.keyframe_indices[keyframe]
+            # The undo log now only reaches back to the keyframe
+            self.engine.table.undo_log.clear()
+        while self.current_event_idx < event_idx:
+            self._advance()
+        self.post_event(to_pygame_event(StateRestoredEvent(snapshot=self.engine.snapshot())))
+        return True
+
+    def seek_hand(self, round_number, honba=None, turn=0):
+        """
+        Jump to a turn of a hand, e.g. seek_hand(6, turn=8) for South 3, turn 8.
+
+        :param round_number: The round number, from 0 for East 1
+        :param honba: The count of honba sticks of the hand, or None for the first hand of the round
+        :param turn: The number of tiles the dealer has drawn in the hand, 0 for straight after the deal
+        :return: True if the hand was found, else False
+        """
+        if self.events is None:
+            return False
+        for event_idx in self.events.hand_indices:
+            event = self.events[event_idx]
+            if event.round_number == round_number and (honba is None or event.count_of_honba_sticks == honba):
+                break
+        else:
+            return False
+
+        dealer = event.oya
+        event_idx += 1
+        while turn > 0 and event_idx < len(self.events):
+            event = self.events[event_idx]
+            if event.game_event in [GameEvents.RECV_BEGIN_HAND, GameEvents.RECV_AGARI, GameEvents.RECV_RYUUKYOKU]:
+                break
+            if event.game_event == GameEvents.RECV_DRAW and event.who == dealer:
+                turn -= 1
+            event_idx += 1
+        return self.seek(event_idx)
+
+    def _advance(self):
+        """Apply the next event to the replay's game state, keeping a keyframe first if one is due, and return it."""
+        event = self.events[self.current_event_idx]
+        if not self.keyframe_indices or self.current_event_idx > self.keyframe_indices[-1]:
+            if (self.current_event_idx % KEYFRAME_INTERVAL == 0
+                    or event.game_event == GameEvents.RECV_BEGIN_HAND):
+                self.keyframe_indices.append(self.current_event_idx)
+                self.keyframes.append(self.engine.snapshot())
+        self.engine.apply(event)
+        self.current_event_idx += 1
+        return event
+
     def end_of_replay(self) -> bool:
-        return self.current_line_idx >= len(self.lines) - 1
+        return self.events is None or self.current_event_idx >= len(self.events)
 
     def end_game(self):
         pass  # Required for gui -> self.game_manager.end_game() call
@@ -92,4 +202,4 @@ class ReplayClient(EventListener):
         if event.game_event == GameEvents.CALL_STEP_FORWARD:
             self.step(1)
         elif event.game_event == GameEvents.CALL_STEP_BACKWARD:
-            pass  # TODO: Not currently supported, as it messes up the Table state
+            self.step_back(1)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+
+from tenhou.client_async import TenhouClient
+
+logger = logging.getLogger('tenhou')
+
+# seconds between the logins of two sessions, tenhou doesn't like many logins at the same moment
+START_INTERVAL = 1
+
+
+class SessionManager(object):
+    """
+    Runs many client sessions, e.g. one per tenhou account, concurrently on one event loop.
+
+    Every session has its own TenhouClient, so its own Table and players, and its own settings overrides. The
+    decoder and the 'tenhou' logger are shared, log messages start with the user id of the session.
+    """
+
+    def __init__(self, sessions, host=None, port=None, count_of_games=1, start_interval=START_INTERVAL):
+        """
+        :param sessions: list of dicts of settings overrides, one per session, e.g. [{'USER_ID': 'ID1-2'}, ...]
+        :param host: tenhou host, settings.TENHOU_HOST by default
+        :param port: tenhou port, settings.TENHOU_PORT by default
+        :param count_of_games: how many games each session plays, one after another
+        :param start_interval: seconds between the starts of two sessions
+        """
+        self.sessions = sessions
+        self.host = host
+        self.port = port
+        self.count_of_games = count_of_games
+        self.start_interval = start_interval
+        # every client that was started, in the order of the sessions and games
+        self.clients = []
+
+    def run(self):
+        """
+        Play all the sessions, blocks until every one of them has ended
+        :return: list with, for each session, the list of exceptions its games failed with
+        """
+        return asyncio.run(self.play())
+
+    async def play(self):
+        tasks = []
+        for n, overrides in enumerate(self.sessions):
+            tasks.append(asyncio.ensure_future(self._play_session(overrides, n * self.start_interval)))
+        return await asyncio.gather(*tasks)
+
+    async def _play_session(self, overrides, delay):
+        await asyncio.sleep(delay)
+        errors = []
+        for _ in range(self.count_of_games):
+            client = TenhouClient(overrides=overrides)
+            self.clients.append(client)
+            try:
+                await client.play(self.host, self.port)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # one broken session must not stop the others
+                client.logger.exception('Session failed')
+                errors.append(e)
+        return errors
@@ -1,7 +1,30 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import io
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
 import unittest
+from urllib.parse import unquote
 
+from mahjong.constants import FIVE_RED_SOU
+from tenhou.client import TenhouClient
+from tenhou.client_async import TenhouClient as AsyncTenhouClient
 from tenhou.decoder import TenhouDecoder, Meld
+from tenhou.event_model import GameEvents, DiscardEvent
+from tenhou.framing import FrameBuffer
+from tenhou.game_state import GameStateEngine
+from tenhou.latency import DECIDED, DECODED, SENT, LatencyRecorder, TimedStreamReader, percentile
+from tenhou.mock_server import REPLAY_GAME_ID, MockTenhouServer, load_recording
+from tenhou.replay_cache import ReplayCache
+from tenhou.replay_index import MappedReplay
+from tenhou.replayer import ReplayClient
+from tenhou.sessions import SessionManager
+from tenhou.tokenizer import iter_tags, parse_tag
+from utils.settings_handler import settings
 
 
 class TenhouDecoderTestCase(unittest.TestCase):
@@ -129,6 +152,16 @@ class TenhouDecoderTestCase(unittest.TestCase):
         self.assertEqual(meld.type, Meld.CHI)
         self.assertEqual(meld.tiles, [42, 44, 51])
 
+    def test_decode_meld_code(self):
+        decoder = TenhouDecoder()
+        descriptor = decoder.decode_meld_code(27031)
+
+        self.assertEqual(descriptor.type, Meld.CHI)
+        self.assertEqual(descriptor.from_who, 3)
+        self.assertEqual(descriptor.tiles, (42, 44, 51))
+        # descriptors are shared between calls and decoders
+        self.assertIs(TenhouDecoder().decode_meld_code(27031), descriptor)
+
     def test_parse_tile(self):
         decoder = TenhouDecoder()
 
@@ -152,3 +185,688 @@ class TenhouDecoderTestCase(unittest.TestCase):
 
         who = decoder.parse_who_called_riichi('<REACH who="2" ten="255,216,261,258" step="2"/>')
         self.assertEqual(who, 2)
+
+    def test_parse_meld_with_unquoted_attributes(self):
+        decoder = TenhouDecoder()
+        meld = decoder.parse_meld('<N who=3 m=34314>')
+
+        self.assertEqual(meld.who, 3)
+        self.assertEqual(meld.type, Meld.PON)
+        self.assertEqual(meld.tiles, [89, 90, 91])
+
+    def test_parse_agari_with_mixed_case_attributes(self):
+        decoder = TenhouDecoder()
+        message = '<AGARI ba="0,0" hai="12,13,41,46,51,78,80,84,98,101,105,108,109,110" machi="101" ten="30,1000,0" ' \
+                  'yaku="20,1" doraHai="89" who="2" fromWho="1" sc="225,0,240,-10,378,10,157,0" />'
+        values = decoder.parse_agari(message)
+
+        self.assertEqual(values['dora_hai'], [89])
+        self.assertEqual(values['from_who'], 1)
+        self.assertEqual(values['yaku'], [(20, 1)])
+
+    def test_message_to_event_dispatch(self):
+        decoder = TenhouDecoder()
+
+        self.assertEqual(decoder.message_to_event('<T12/>').game_event, GameEvents.RECV_DRAW)
+        self.assertEqual(decoder.message_to_event('<G26/>').game_event, GameEvents.RECV_DISCARD)
+        self.assertEqual(decoder.message_to_event('<U/>').who, 1)
+        self.assertEqual(decoder.message_to_event('<DORA hai="125" />').tile, 125)
+        self.assertEqual(decoder.message_to_event('</mjloggm>').game_event, GameEvents.END_OF_REPLAY)
+        self.assertIsNone(decoder.message_to_event('<PROF lobby="0" type="1" add="-13.0,0,0,1,0,0,4,3,2,1,0"/>'))
+        self.assertRaises(NotImplementedError, decoder.message_to_event, '<FOO />')
+
+    def test_message_to_event_is_headless(self):
+        decoder = TenhouDecoder()
+        event = decoder.message_to_event('<E24/>')
+
+        self.assertIsInstance(event, DiscardEvent)
+        self.assertFalse(hasattr(event, '__dict__'))
+        self.assertEqual(event.to_dict(), {'tile': 24, 'who': 1, 'action': 'discard',
+                                           'game_event': GameEvents.RECV_DISCARD})
+
+    def test_decode_stream(self):
+        decoder = TenhouDecoder()
+        log = '<mjloggm ver="2.3"><TAIKYOKU oya="0"/><INIT seed="0,0,0,2,5,110" ten="250,250,250,250" oya="0" ' \
+              'hai0="1,2,3" hai1="4,5,6" hai2="7,8,9" hai3="10,11,12"/><T70/><D122/><N who="3" m="34314" />' \
+              '<PROF lobby="0"/></mjloggm>'
+        expected = [GameEvents.RECV_BEGIN_GAME, GameEvents.RECV_BEGIN_HAND, GameEvents.RECV_DRAW,
+                    GameEvents.RECV_DISCARD, GameEvents.RECV_CALL, GameEvents.END_OF_REPLAY]
+
+        self.assertEqual([e.game_event for e in decoder.decode_stream(log)], expected)
+        self.assertEqual([e.game_event for e in decoder.decode_stream(log.encode())], expected)
+        self.assertEqual([e.game_event for e in decoder.decode_stream(io.BytesIO(log.encode()))], expected)
+
+    def test_register_handler(self):
+        decoder = TenhouDecoder()
+        handlers = dict(TenhouDecoder.message_handlers)
+        try:
+            TenhouDecoder.register_handler('foo', lambda _, tag: tag.attrs['bar'])
+            self.assertEqual(decoder.message_to_event('<FOO bar="baz" />'), 'baz')
+        finally:
+            TenhouDecoder.message_handlers = handlers
+
+
+class TokenizerTestCase(unittest.TestCase):
+
+    def test_parse_tag(self):
+        tag = parse_tag('<REACH who="2" ten="255,216,261,258" step="2"/>')
+
+        self.assertEqual(tag.name, 'reach')
+        self.assertEqual(tag.attrs, {'who': '2', 'ten': '255,216,261,258', 'step': '2'})
+
+    def test_parse_draw_tag(self):
+        tag = parse_tag('<T23/>')
+
+        self.assertEqual(tag.name, 't23')
+        self.assertEqual(tag.attrs, {})
+
+    def test_iter_tags(self):
+        tags = list(iter_tags('<mjloggm ver="2.3"><INIT seed="0,0,0,2,5,110"/><T70/><D122/></mjloggm>'))
+
+        self.assertEqual([tag.name for tag in tags], ['mjloggm', 'init', 't70', 'd122', '/mjloggm'])
+
+
+class GameStateEngineTestCase(unittest.TestCase):
+    REPLAY_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'gui', 'resources', 'replays')
+
+    def test_apply_events(self):
+        decoder = TenhouDecoder()
+        log = '<mjloggm ver="2.3"><INIT seed="0,1,0,2,5,110" ten="250,250,250,250" oya="0" ' \
+              'hai0="1,2,3,4,5,6,7,8,9,10,11,12,13" hai1="14,15,16,17,18,19,20,21,22,23,24,25,26" ' \
+              'hai2="27,28,29,30,31,32,33,34,35,36,37,38,39" hai3="40,41,42,43,44,45,46,47,48,49,50,51,52"/>' \
+              '<T70/><D1/><REACH who="1" step="1"/><U71/><E14/><REACH who="1" ten="250,250,250,250" step="2"/>' \
+              '<DORA hai="125" /></mjloggm>'
+        engine = GameStateEngine()
+        table = engine.apply_all(decoder.decode_stream(log))
+
+        self.assertEqual(table.count_of_honba_sticks, 1)
+        self.assertEqual(table.count_of_remaining_tiles, 68)
+        self.assertEqual(table.dora_indicators, [110, 125])
+        self.assertEqual(table.get_player(0).discards, [1])
+        self.assertEqual(len(table.get_player(0).tiles), 13)
+        self.assertEqual(table.get_player(1).is_riichi, True)
+        self.assertEqual(table.get_player(1).riichi_discards, [14])
+        self.assertEqual(table.get_player(1).score, 24000)
+        self.assertEqual(engine.last_discarder, 1)
+
+    def test_reconstruct_bundled_replays(self):
+        decoder = TenhouDecoder()
+        for file_name in os.listdir(self.REPLAY_DIR):
+            if 'gm-' not in file_name:
+                continue
+            with open(os.path.join(self.REPLAY_DIR, file_name), 'rb') as f:
+                table = GameStateEngine().apply_all(decoder.decode_stream(f))
+            self.assertGreaterEqual(table.count_of_remaining_tiles, 0, file_name)
+
+    def test_count_of_red_fives(self):
+        decoder = TenhouDecoder()
+        engine = GameStateEngine()
+        # a game with red fives, stopped at the first starting hand of player 0 with the red five of sou
+        with open(os.path.join(self.REPLAY_DIR, '2017010100gm-00a9-0000-003dbd5d'), 'rb') as f:
+            for event in decoder.decode_stream(f):
+                engine.apply(event)
+                if event.game_event == GameEvents.RECV_BEGIN_HAND and FIVE_RED_SOU in event.haipai[0]:
+                    break
+
+        tiles = engine.table.get_main_player().tiles
+        self.assertTrue(engine.has_red_fives)
+        self.assertIn(FIVE_RED_SOU, tiles)
+        self.assertEqual(engine.count_of_dora(tiles), (0, 1))
+
+        engine.has_red_fives = False
+        self.assertEqual(engine.count_of_dora(tiles), (0, 0))
+
+
+class MappedReplayTestCase(unittest.TestCase):
+    REPLAY_DIR = GameStateEngineTestCase.REPLAY_DIR
+
+    @staticmethod
+    def _event_fields(event):
+        # Compare decoded objects such as GameMode and Meld by their attributes
+        return {name: vars(value) if hasattr(value, '__dict__') else value for name, value in event.to_dict().items()}
+
+    def test_events_match_decode_stream(self):
+        decoder = TenhouDecoder()
+        for file_name in sorted(os.listdir(self.REPLAY_DIR))[:20]:
+            if 'gm-' not in file_name:
+                continue
+            file_path = os.path.join(self.REPLAY_DIR, file_name)
+            with open(file_path, 'rb') as f:
+                expected = [self._event_fields(event) for event in decoder.decode_stream(f)]
+            with MappedReplay(file_path, decoder) as replay:
+                self.assertEqual(len(replay), len(expected))
+                self.assertEqual([self._event_fields(event) for event in replay], expected)
+                self.assertEqual(self._event_fields(replay[-1]), expected[-1])
+                self.assertEqual([replay[n].game_event for n in replay.hand_indices],
+                                 [GameEvents.RECV_BEGIN_HAND] * len(replay.hand_indices))
+
+    def test_empty_file(self):
+        file_path = os.path.join(self.REPLAY_DIR, 'replaylist.txt')
+        with MappedReplay(os.devnull) as replay:
+            self.assertEqual(len(replay), 0)
+        with MappedReplay(file_path) as replay:
+            self.assertEqual(len(replay), 0)
+
+
+class ReplayCacheTestCase(unittest.TestCase):
+    REPLAY_DIR = GameStateEngineTestCase.REPLAY_DIR
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.replay_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.replay_dir)
+
+    def test_compiled_events_match_decoded_events(self):
+        cache = ReplayCache(self.cache_dir)
+        for file_name in sorted(os.listdir(self.REPLAY_DIR))[:20]:
+            if 'gm-' not in file_name:
+                continue
+            file_path = os.path.join(self.REPLAY_DIR, file_name)
+            with MappedReplay(file_path) as replay:
+                expected = [MappedReplayTestCase._event_fields(event) for event in replay]
+                hand_indices = list(replay.hand_indices)
+            # Compiled on the first load, read from the cache on the second
+            for _ in range(2):
+                compiled = cache.load(file_path)
+                self.assertEqual([MappedReplayTestCase._event_fields(event) for event in compiled], expected)
+                self.assertEqual(list(compiled.hand_indices), hand_indices)
+                self.assertTrue(os.path.exists(cache.cache_path(file_path)))
+
+    def test_recompile_when_modified(self):
+        cache = ReplayCache(self.cache_dir)
+        file_path = os.path.join(self.replay_dir, 'replay.xml')
+        with open(file_path, 'w') as f:
+            f.write('<mjloggm ver="2.3"><DORA hai="12"/><T5/></mjloggm>')
+        os.utime(file_path, ns=(0, 0))
+        self.assertEqual(len(cache.load(file_path)), 3)
+
+        with open(file_path, 'w') as f:
+            f.write('<mjloggm ver="2.3"><DORA hai="12"/></mjloggm>')
+        os.utime(file_path, ns=(0, 1))
+        self.assertEqual(len(cache.load(file_path)), 2)
+        # The compiled replay of the old file was replaced
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(cache.cache_path(file_path))])
+
+        # A corrupt cache file is compiled again
+        with open(cache.cache_path(file_path), 'wb') as f:
+            f.write(b'THRC')
+        self.assertEqual([event.game_event for event in cache.load(file_path)],
+                         [GameEvents.RECV_DORA_FLIPPED, GameEvents.END_OF_REPLAY])
+
+    def test_truncated_cache_file(self):
+        cache = ReplayCache(self.cache_dir)
+        file_path = os.path.join(self.replay_dir, 'replay.xml')
+        with open(file_path, 'w') as f:
+            f.write('<mjloggm ver="2.3"><GO type="169" lobby="0"/><DORA hai="12"/></mjloggm>')
+        expected = [MappedReplayTestCase._event_fields(event) for event in cache.load(file_path)]
+
+        cache_path = cache.cache_path(file_path)
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        with open(cache_path, 'wb') as f:
+            f.write(data[:-1])
+        self.assertEqual([MappedReplayTestCase._event_fields(event) for event in cache.load(file_path)], expected)
+        with open(cache_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+
+class ReplayClientTestCase(unittest.TestCase):
+    REPLAY_DIR = GameStateEngineTestCase.REPLAY_DIR
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _load_replay(self):
+        replay_file = sorted(name for name in os.listdir(self.REPLAY_DIR) if 'gm-' in name)[0]
+        posted = []
+        client = ReplayClient(post_event=posted.append, replay_cache=ReplayCache(self.cache_dir))
+        client.load_replay(os.path.join(self.REPLAY_DIR, replay_file), autoskip=False)
+        return client, posted
+
+    def test_seek_matches_stepping(self):
+        client, posted = self._load_replay()
+        snapshots = [client.engine.snapshot()]
+        while client.step():
+            snapshots.append(client.engine.snapshot())
+
+        for event_idx in [len(snapshots) - 1, 3, 200, 199, 0, 57, len(snapshots) - 2, 100]:
+            self.assertTrue(client.seek(event_idx))
+            self.assertEqual(client.current_event_idx, event_idx)
+            self.assertEqual(client.engine.snapshot(), snapshots[event_idx], event_idx)
+            self.assertEqual(posted[-1].game_event, GameEvents.STATE_RESTORED)
+            self.assertEqual(posted[-1].snapshot, snapshots[event_idx])
+
+    def test_step_back(self):
+        client, posted = self._load_replay()
+        client.step(40)
+        expected = client.engine.snapshot()
+        client.step()
+
+        self.assertTrue(client.step_back())
+        self.assertEqual(client.current_event_idx, 40)
+        self.assertEqual(client.engine.snapshot(), expected)
+
+        # The restored state is applied to another engine, such as the GUI's, without sharing any mutable state
+        engine = GameStateEngine()
+        engine.apply(posted[-1])
+        self.assertEqual(engine.snapshot(), expected)
+        engine.table.get_player(0).discards.append(1)
+        self.assertEqual(client.engine.snapshot(), expected)
+
+    def test_step_back_through_replay(self):
+        client, posted = self._load_replay()
+        snapshots = [client.engine.snapshot()]
+        while client.step():
+            snapshots.append(client.engine.snapshot())
+
+        # Every event is reverted through the undo log, without restoring a keyframe
+        for event_idx in reversed(range(len(snapshots) - 1)):
+            self.assertTrue(client.step_back())
+            self.assertEqual(client.current_event_idx, event_idx)
+            self.assertEqual(client.engine.snapshot(), snapshots[event_idx], event_idx)
+        self.assertEqual(len(client.engine.table.undo_log), 0)
+
+        # After seeking backwards the undo log only reaches back to the keyframe, stepping past it restores one
+        client.seek(100)
+        client.step_back(40)
+        self.assertEqual(client.current_event_idx, 60)
+        self.assertEqual(client.engine.snapshot(), snapshots[60])
+
+    def test_seek_hand(self):
+        client, posted = self._load_replay()
+
+        self.assertTrue(client.seek_hand(1, turn=3))
+        applied = client.events[:client.current_event_idx]
+        begin_hand_idx = max(n for n, event in enumerate(applied) if event.game_event == GameEvents.RECV_BEGIN_HAND)
+        begin_hand = applied[begin_hand_idx]
+        self.assertEqual(begin_hand.round_number, 1)
+        dealer_draws = [event for event in applied[begin_hand_idx:]
+                        if event.game_event == GameEvents.RECV_DRAW and event.who == begin_hand.oya]
+        self.assertEqual(len(dealer_draws), 3)
+        self.assertIs(applied[-1], dealer_draws[-1])
+        self.assertFalse(client.seek_hand(100))
+
+
+class AsyncTenhouClientTestCase(unittest.TestCase):
+
+    # far from tempai, so the drawn tile is discarded without riichi
+    HAND = '1,9,17,25,33,37,45,53,61,73,81,109,117'
+
+    def setUp(self):
+        self.saved_settings = {x: getattr(settings, x) for x in ['LOBBY', 'ENABLE_AI', 'STAT_SERVER_URL']}
+        settings.LOBBY = '0'
+        settings.ENABLE_AI = False
+        settings.STAT_SERVER_URL = ''
+
+    def tearDown(self):
+        for name, value in self.saved_settings.items():
+            setattr(settings, name, value)
+
+    async def _serve(self, reader, writer):
+        """A minimal tenhou server: auth, one draw, end of the game"""
+        async def read():
+            while True:
+                message = (await reader.readuntil(b'\0'))[:-1].decode()
+                self.received.append(message)
+                if message != '<Z />':
+                    return message
+
+        def send(*messages):
+            for message in messages:
+                writer.write(message.encode() + b'\0')
+
+        user_id = unquote(re.search(r'name="([^"]*)"', await read()).group(1))
+        send('<HELO uname="%4E%6F%4E%61%6D%65" auth="20160318-54ebe070" ratingscale=""/>')
+        self.assertEqual(await read(), '<AUTH val="20160318-72b5ba21"/>')
+        self.assertEqual(await read(), '<PXR V="{0}" />'.format(1 if user_id == 'NoName' else 9))
+        send('<LN n="BgZ1Cm" j="D1C2D2D2D1D12C3B13C1C2B1D12C4D8C1B2D1C3D2C1D1B1C2" g="HA1E12I3M48I8E4M4E" />')
+        self.joins[user_id] = await read()
+        send('<GO type="1" lobby="0" gpid=""/>',
+             '<UN n0="%4E%6F%4E%61%6D%65" n1="%41" n2="%42" n3="%43" dan="0,0,0,0" '
+             'rate="1500.00,1500.00,1500.00,1500.00" sx="M,M,M,M"/>',
+             '<TAIKYOKU oya="0" log="2016031808gm-0001-0000-c9e6e6f1"/>')
+        self.assertEqual(await read(), '<GOK />')
+        self.assertEqual(await read(), '<NEXTREADY />')
+        # tenhou sends empty messages from time to time
+        send('', '<INIT seed="0,0,0,3,2,118" ten="250,250,250,250" oya="0" hai="{0}"/>'.format(self.HAND), '<T131/>')
+        # the draw is answered right away, without waiting for the next message
+        self.assertEqual(await read(), '<D p="131"/>')
+        send('<PROF lobby="0" type="1" add="-28.0,0,0,1,0,0,2,0,0,0,0"/>')
+        self.assertEqual(await read(), '<BYE />')
+        writer.close()
+
+    async def _play(self, overrides=None):
+        server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        events = []
+        client = AsyncTenhouClient(event_sink=lambda game_event, data: events.append(game_event), overrides=overrides)
+        async with server:
+            await asyncio.wait_for(client.play('127.0.0.1', port), 10)
+        return client, events
+
+    def test_play_game(self):
+        self.received = []
+        self.joins = {}
+        client, events = asyncio.run(self._play())
+
+        self.assertFalse(client.looking_for_game)
+        self.assertFalse(client.game_is_continue)
+        self.assertEqual(client.statistics.game_id, '2016031808gm-0001-0000-c9e6e6f1')
+        self.assertEqual(client.table.get_main_player().discards, [131])
+        self.assertEqual(events[:3], [GameEvents.SENT_LOGIN_REQUEST, GameEvents.SENT_AUTH_TOKEN,
+                                      GameEvents.RECV_AUTH_SUCCESSFUL])
+        self.assertEqual(events[-1], GameEvents.SENT_END_GAME)
+        self.assertIn('<Z />', self.received)
+        self.assertEqual(self.joins, {'NoName': '<JOIN t="0,1" />'})
+
+    def test_latency_metrics(self):
+        self.received = []
+        self.joins = {}
+        metrics_directory = tempfile.mkdtemp()
+        try:
+            metrics_file = os.path.join(metrics_directory, 'latency.jsonl')
+            client, _ = asyncio.run(self._play({'LATENCY_METRICS_FILE': metrics_file}))
+            with open(metrics_file) as f:
+                records = [json.loads(x) for x in f]
+        finally:
+            shutil.rmtree(metrics_directory)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['user_id'], 'NoName')
+        self.assertEqual(records[0]['game_id'], '2016031808gm-0001-0000-c9e6e6f1')
+        latency = records[0]['latency']
+        self.assertEqual(sorted(latency), ['init', 'prof', 't'])
+        self.assertEqual(sorted(latency['t']), ['decision', 'decode', 'send', 'total'])
+        self.assertEqual(latency['t']['total']['count'], 1)
+        self.assertEqual(sorted(latency['init']), ['total'])
+        # the statistics of the game are reset once they were written
+        self.assertFalse(client.latency.samples)
+
+    async def _play_sessions(self, manager):
+        server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        manager.host, manager.port = server.sockets[0].getsockname()[:2]
+        async with server:
+            return await asyncio.wait_for(manager.play(), 10)
+
+    def test_session_manager(self):
+        self.received = []
+        self.joins = {}
+        game_type = settings.GAME_TYPE
+        manager = SessionManager([{'USER_ID': 'ID1'}, {'USER_ID': 'ID2', 'GAME_TYPE': '9'}], start_interval=0,
+                                 count_of_games=2)
+        errors = asyncio.run(self._play_sessions(manager))
+
+        self.assertEqual(errors, [[], []])
+        self.assertEqual(self.joins, {'ID1': '<JOIN t="0,1" />', 'ID2': '<JOIN t="0,9" />'})
+        self.assertEqual([x.user_id for x in manager.clients], ['ID1', 'ID2', 'ID1', 'ID2'])
+        self.assertEqual(len(set(id(x.table) for x in manager.clients)), 4)
+        for client in manager.clients:
+            self.assertEqual(client.table.get_main_player().discards, [131])
+        # the overrides don't leak into the global settings
+        self.assertEqual(settings.GAME_TYPE, game_type)
+
+
+class FrameBufferTestCase(unittest.TestCase):
+
+    def test_split_frames(self):
+        frames = FrameBuffer(size=16)
+
+        frames.feed(b'<T12/>\0<E1')
+        self.assertEqual(list(frames.frames()), [b'<T12/>'])
+        self.assertEqual(len(frames), 3)
+
+        frames.feed(b'3/>\0\0<F')
+        self.assertEqual(list(frames.frames()), [b'<E13/>', b''])
+        frames.feed(b'14 t="8"/>\0')
+        self.assertEqual(list(frames.frames()), [b'<F14 t="8"/>'])
+        self.assertEqual(len(frames), 0)
+        self.assertEqual(list(frames.frames()), [])
+
+    def test_large_frames(self):
+        frames = FrameBuffer(size=16)
+        message = '<UN n0="{0}"/>'.format('%41' * 1000).encode()
+
+        for n in range(0, len(message), 100):
+            frames.feed(message[n:n + 100])
+            self.assertEqual(list(frames.frames()), [])
+        frames.feed(b'\0<Z')
+        self.assertEqual(list(frames.frames()), [message])
+        self.assertEqual(len(frames), 2)
+
+    def test_client_reads_complete_messages(self):
+        server, client_socket = socket.socketpair()
+        client = TenhouClient(client_socket, 'NoName')
+        try:
+            # a long message cut in the middle of a multibyte character
+            message = '<CHAT uname="%41" text="{0}"/>'.format('天鳳' * 300).encode()
+            server.sendall(message[:1001])
+            server.sendall(message[1001:] + b'\0<GO type="1"/>\0<TAIK')
+            self.assertEqual(client._read_message(), message.decode().lower())
+            self.assertEqual(client._read_message(), '<go type="1"/>')
+
+            server.sendall(b'YOKU oya="0"/>\0')
+            self.assertEqual(client._get_multiple_messages(), ['<taikyoku oya="0"/>'])
+
+            server.close()
+            self.assertEqual(client._get_multiple_messages(), [])
+        finally:
+            client_socket.close()
+
+
+class MockTenhouServerTestCase(unittest.TestCase):
+    LIVE_GAME = os.path.join(os.path.dirname(__file__), 'gui', 'resources', 'live_game', 'gamelog_incl_conn.thr')
+    REPLAY = os.path.join(os.path.dirname(__file__), 'gui', 'resources', 'live_game', 'replay.thr')
+
+    def setUp(self):
+        self.saved_settings = {x: getattr(settings, x) for x in ['LOBBY', 'STAT_SERVER_URL']}
+        settings.LOBBY = '0'
+        settings.STAT_SERVER_URL = ''
+
+    def tearDown(self):
+        for name, value in self.saved_settings.items():
+            setattr(settings, name, value)
+
+    def test_parse_recording(self):
+        chunks = load_recording(self.LIVE_GAME)
+        self.assertTrue(chunks[0][0].startswith('<GO type="1"'))
+        self.assertEqual(chunks[2], ['<D122/>', '<U/>'])
+        self.assertTrue(chunks[-1][0].startswith('<PROF'))
+
+        chunks = load_recording(self.REPLAY)
+        self.assertEqual(chunks[2], ['<TAIKYOKU oya="0" log="{0}"/>'.format(REPLAY_GAME_ID)])
+        self.assertEqual(chunks[3], ['<INIT seed="0,0,0,2,5,110" ten="250,250,250,250" oya="0" '
+                                     'hai="61,60,86,54,79,105,71,91,10,77,87,122,83"/>'])
+        self.assertEqual(chunks[4:7], [['<T70/>'], ['<D122/>'], ['<U/>']])
+        self.assertEqual(chunks[-1][0], '<PROF/>')
+        self.assertIn('owari=', chunks[-1][1])
+
+    async def _login(self, port, user_id, auth_token=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write('<HELO name="{0}" tid="f0" sx="M" />\0'.format(user_id).encode())
+        challenge = TenhouDecoder().parse_auth_string((await reader.readuntil(b'\0'))[:-1].decode())
+        auth_token = auth_token or TenhouDecoder().generate_auth_token(challenge)
+        writer.write('<AUTH val="{0}"/>\0'.format(auth_token).encode())
+        return reader, writer
+
+    async def _play_until(self, reader, writer, prefix, count=1):
+        """Answer the draws, calls and the ends of rounds until `count` messages starting with `prefix` were received"""
+        while count:
+            message = (await reader.readuntil(b'\0'))[:-1].decode().lower()
+            if re.match(r'<t\d', message):
+                writer.write('<D p="{0}"/>\0'.format(message[2:-2]).encode())
+            if re.match(r'<[efg]\d+ t=', message):
+                writer.write(b'<N />\0')
+            if message.startswith('<agari') or message.startswith('<ryuukyoku'):
+                writer.write(b'<NEXTREADY />\0')
+            count -= message.startswith(prefix)
+
+    async def _play_games(self, server, sessions):
+        host, port = await server.start()
+        manager = SessionManager([{'USER_ID': x} for x in sessions], host, port, start_interval=0)
+        errors = await asyncio.wait_for(manager.play(), 20)
+        await server.close()
+        return manager, errors
+
+    def test_play_recorded_games(self):
+        for recording in [self.LIVE_GAME, self.REPLAY]:
+            server = MockTenhouServer(load_recording(recording), max_games=2)
+            manager, errors = asyncio.run(self._play_games(server, ['ID1', 'ID2', 'ID3']))
+
+            self.assertEqual(errors, [[], [], []])
+            self.assertEqual(sorted(server.logins), ['ID1', 'ID2', 'ID3'])
+            self.assertEqual(server.count_of_finished_games, 3)
+            self.assertEqual(server.count_of_byes, 3)
+            self.assertEqual(server.count_of_auth_failures, 0)
+            self.assertEqual(server.count_of_missed_replies, 0)
+            self.assertTrue(server.reply_times)
+            self.assertTrue({'t', 'agari'} <= set(x for x, _ in server.reply_times))
+            for client in manager.clients:
+                self.assertEqual(client.table.round_number, 3)
+
+    async def _wrong_auth_token(self, server):
+        host, port = await server.start()
+        reader, writer = await self._login(port, 'ID1', auth_token='20160318-00000000')
+        self.assertEqual(await reader.read(), b'')
+        writer.close()
+        await server.close()
+
+    def test_wrong_auth_token(self):
+        server = MockTenhouServer(load_recording(self.LIVE_GAME))
+        asyncio.run(self._wrong_auth_token(server))
+        self.assertEqual(server.count_of_auth_failures, 1)
+
+    async def _reconnect(self, server):
+        host, port = await server.start()
+
+        # leave during the second round without saying goodbye
+        reader, writer = await self._login(port, 'ID1')
+        writer.write(b'<JOIN t="0,1" />\0')
+        await self._play_until(reader, writer, '<init', count=2)
+        writer.close()
+        await asyncio.sleep(0.1)
+        self.assertEqual(server.disconnected, {'ID1': server.round_starts[1]})
+
+        # log in again, the game goes on from the start of the round
+        client = AsyncTenhouClient('ID1')
+        rounds = []
+        on_game_message = client._on_game_message
+        client._on_game_message = lambda x: rounds.extend(re.findall(r'<init seed="(\d+)', x)) or on_game_message(x)
+        await asyncio.wait_for(client.play(host, port), 10)
+        await server.close()
+        return rounds
+
+    def test_reconnect(self):
+        server = MockTenhouServer(load_recording(self.LIVE_GAME))
+        rounds = asyncio.run(self._reconnect(server))
+
+        self.assertEqual(rounds, ['1', '2', '2', '3'])
+        self.assertEqual(server.count_of_reconnects, 1)
+        self.assertEqual(server.count_of_finished_games, 1)
+        self.assertEqual(server.disconnected, {})
+
+    async def _bye(self, server):
+        host, port = await server.start()
+        reader, writer = await self._login(port, 'ID1')
+        writer.write(b'<JOIN t="0,1" />\0')
+        await self._play_until(reader, writer, '<t')
+        writer.write(b'<BYE />\0')
+        # the server hangs up
+        await reader.read()
+        writer.close()
+        await server.close()
+
+    def test_bye(self):
+        server = MockTenhouServer(load_recording(self.LIVE_GAME))
+        asyncio.run(self._bye(server))
+
+        self.assertEqual(server.count_of_byes, 1)
+        self.assertEqual(server.count_of_finished_games, 0)
+        self.assertEqual(server.disconnected, {})
+
+
+class LatencyRecorderTestCase(unittest.TestCase):
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile(samples, 100), 100)
+        self.assertEqual(percentile([7], 50), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_stages(self):
+        now = [0]
+        recorder = LatencyRecorder(clock=lambda: now[0])
+
+        for n in range(1, 101):
+            recorder.begin('t')
+            now[0] += 0.001
+            recorder.mark(DECODED)
+            now[0] += 0.001 * n
+            recorder.mark(DECIDED)
+            now[0] += 0.001
+            recorder.mark(SENT)
+            # only the first answer to a message counts
+            now[0] += 1
+            recorder.mark(SENT)
+            recorder.end()
+
+        # a message without an answer
+        recorder.begin('dora')
+        now[0] += 0.002
+        recorder.end()
+        # stamps without a message are ignored
+        recorder.mark(SENT)
+        recorder.end()
+
+        percentiles = recorder.percentiles()
+        self.assertEqual(sorted(percentiles), ['dora', 't'])
+        self.assertEqual(percentiles['t']['decision'], {'count': 100, 'p50': 50, 'p95': 95, 'p99': 99, 'max': 100})
+        self.assertEqual(percentiles['t']['decode']['p99'], 1)
+        self.assertEqual(percentiles['t']['total']['p50'], 52)
+        self.assertEqual(percentiles['dora'], {'total': {'count': 1, 'p50': 2, 'p95': 2, 'p99': 2, 'max': 2}})
+
+    def test_receive(self):
+        now = [10]
+        recorder = LatencyRecorder(clock=lambda: now[0])
+
+        # the message came from the socket at 7, it is decoded and answered at 10
+        recorder.receive(7)
+        recorder.begin('t')
+        recorder.mark(SENT)
+        recorder.end()
+
+        # a message read but not timed, e.g. in the lobby, is replaced by the next one
+        recorder.receive(8)
+        recorder.receive()
+        now[0] = 12
+        recorder.begin('e')
+        recorder.end()
+
+        self.assertEqual(recorder.percentiles()['t']['total']['p50'], 3000)
+        self.assertEqual(recorder.percentiles()['e']['total']['p50'], 2000)
+
+    async def _read_timed_frames(self, now):
+        reader = TimedStreamReader(clock=lambda: now[0])
+        arrivals = []
+        for data in [b'<T1/>\0<E', b'2/>\0<F3/>\0', b'<G4/>\0']:
+            now[0] += 1
+            reader.feed_data(data)
+        reader.feed_eof()
+        # the messages are read after all of them came
+        now[0] = 100
+        while not reader.at_eof():
+            frame = await reader.readuntil(b'\0')
+            arrivals.append((frame, reader.arrival))
+        return arrivals
+
+    def test_timed_stream_reader(self):
+        arrivals = asyncio.run(self._read_timed_frames([0]))
+        self.assertEqual(arrivals, [(b'<T1/>\0', 1), (b'<E2/>\0', 2), (b'<F3/>\0', 2), (b'<G4/>\0', 3)])
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import codecs
+import re
+from html import unescape
+
+# <NAME attrs...>, <NAME attrs.../> or a closing tag such as </mjloggm>, whose name keeps the leading slash
+TAG_RE = re.compile(r'<(/?[A-Za-z][^\s/>]*)([^>]*)>')
+# name="value", name='value' or name=value
+ATTR_RE = re.compile(r'([^\s=/]+)\s*(?:=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s/]+)))?')
+
+
+class Tag(object):
+    """A single Tenhou message tag, e.g. <INIT seed="..." ten="..."/>
+
+    Tag and attribute names are lowercased, the same way as Tenhou messages were previously normalised by
+    BeautifulSoup's html.parser.
+    """
+    __slots__ = ('name', 'attrs')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __repr__(self):
+        return 'Tag({0}, {1})'.format(self.name, self.attrs)
+
+
+def _parse_attrs(raw):
+    attrs = {}
+    if not raw or raw == '/':
+        return attrs
+    for match in ATTR_RE.finditer(raw):
+        name, double_quoted, single_quoted, unquoted = match.groups()
+        if double_quoted is not None:
+            value = double_quoted
+        elif single_quoted is not None:
+            value = single_quoted
+        elif unquoted is not None:
+            value = unquoted
+        else:
+            value = ''
+        if '&' in value:
+            value = unescape(value)
+        attrs[name.lower()] = value
+    return attrs
+
+
+def iter_tags(text, pos=0):
+    """Yield every tag in `text` in order, in a single pass and without building a document tree."""
+    for match in TAG_RE.finditer(text, pos):
+        yield Tag(match.group(1).lower(), _parse_attrs(match.group(2)))
+
+
+def iter_stream_tags(source, chunk_size=1 << 16):
+    """Yield every tag of a document given as a str, bytes or a (text or binary) file object.
+
+    File objects are read in chunks of `chunk_size`, so only the current chunk and any partial tag at its end are
+    held in memory.
+    """
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    if isinstance(source, str):
+        yield from iter_tags(source)
+        return
+
+    decoder = None
+    buffer = ''
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        buffer += chunk
+        # Only tokenize up to the last complete tag, the rest is carried over to the next chunk
+        end = buffer.rfind('>') + 1
+        if end:
+            yield from iter_tags(buffer[:end])
+            buffer = buffer[end:]
+    if decoder is not None:
+        buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield from iter_tags(buffer)
+
+
+def parse_tag(message):
+    """Return the first tag in `message`, or None if there is no tag."""
+    match = TAG_RE.search(message)
+    if match is None:
+        return None
+    return Tag(match.group(1).lower(), _parse_attrs(match.group(2)))
+
+
+def find_tag(message, tag_name):
+    """Return the first tag in `message` called `tag_name`, or None if there is no such tag."""
+    for tag in iter_tags(message):
+        if tag.name == tag_name:
+            return tag
+    return None
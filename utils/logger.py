@@ -30,3 +30,15 @@ def set_up_logging():
 
     logger.addHandler(ch)
     # logger.addHandler(fh)
+
+
+class SessionLogger(logging.LoggerAdapter):
+    """
+    Logger of one client session, when several of them share the logger each message starts with the session name
+    """
+
+    def __init__(self, logger, session):
+        super(SessionLogger, self).__init__(logger, {'session': session})
+
+    def process(self, msg, kwargs):
+        return '[{0}] {1}'.format(self.extra['session'], msg), kwargs
@@ -31,3 +31,21 @@ class Settings(object):
             setattr(self, setting, setting_value)
 
 settings = SettingsSingleton()
+
+
+class SettingsOverride(object):
+    """
+    Settings of one client session: the given values, and the global settings for everything else.
+    Used to run several clients with e.g. different USER_ID, LOBBY or GAME_TYPE in one process
+    """
+
+    def __init__(self, **overrides):
+        self.__dict__['overrides'] = overrides
+
+    def __getattr__(self, name):
+        if name in self.overrides:
+            return self.overrides[name]
+        return getattr(settings, name)
+
+    def __setattr__(self, key, value):
+        self.overrides[key] = value
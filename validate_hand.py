@@ -10,13 +10,13 @@ import logging
 import sys
 
 import os
-from bs4 import BeautifulSoup
 from functools import reduce
 
 from mahjong.constants import EAST, SOUTH, WEST, NORTH
 from mahjong.hand import FinishedHand
 from mahjong.tile import TilesConverter
 from tenhou.decoder import TenhouDecoder
+from tenhou.tokenizer import iter_stream_tags
 from utils.settings_handler import settings
 
 
@@ -71,9 +71,6 @@ class TenhouLogParser(object):
         decoder = TenhouDecoder()
         finished_hand = FinishedHand()
 
-        soup = BeautifulSoup(log_data, 'html.parser')
-        elements = soup.find_all()
-
         settings.FIVE_REDS = True
 
         total_hand = 0
@@ -83,7 +80,7 @@ class TenhouLogParser(object):
         dealer = 0
         round_wind = EAST
 
-        for tag in elements:
+        for tag in iter_stream_tags(log_data):
             if tag.name == 'go':
                 game_rule_temp = int(tag.attrs['type'])
 
@@ -154,9 +151,8 @@ class TenhouLogParser(object):
                 called_kan_indices = []
                 if 'm' in tag.attrs:
                     for x in tag.attrs['m'].split(','):
-                        message = '<N who={} m={}>'.format(tag.attrs['who'], x)
-                        meld = decoder.parse_meld(message)
-                        tiles = meld.tiles
+                        meld = decoder.decode_meld_code(int(x))
+                        tiles = list(meld.tiles)
                         if len(tiles) == 4:
                             called_kan_indices.append(tiles[0])
                             tiles = tiles[1:4]